@@ -0,0 +1,102 @@
+"""Compare shipping several boxes to one unit box by box and in one go.
+
+A :class:`shippy.session.Session` talks to :class:`fakes.FakeUpstream` and
+discards labels through the ``null`` printer backend. The same boxes are
+shipped once with a ``ship`` call each, as answering the prompts once per box
+does, and once with ``ship_boxes``, which verifies the address once, buys the
+postage concurrently and prints the labels as one job.
+
+Run from the repository root::
+
+    python benchmarks/boxes.py [--boxes N] [--rounds N] [--latency SECONDS]
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from fakes import SERVICES, FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+ADDRESS = {
+    "name": "Mail Room",
+    "street1": "1 Unit Rd",
+    "city": "Huntsville",
+    "state": "TX",
+    "zipcode": "77340",
+}
+
+
+def build_session(upstream, tmpdir, extra: str = ""):
+    """Return a started session against the fakes, with its journal in tmpdir.
+
+    ``extra`` is appended to the config file.
+    """
+    # pylint: disable=import-outside-toplevel
+    from shippy import console
+    from shippy.cli import load_config
+    from shippy.printing import configure
+    from shippy.session import Session
+
+    # Keep the journal out of the real data directory.
+    os.environ["XDG_DATA_HOME"] = tmpdir
+    os.environ.pop("LOCALAPPDATA", None)
+
+    path = os.path.join(tmpdir, "config.ini")
+    upstream.write_config(path, "\n[printer]\nbackend = null\n" + extra)
+    config = load_config(pathlib.Path(path))
+    configure(config.printer)
+
+    # pylint: disable-next=consider-using-with
+    console.set_output(open(os.devnull, "w", encoding="utf-8"))
+    session = Session.from_config(config)
+    session.start()
+    session.return_address()
+    session.label_logo()
+    return session
+
+
+def main():
+    """Time shipping boxes to one unit one at a time and all at once."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--boxes", type=int, default=8, help="boxes per shipment")
+    parser.add_argument("--rounds", type=int, default=3, help="shipments per mode")
+    parser.add_argument(
+        "--latency", type=float, default=0.1, help="seconds added to every call"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    upstream = FakeUpstream({name: Profile(args.latency) for name in SERVICES}).start()
+    scratch = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+    session = build_session(upstream, scratch.name)
+    weights = [16.0 * (10 + box % 5) for box in range(args.boxes)]
+
+    timings = {}
+    for mode in ("one by one", "in one go"):
+        started = time.monotonic()
+        for _ in range(args.rounds):
+            if mode == "one by one":
+                for weight in weights:
+                    session.ship(ADDRESS, weight, unit="ELLIS")
+            else:
+                session.ship_boxes(ADDRESS, weights, unit="ELLIS")
+        per_box = (time.monotonic() - started) / (args.rounds * args.boxes)
+        timings[mode] = per_box
+        print(f"{mode:10s} {1000 * per_box:7.1f} ms per box")
+
+    print(
+        f"{args.boxes} boxes in one go are "
+        f"{timings['one by one'] / timings['in one go']:.1f}x faster per box"
+    )
+
+    upstream.shutdown()
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
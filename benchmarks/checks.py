@@ -0,0 +1,25 @@
+"""Checks of the behavior a benchmark measures, failing the run if one is wrong.
+
+A benchmark's numbers only mean something if shippy did what it should along
+the way: every request acknowledged once, no label bought for a printer out of
+paper. Each benchmark states those with :func:`expect` and ends with
+:func:`finish`, which exits non-zero if any did not hold.
+"""
+
+import sys
+
+FAILED: list[str] = []
+
+
+def expect(condition: bool, message: str):
+    """Report one check, remembering it if it failed."""
+    print(f"  {'ok' if condition else 'FAILED'}: {message}")
+    if not condition:
+        FAILED.append(message)
+
+
+def finish():
+    """Exit non-zero if any check failed."""
+    if FAILED:
+        print(f"{len(FAILED)} checks failed", file=sys.stderr)
+    sys.exit(1 if FAILED else 0)
@@ -0,0 +1,296 @@
+"""Ship a batch of labels end to end against local stand-ins and report.
+
+A real ``shippy stream`` process is fed records on stdin while it talks to
+:class:`fakes.FakeUpstream` for IBP, EasyPost, label downloads and Google Maps,
+and discards labels through the ``null`` printer backend. Each upstream service
+can be slowed down or made flaky, so the numbers reflect shippy's own overhead
+on top of a chosen network profile.
+
+The report gives labels per minute, per-stage latency percentiles (from the
+metrics shippy records for ``shippy stats``), Maps geocoding latency and the
+peak RSS of the shippy process. Results are saved as JSON under
+``benchmarks/results/`` and compared with the previous run.
+
+Run from the repository root::
+
+    python benchmarks/e2e.py [--labels N] [--latency SECONDS]
+        [--service NAME:LATENCY[:JITTER[:ERROR_RATE]] ...] [--compare PATH]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from fakes import SERVICES, FakeUpstream, Profile
+
+try:
+    import resource
+except ImportError:
+    HAS_RESOURCE = False
+else:
+    HAS_RESOURCE = True
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+RESULTS = ROOT / "benchmarks" / "results"
+
+
+def parse_service(text: str) -> tuple[str, Profile]:
+    """Parse ``NAME:LATENCY[:JITTER[:ERROR_RATE]]`` into a service profile."""
+    name, *values = text.split(":")
+    if name not in SERVICES or not 1 <= len(values) <= 3:
+        raise argparse.ArgumentTypeError(
+            f"expected NAME:LATENCY[:JITTER[:ERROR_RATE]] with NAME one of "
+            f"{', '.join(SERVICES)}, got {text!r}"
+        )
+    return name, Profile(*(float(value or 0) for value in values))
+
+
+def build_records(count: int) -> list[str]:
+    """Return stream records mixing request autoids and unit names."""
+    units = ["Ellis 14", "Wynne 9", "Beto 11"]
+    return [
+        f"{1000 + index},2" if index % 4 else units[index // 4 % len(units)]
+        for index in range(count)
+    ]
+
+
+def ship(config: str, records: list[str], data_dir: str):
+    """Stream records through ``shippy stream``; return results and timings."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT), XDG_DATA_HOME=data_dir)
+    env.pop("LOCALAPPDATA", None)
+
+    started = time.monotonic()
+    with subprocess.Popen(
+        [sys.executable, "-m", "shippy", "--config", config, "stream"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        env=env,
+    ) as process:
+        assert process.stdin is not None and process.stdout is not None
+
+        def feed():
+            for record in records:
+                process.stdin.write(record + "\n")
+                process.stdin.flush()
+            process.stdin.close()
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        results, finished = [], []
+        for line in process.stdout:
+            results.append(json.loads(line))
+            finished.append(time.monotonic() - started)
+
+    return results, finished
+
+
+def peak_rss_mb() -> float | None:
+    """Return the peak RSS of the largest finished child process, in MiB."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def stage_latencies(path: str) -> dict[str, dict]:
+    """Summarize the stage timings shippy recorded during the run."""
+    from shippy import metrics  # pylint: disable=import-outside-toplevel
+
+    durations: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for event in metrics.read_events(path, 0.0):
+        durations.setdefault(event["stage"], []).append(event["s"])
+        errors[event["stage"]] = errors.get(event["stage"], 0) + bool(
+            event.get("error")
+        )
+
+    summary = {}
+    for stage, values in durations.items():
+        ordered = sorted(values)
+        summary[stage] = {"count": len(values), "errors": errors[stage]} | {
+            f"p{round(100 * q)}": metrics.percentile(ordered, q)
+            for q in (0.5, 0.95, 0.99)
+        }
+    return summary
+
+
+def geocode_latencies(upstream: FakeUpstream, count: int) -> dict:
+    """Time address lookups through shippy's Maps address parser."""
+    # pylint: disable-next=import-outside-toplevel
+    import googlemaps  # type: ignore
+
+    from shippy import metrics  # pylint: disable=import-outside-toplevel
+    from shippy.addresses import AddressParser  # pylint: disable=C0415
+
+    parse = AddressParser(googlemaps.Client(key="AIzaFake", base_url=upstream.url))
+    durations, failures = [], 0
+    for index in range(count):
+        started = time.monotonic()
+        failures += parse(f"{index} W 12th St, Austin TX") is None
+        durations.append(time.monotonic() - started)
+
+    ordered = sorted(durations)
+    return {"count": count, "errors": failures} | {
+        f"p{round(100 * q)}": metrics.percentile(ordered, q) for q in (0.5, 0.95)
+    }
+
+
+def run(args) -> dict:
+    """Run one benchmark and return its result."""
+    profiles = {name: Profile(args.latency) for name in SERVICES}
+    profiles.update(args.service)
+    upstream = FakeUpstream(profiles, seed=args.seed).start()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = os.path.join(tmpdir, "config.ini")
+        metrics_path = os.path.join(tmpdir, "metrics.jsonl")
+        upstream.write_config(
+            config,
+            f"\n[printer]\nbackend = null\n\n[metrics]\npath = {metrics_path}\n",
+        )
+
+        results, finished = ship(config, build_records(args.labels), tmpdir)
+        stages = stage_latencies(metrics_path)
+
+    geocode = geocode_latencies(upstream, args.maps) if args.maps else None
+    upstream.shutdown()
+
+    shipped_at = [
+        moment
+        for result, moment in zip(results, finished)
+        if result.get("status") == "ok"
+    ]
+    shipped = len(shipped_at)
+    elapsed = finished[-1] if finished else float("nan")
+    # Steady state runs from the first label on, leaving startup out.
+    steady = shipped_at[-1] - shipped_at[0] if shipped > 1 else float("nan")
+    return {
+        "name": args.name,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "labels": args.labels,
+        "shipped": shipped,
+        "failed": len(results) - shipped,
+        "elapsed_s": elapsed,
+        "labels_per_min": 60.0 * shipped / elapsed,
+        "steady_labels_per_min": 60.0 * (shipped - 1) / steady,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+        "geocode": geocode,
+        "profiles": {name: profile._asdict() for name, profile in profiles.items()},
+        "upstream_requests": dict(upstream.requests),
+        "upstream_errors": dict(upstream.errors),
+    }
+
+
+def _git_commit() -> str | None:
+    """Return the short hash of the checked-out commit, if there is one."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: dict, previous: dict | None):
+    """Print a run's result, with changes against a previous run if given."""
+
+    def delta(key_path, value, fmt="{:+.1%}"):
+        if previous is None or value is None:
+            return ""
+        old = previous
+        for key in key_path:
+            old = (old or {}).get(key)
+        if not old:
+            return ""
+        return "  (" + fmt.format(value / old - 1.0) + ")"
+
+    print(
+        f"{result['shipped']}/{result['labels']} labels in "
+        f"{result['elapsed_s']:.1f} s: {result['labels_per_min']:.0f} labels/min"
+        f"{delta(['labels_per_min'], result['labels_per_min'])}, steady "
+        f"{result['steady_labels_per_min']:.0f}"
+        f"{delta(['steady_labels_per_min'], result['steady_labels_per_min'])}"
+    )
+    if result["peak_rss_mb"] is not None:
+        print(
+            f"peak RSS {result['peak_rss_mb']:.1f} MiB"
+            f"{delta(['peak_rss_mb'], result['peak_rss_mb'])}"
+        )
+
+    print(f"  {'stage':30s} {'count':>6s} {'errors':>6s} {'p50':>9s} {'p95':>9s}")
+    rows = dict(result["stages"])
+    if result["geocode"] is not None:
+        rows["Maps geocode (in-process)"] = result["geocode"]
+    for stage, row in rows.items():
+        print(
+            f"  {stage[:30]:30s} {row['count']:6d} {row['errors']:6d} "
+            f"{row['p50'] * 1000:7.1f}ms {row['p95'] * 1000:7.1f}ms"
+            f"{delta(['stages', stage, 'p50'], row['p50'])}"
+        )
+
+
+def latest_result() -> pathlib.Path | None:
+    """Return the most recent saved result, if any."""
+    saved = sorted(RESULTS.glob("*.json"))
+    return saved[-1] if saved else None
+
+
+def main():
+    """Benchmark shipping end to end against local stand-ins."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=100, help="labels to ship")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every service"
+    )
+    parser.add_argument(
+        "--service",
+        type=parse_service,
+        action="append",
+        default=[],
+        help="per-service NAME:LATENCY[:JITTER[:ERROR_RATE]], e.g. easypost:0.3:0.2",
+    )
+    parser.add_argument("--maps", type=int, default=20, help="geocode lookups timed")
+    parser.add_argument("--seed", type=int, default=0, help="jitter/error seed")
+    parser.add_argument("--name", default="run", help="label for the saved result")
+    parser.add_argument("--compare", type=pathlib.Path, help="result to compare with")
+    parser.add_argument("--no-save", action="store_true", help="do not save")
+    args = parser.parse_args()
+
+    # Make shippy importable for reading its metrics when it is not installed.
+    sys.path.insert(0, str(ROOT))
+
+    previous_path = args.compare or latest_result()
+    result = run(args)
+
+    previous = None
+    if previous_path is not None:
+        previous = json.loads(previous_path.read_text(encoding="utf-8"))
+        print(f"compared with {previous_path.name}")
+    print_report(result, previous)
+
+    if not args.no_save:
+        RESULTS.mkdir(exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = RESULTS / f"{stamp}-{args.name}.json"
+        path.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+        print(f"saved {path.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
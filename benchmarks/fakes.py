@@ -0,0 +1,498 @@
+"""Local stand-ins for the upstream services shippy talks to.
+
+One threaded HTTP server answers the IBP endpoints used by
+:class:`shippy.server.Server` (under ``/ibp/``), the EasyPost endpoints used by
+:mod:`shippy.shipping` (under ``/v2/``), label PNG downloads (under
+``/labels/``) and the Google Maps geocoding and autocomplete calls (under
+``/maps/``), so a real shippy process can be run end to end without network
+access or spending postage.
+
+Each service can be given a :class:`Profile` of added latency, jitter, stalls
+and error rate, to see how shippy behaves against a slow or flaky upstream.
+"""
+
+import collections
+import functools
+import http.server
+import io
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+import typing
+import urllib.parse
+
+ADDRESS = {
+    "name": "Inside Books Project",
+    "street1": "827 W 12th St",
+    "city": "Austin",
+    "state": "TX",
+    "zipcode": "78701",
+}
+
+UNITS = {"Ellis": 1, "Wynne": 2, "Darrington": 3, "Estelle": 4, "Beto": 5}
+
+# Compound request IDs of the day's packed requests, by request autoid.
+PACKED_REQUESTS = {f"TX-{2400000 + 37 * n}-1": 50000 + n for n in range(300)}
+PACKED_AUTOIDS = {autoid: key for key, autoid in PACKED_REQUESTS.items()}
+
+# (carrier, service, rate, delivery days): what an account with USPS, UPS and
+# FedEx carrier accounts is rated for a parcel across the country.
+RATES = [
+    ("USPS", "LibraryMail", "3.58", 8),
+    ("USPS", "MediaMail", "4.13", 8),
+    ("USPS", "GroundAdvantage", "8.40", 5),
+    ("USPS", "Priority", "11.25", 3),
+    ("USPS", "Express", "39.10", 2),
+    ("UPS", "Ground", "11.02", 5),
+    ("UPS", "3DaySelect", "24.87", 3),
+    ("UPS", "2ndDayAir", "31.45", 2),
+    ("UPS", "NextDayAirSaver", "68.20", 1),
+    ("UPS", "NextDayAir", "74.93", 1),
+    ("FedEx", "FEDEX_GROUND", "11.37", 5),
+    ("FedEx", "FEDEX_EXPRESS_SAVER", "27.90", 3),
+    ("FedEx", "FEDEX_2_DAY", "33.12", 2),
+    ("FedEx", "STANDARD_OVERNIGHT", "71.48", 1),
+    ("FedEx", "PRIORITY_OVERNIGHT", "79.66", 1),
+]
+
+CARRIER_ACCOUNTS = {
+    "USPS": ("ca_usps0001", "UspsAccount"),
+    "UPS": ("ca_ups00002", "UpsAccount"),
+    "FedEx": ("ca_fedex003", "FedexAccount"),
+}
+
+GEOCODE_COMPONENTS = [
+    {"long_name": "827", "short_name": "827", "types": ["street_number"]},
+    {"long_name": "West 12th Street", "short_name": "W 12th St", "types": ["route"]},
+    {"long_name": "Austin", "short_name": "Austin", "types": ["locality"]},
+    {
+        "long_name": "Texas",
+        "short_name": "TX",
+        "types": ["administrative_area_level_1"],
+    },
+    {"long_name": "78701", "short_name": "78701", "types": ["postal_code"]},
+    {"long_name": "United States", "short_name": "US", "types": ["country"]},
+]
+
+# Trackers cycle through these, so a batch has a realistic mix of statuses.
+TRACKER_STATUSES = (
+    "delivered",
+    "in_transit",
+    "delivered",
+    "out_for_delivery",
+    "delivered",
+    "pre_transit",
+    "delivered",
+    "return_to_sender",
+)
+
+SERVICES = ("ibp", "easypost", "labels", "maps")
+
+
+class Profile(typing.NamedTuple):
+    """Added latency, slow tail and failure rate of one upstream service."""
+
+    latency: float = 0.0  # Seconds added to every response.
+    jitter: float = 0.0  # Up to this many more seconds, uniformly random.
+    error_rate: float = 0.0  # Fraction of requests answered with a 503.
+    stall_rate: float = 0.0  # Fraction of requests that stall, a slow tail.
+    stall: float = 0.0  # Seconds a stalled request waits more.
+
+
+@functools.cache
+def label_png(width: int = 1200, height: int = 1800) -> bytes:
+    """Render a 4x6 inch, 300 dpi label PNG resembling a real postage label."""
+    from PIL import Image, ImageDraw  # pylint: disable=import-outside-toplevel
+
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((20, 20, width - 20, height - 20), outline=0, width=6)
+    draw.line((20, 400, width - 20, 400), fill=0, width=6)
+    for row in range(8):
+        draw.text((80, 120 + 32 * row), f"SHIP TO LINE {row}", fill=0)
+
+    # A barcode band, so the PNG compresses like a real label does.
+    bars = random.Random(0)
+    x = 100
+    while x < width - 100:
+        thickness = bars.randint(2, 8)
+        draw.rectangle((x, 1300, x + thickness, 1600), fill=0)
+        x += thickness + bars.randint(2, 8)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@functools.cache
+def label_zpl() -> bytes:
+    """Return a 4x6 inch, 203 dpi ZPL label resembling a real postage label."""
+    lines = ["^XA", "^CI28", "^PW812", "^LL1218", "^FO20,20^GB772,1178,4^FS"]
+    lines += [
+        f"^FO60,{100 + 40 * row}^A0N,30,30^FDSHIP TO LINE {row}^FS" for row in range(8)
+    ]
+    # The postage indicia is a graphic field in real labels, too.
+    indicia = random.Random(0)
+    rows = "".join(
+        "".join(indicia.choice("0F") * 2 for _ in range(25)) for _ in range(120)
+    )
+    lines += [
+        f"^FO520,40^GFA,3000,3000,25,{rows}^FS",
+        "^FO100,880^BY3^BCN,250,Y,N,N^FD9400111899223397623910^FS",
+        "^XZ",
+    ]
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Route requests to the owning :class:`FakeUpstream`."""
+
+    server: "FakeUpstream"
+    # Keep connections open between requests, as the real services do, without
+    # holding the body back until the headers are acknowledged.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        """Set the idle timeout of a new connection."""
+        # An idle connection is closed once this many seconds pass unused.
+        self.timeout = self.server.idle_timeout
+        super().setup()
+        self.server.connected()
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Handle a HEAD request."""
+        self._dispatch("HEAD")
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Handle a GET request."""
+        self._dispatch("GET")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Handle a POST request."""
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.server.offline:
+            # Hang up without an answer, like a dropped connection.
+            self.close_connection = True
+            return
+        status, payload = self.server.respond(method, self.path, body)
+        if isinstance(payload, bytes):
+            data = payload
+            content_type = "text/plain" if self.path.endswith(".zpl") else "image/png"
+        else:
+            data, content_type = json.dumps(payload).encode(), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keep benchmark output clean."""
+
+
+class FakeUpstream(  # pylint: disable=too-many-instance-attributes
+    http.server.ThreadingHTTPServer
+):
+    """IBP, EasyPost, label and Maps stand-in on an ephemeral local port.
+
+    Set ``offline`` to hang up on every request, as during a network outage.
+    Connections are kept alive until ``idle_timeout`` seconds pass unused (None
+    keeps them open), and each new one sleeps ``handshake`` seconds first, the
+    cost of a TCP and TLS handshake to a distant server; ``connections`` counts
+    them.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        profiles: typing.Optional[dict[str, Profile]] = None,
+        seed: typing.Optional[int] = None,
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.profiles = dict.fromkeys(SERVICES, Profile()) | (profiles or {})
+        self.offline = False
+        self.idle_timeout: typing.Optional[float] = None
+        self.handshake = 0.0
+        self.connections = 0
+        # Packed requests acknowledged as shipped, taken off the ready list.
+        self.acknowledged: set[int] = set()
+        self.requests: collections.Counter = collections.Counter()
+        self.errors: collections.Counter = collections.Counter()
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstream":
+        """Serve in a background thread."""
+        self._thread.start()
+        return self
+
+    def handle_error(self, request, client_address):
+        """Ignore clients hanging up, as a killed ``shippy serve`` does."""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def connected(self):
+        """Count a new connection and pay for its handshake."""
+        with self._lock:
+            self.connections += 1
+        time.sleep(self.handshake)
+
+    def new_id(self, prefix: str) -> str:
+        """Return a fresh EasyPost-style object ID."""
+        return f"{prefix}_{next(self._ids):08d}"
+
+    def respond(self, method, path, body):
+        """Apply the service's profile, then return ``(status, payload)``."""
+        service = path.lstrip("/").split("/", 1)[0]
+        if service == "v2":
+            service = "easypost"
+        profile = self.profiles.get(service, Profile())
+
+        with self._lock:
+            self.requests[service] += 1
+            delay = profile.latency + self._random.uniform(0.0, profile.jitter)
+            if self._random.random() < profile.stall_rate:
+                delay += profile.stall
+            failed = self._random.random() < profile.error_rate
+        time.sleep(delay)
+
+        if failed:
+            with self._lock:
+                self.errors[service] += 1
+            return 503, {
+                "error": {"code": "SERVICE_UNAVAILABLE", "message": "injected"}
+            }
+        return self.route(method, path, body)
+
+    def route(self, method, path, body):
+        """Return ``(status, payload)`` for a request."""
+        path = urllib.parse.urlsplit(path).path
+        if path.startswith("/ibp/"):
+            return self.route_ibp(path[len("/ibp/") :], body)
+        if path.startswith("/v2/"):
+            return self.route_easypost(method, path[len("/v2") :], body)
+        if path.startswith("/labels/"):
+            return 200, label_zpl() if path.endswith(".zpl") else label_png()
+        if path.startswith("/maps/"):
+            return self.route_maps(path[len("/maps") :])
+        return 404, {"error": "not found"}
+
+    def route_ibp(self, path, body=b""):
+        """Answer the IBP server API."""
+        if path == "unit_autoids":
+            return 200, UNITS
+        if path == "packed_request_autoids":
+            return 200, PACKED_REQUESTS
+        if path == "return_address" or re.fullmatch(
+            r"(unit|request)_address/\d+", path
+        ):
+            return 200, ADDRESS
+        posted = {
+            "ready_requests": self._ready_requests,
+            "ack_requests": self._ack_requests,
+            "request_autoid": self._request_autoid,
+        }
+        if path in posted:
+            return 200, posted[path](urllib.parse.parse_qs(body.decode()))
+        return 404, {"error": "not found"}
+
+    def _ack_requests(self, form):
+        """Take acknowledged requests off the ready list."""
+        autoids = {int(autoid) for autoid in form["autoids"][0].split(",")}
+        with self._lock:
+            self.acknowledged |= autoids & PACKED_AUTOIDS.keys()
+        return {"acknowledged": len(autoids & PACKED_AUTOIDS.keys())}
+
+    @staticmethod
+    def _request_autoid(form):
+        """Resolve a compound request ID to its autoid."""
+        key = "-".join(
+            form[field][0] for field in ("jurisdiction", "inmate_id", "index")
+        )
+        # Requests packed on other days get an autoid of their own.
+        return {"autoid": PACKED_REQUESTS.get(key, int(form["inmate_id"][0]))}
+
+    def _ready_requests(self, form):
+        """Return a page of the packed requests not acknowledged yet."""
+        after, limit = int(form["after"][0]), int(form["limit"][0])
+        with self._lock:
+            ready = [
+                autoid
+                for autoid in sorted(PACKED_AUTOIDS)
+                if autoid > after and autoid not in self.acknowledged
+            ]
+        page = ready[:limit]
+        return {
+            "requests": [
+                {"autoid": autoid, "request_id": PACKED_AUTOIDS[autoid]}
+                for autoid in page
+            ],
+            "next": page[-1] if len(ready) > limit else None,
+        }
+
+    def route_easypost(self, method, path, body=b""):
+        """Answer the subset of the EasyPost API that shippy uses."""
+        if method == "GET" and path == "/carrier_accounts":
+            return 200, [
+                {
+                    "id": account_id,
+                    "object": "CarrierAccount",
+                    "type": account_type,
+                    "readable": carrier,
+                    "description": f"{carrier} account",
+                }
+                for carrier, (account_id, account_type) in CARRIER_ACCOUNTS.items()
+            ]
+
+        create = {
+            "/addresses": lambda _body: {
+                "id": self.new_id("adr"),
+                "object": "Address",
+                **ADDRESS,
+            },
+            "/parcels": lambda _body: {"id": self.new_id("prcl"), "object": "Parcel"},
+            "/shipments": self._create_shipment,
+        }
+        if method == "POST" and path in create:
+            return 201, create[path](json.loads(body or b"{}"))
+
+        match = re.fullmatch(r"/addresses/(adr_\w+)/verify", path)
+        if match:
+            return 200, {"address": {"id": match.group(1), "object": "Address"}}
+
+        match = re.fullmatch(r"/trackers/(trk_\w+)", path)
+        if match and method == "GET":
+            return 200, self._tracker(match.group(1)[4:])
+
+        # GET a bought shipment, or POST to buy or refund one.
+        match = re.fullmatch(r"/shipments/(shp_\w+)(?:/(buy|refund))?", path)
+        if match and (method == "GET") == (match.group(2) is None):
+            shipment_id, action = match.groups()
+            return 200, self._shipment_action(shipment_id, action or "buy")
+
+        return 404, {"error": {"code": "NOT_FOUND", "message": "not found"}}
+
+    def _create_shipment(self, body):
+        """Rate a new shipment, buying it at once if a service is given.
+
+        Like EasyPost, only the listed ``carrier_accounts`` are rated, if any.
+        """
+        params = body.get("shipment", {})
+        shipment = self._shipment(self.new_id("shp"), params.get("carrier_accounts"))
+        if not params.get("service"):
+            return shipment
+        for rate in shipment["rates"]:
+            if rate["service"] == params["service"]:
+                return self._bought(shipment, rate)
+        return shipment | {"messages": [{"message": "no rate for the service"}]}
+
+    def _shipment_action(self, shipment_id, action):
+        """Return a shipment after buying or refunding it."""
+        shipment = self._shipment(shipment_id)
+        if action == "refund":
+            return shipment | {"refund_status": "submitted"}
+        return self._bought(shipment, shipment["rates"][0])
+
+    def _bought(self, shipment, rate):
+        """Return a shipment with postage bought at a rate."""
+        shipment_id = shipment["id"]
+        return shipment | {
+            "tracking_code": f"9400{shipment_id[4:]:0>18}",
+            "selected_rate": rate,
+            "tracker": self._tracker(shipment_id[4:]),
+            "postage_label": {
+                "object": "PostageLabel",
+                "label_url": f"{self.url}/labels/{shipment_id}.png",
+                "label_zpl_url": f"{self.url}/labels/{shipment_id}.zpl",
+            },
+        }
+
+    def _tracker(self, number):
+        """Return a tracker whose status depends only on the shipment number."""
+        status = TRACKER_STATUSES[int(number) % len(TRACKER_STATUSES)]
+        return {
+            "id": f"trk_{number}",
+            "object": "Tracker",
+            "shipment_id": f"shp_{number}",
+            "tracking_code": f"9400{number:0>18}",
+            "status": status,
+            "status_detail": (
+                "arrived_at_destination" if status == "delivered" else None
+            ),
+            "est_delivery_date": "2026-01-05T00:00:00Z",
+        }
+
+    def _shipment(self, shipment_id, carrier_accounts=None):
+        """Return a rated shipment object, rated by every carrier account or some."""
+        rates = [
+            {
+                "id": f"rate_{shipment_id[4:]}_{index}",
+                "object": "Rate",
+                "mode": "test",
+                "carrier": carrier,
+                "service": service,
+                "rate": rate,
+                "currency": "USD",
+                "list_rate": rate,
+                "list_currency": "USD",
+                "retail_rate": rate,
+                "retail_currency": "USD",
+                "delivery_days": days,
+                "delivery_date": None,
+                "delivery_date_guaranteed": False,
+                "est_delivery_days": days,
+                "shipment_id": shipment_id,
+                "carrier_account_id": CARRIER_ACCOUNTS[carrier][0],
+                "billing_type": "easypost",
+                "created_at": "2026-01-01T00:00:00Z",
+                "updated_at": "2026-01-01T00:00:00Z",
+            }
+            for index, (carrier, service, rate, days) in enumerate(RATES)
+            if not carrier_accounts or CARRIER_ACCOUNTS[carrier][0] in carrier_accounts
+        ]
+        return {"id": shipment_id, "object": "Shipment", "rates": rates}
+
+    def route_maps(self, path):
+        """Answer the Google Maps geocoding and place autocomplete APIs."""
+        if path == "/api/geocode/json":
+            return 200, {
+                "status": "OK",
+                "results": [{"address_components": GEOCODE_COMPONENTS}],
+            }
+        if path == "/api/place/autocomplete/json":
+            return 200, {
+                "status": "OK",
+                "predictions": [
+                    {"description": "827 W 12th St, Austin, TX 78701, USA"},
+                    {"description": "827 W 12th Ave, Denver, CO 80204, USA"},
+                ],
+            }
+        return 404, {"status": "NOT_FOUND"}
+
+    def write_config(self, path, extra: str = ""):
+        """Write a shippy config file pointing at this server."""
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(
+                f"[ibp]\nurl = {self.url}/ibp/\napikey = fake\n\n"
+                f"[easypost]\napikey = fake\napi_base = {self.url}/v2\n\n"
+                f"[googlemaps]\napikey = AIzaFake\nbase_url = {self.url}\n" + extra
+            )
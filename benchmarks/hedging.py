@@ -0,0 +1,112 @@
+"""Time labels against an upstream with a slow tail, hedged and not.
+
+:class:`fakes.FakeUpstream` answers IBP lookups and label downloads in
+``--latency`` seconds, but stalls ``--stall-rate`` of them ``--stall`` seconds
+more, as a busy server now and then does. A :class:`shippy.session.Session`
+looks up a request's address and ships its label, once without hedged reads
+and once with them. The report gives the 50th, 95th and 99th percentile
+seconds per label, and how often each upstream was hedged.
+
+Last, the IBP lookup hangs for ``--hang`` seconds while a label has a
+``--budget`` of seconds in all, to show when the label gives up.
+
+Run from the repository root::
+
+    python benchmarks/hedging.py [--labels N] [--stall SECONDS]
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import build_session
+from fakes import PACKED_REQUESTS, FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def ship_labels(session, labels: int) -> list[float]:
+    """Look up and ship labels; return the sorted seconds each took."""
+    autoids = list(PACKED_REQUESTS.values())
+    elapsed = []
+    for number in range(labels):
+        started = time.monotonic()
+        with session.budget():
+            address = session.server.request_address(autoids[number % len(autoids)])
+            session.ship(address, 32.0)
+        elapsed.append(time.monotonic() - started)
+    return sorted(elapsed)
+
+
+def give_up(session, hang: float) -> str:
+    """Ship a label while its IBP lookup hangs; return how it ended."""
+    started = time.monotonic()
+    try:
+        with session.budget():
+            session.ship(session.server.request_address(1), 32.0)
+        outcome = "shipped"
+    except Exception as exc:  # pylint: disable=broad-except
+        outcome = f"gave up ({type(exc).__name__})"
+    return (
+        f"lookup hanging {hang:g} s: {outcome} after "
+        f"{time.monotonic() - started:.1f} s"
+    )
+
+
+def main():
+    """Ship labels against a slow tail with hedged reads off and on."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=100, help="labels to ship")
+    parser.add_argument(
+        "--latency", type=float, default=0.03, help="seconds added to every call"
+    )
+    parser.add_argument(
+        "--stall-rate", type=float, default=0.03, help="fraction of calls stalled"
+    )
+    parser.add_argument(
+        "--stall", type=float, default=1.0, help="seconds a stalled call waits more"
+    )
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per label")
+    parser.add_argument("--hang", type=float, default=10.0, help="seconds to hang")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.metrics import percentile
+
+    tail = Profile(args.latency, stall_rate=args.stall_rate, stall=args.stall)
+    upstream = FakeUpstream(
+        {"ibp": tail, "labels": tail, "easypost": Profile(args.latency)}, seed=0
+    ).start()
+
+    for name, hedge in (("not hedged", "false"), ("hedged", "true")):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            session = build_session(
+                upstream,
+                tmpdir,
+                f"\n[deadline]\nlabel = 30\nhedge = {hedge}\n",
+            )
+            elapsed = ship_labels(session, args.labels)
+            print(
+                f"{name:10}  p50 {percentile(elapsed, 0.5):.2f} s, "
+                f"p95 {percentile(elapsed, 0.95):.2f} s, "
+                f"p99 {percentile(elapsed, 0.99):.2f} s per label"
+            )
+            for line in session.hedging():
+                print(f"  {line}")
+            session.journal.close()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = build_session(
+            upstream, tmpdir, f"\n[deadline]\nlabel = {args.budget:g}\n"
+        )
+        upstream.profiles["ibp"] = Profile(args.hang)
+        print(f"budget {args.budget:g} s, {give_up(session, args.hang)}")
+        session.journal.close()
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
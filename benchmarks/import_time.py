@@ -0,0 +1,171 @@
+"""Check which modules each shippy subcommand imports at startup, and time them.
+
+Every subcommand is launched as a fresh ``python -X importtime -m shippy``
+process against local stand-ins (see :mod:`fakes`) and stopped at its first
+prompt by closing stdin (``serve`` once it listens). Each subcommand has modules
+it must not import: a heavy dependency it does not use, imported eagerly again,
+shows up as a failure rather than as a slowly worse cold start on the shipping
+PCs. The script exits non-zero when any subcommand imports one.
+
+The cumulative import time of the top-level imports is reported too, and how
+many times the bare interpreter's that is, but not gated: milliseconds vary too
+much between runs and shared CI runners to fail a build on.
+
+Run from the repository root::
+
+    python benchmarks/import_time.py [--repeat N]
+"""
+
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+from fakes import FakeUpstream
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+_SCRATCH = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+
+# Heavy dependencies, each loaded only by the subcommands that use it. pyserial
+# is only for a configured scale, which the stand-in config has none of.
+SDKS = ("easypost", "googlemaps", "questionary", "PIL", "requests", "serial")
+NOT_MANUAL = ("googlemaps", "serial")
+
+# Modules (and their submodules) each subcommand must not import at startup.
+# diagnose-printer and the submit thin client need no config and must not load
+# any SDK at all; only manual's address autocompletion needs Google Maps.
+FORBIDDEN = {
+    "diagnose-printer": SDKS + ("pydantic",),
+    "submit": SDKS + ("pydantic", "shippy.printing"),
+    "individual": NOT_MANUAL,
+    "bulk": NOT_MANUAL,
+    "manual": ("serial",),
+    "queue": NOT_MANUAL,
+    "stream": NOT_MANUAL,
+    "serve": NOT_MANUAL,
+    "stats": SDKS,
+    "track": SDKS,
+}
+
+CONFIG_FREE = ("diagnose-printer", "submit")
+
+# Extra arguments, and the stderr line after which a subcommand that keeps
+# running has done its startup imports.
+EXTRA_ARGS = {"serve": ["--listen", "127.0.0.1:0"]}
+STARTED = {"serve": "Serving shipping jobs on"}
+
+
+def parse_importtime(stderr: str):
+    """Return ``(top-level {module: cumulative_us}, every module imported)``."""
+    modules, imported = {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        imported.add(name.strip())
+        if name.startswith(" ") and not name.startswith("  "):
+            # Only top-level imports: nested ones are already in their parent.
+            modules[name.strip()] = int(cumulative)
+    return modules, imported
+
+
+def run_importtime(args, started=None):
+    """Return the parsed ``-X importtime`` report of a Python invocation.
+
+    With ``started``, the process is stopped once it prints that line.
+    """
+    # Keep the runs' metrics and history out of the real data directory.
+    env = dict(os.environ, PYTHONPATH=str(ROOT), XDG_DATA_HOME=_SCRATCH.name)
+    env.pop("LOCALAPPDATA", None)
+    with subprocess.Popen(
+        [sys.executable, "-X", "importtime", *args],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+    ) as process:
+        if started is None:
+            _, stderr = process.communicate(timeout=60)
+        else:
+            lines = []
+            for line in process.stderr:
+                lines.append(line)
+                if started in line:
+                    break
+            process.terminate()
+            stderr = "".join(lines)
+    return parse_importtime(stderr)
+
+
+def measure(subcommand: str, config: str, baseline: set[str]):
+    """Return ``(total_us, top-level modules, every module)`` for one cold start.
+
+    Modules the bare interpreter imports anyway (``site``, ``encodings`` ...)
+    are not shippy's doing and are left out.
+    """
+    args = ["-m", "shippy"]
+    if subcommand not in CONFIG_FREE:
+        args += ["--config", config]
+    args += [subcommand, *EXTRA_ARGS.get(subcommand, [])]
+
+    modules, imported = run_importtime(args, STARTED.get(subcommand))
+    modules = {name: us for name, us in modules.items() if name not in baseline}
+    return sum(modules.values()), modules, imported - baseline
+
+
+def forbidden(imported: set[str], denied: tuple[str, ...]) -> list[str]:
+    """Return the denied modules imported, themselves or a submodule."""
+    return [
+        root
+        for root in denied
+        if any(name == root or name.startswith(root + ".") for name in imported)
+    ]
+
+
+def check(subcommand, config, baseline, bare_us, args) -> bool:
+    """Measure one subcommand, print its report, and return whether it passes."""
+    # The fastest run is the least disturbed by the rest of the machine.
+    runs = [measure(subcommand, config, set(baseline)) for _ in range(args.repeat)]
+    total, modules, _ = min(runs, key=lambda run: run[0])
+    # Any run importing a denied module fails, not only the fastest.
+    denied = sorted(
+        {name for run in runs for name in forbidden(run[2], FORBIDDEN[subcommand])}
+    )
+    print(
+        f"{subcommand:17s} {total / 1000:7.1f} ms "
+        f"({total / max(bare_us, 1):4.1f}x bare interpreter) "
+        + ("ok" if not denied else "IMPORTS " + ", ".join(denied))
+    )
+    heaviest = sorted(modules.items(), key=lambda item: -item[1])
+    for name, cumulative in heaviest[: args.top]:
+        print(f"    {cumulative / 1000:7.1f} ms  {name}")
+    return not denied
+
+
+def main():
+    """Check every subcommand's startup imports and report their time."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per subcommand")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports shown")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream().start()
+    bare, baseline = run_importtime(["-c", "pass"])
+    failed = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = os.path.join(tmpdir, "config.ini")
+        upstream.write_config(config)
+
+        for subcommand in FORBIDDEN:
+            failed |= not check(subcommand, config, baseline, sum(bare.values()), args)
+
+    upstream.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
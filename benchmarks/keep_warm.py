@@ -0,0 +1,95 @@
+"""Time labels shipped after an idle pause, with and without keep-warm probes.
+
+:class:`fakes.FakeUpstream` closes connections left idle for ``--idle-timeout``
+seconds, as real servers close idle keep-alive connections, and charges
+``--handshake`` seconds for each new one, the cost of a TCP and TLS handshake
+to a distant server. A :class:`shippy.session.Session` looks up a unit address
+and ships a label, then the operator pauses ``--pause`` seconds before the
+next. Without the health monitor every label after a pause opens new
+connections; with it, probes keep them open. The report gives new connections
+and milliseconds per label, then takes the fake offline to show the status
+line the operator sees before the next package.
+
+Run from the repository root::
+
+    python benchmarks/keep_warm.py [--labels N] [--pause SECONDS]
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import ADDRESS, build_session
+from fakes import FakeUpstream
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def ship_after_pauses(upstream, session, labels: int, pause: float):
+    """Ship labels with a pause before each; return connections and seconds each."""
+    connections = upstream.connections
+    elapsed = 0.0
+    for _ in range(labels):
+        time.sleep(pause)
+        started = time.monotonic()
+        session.server.unit_address(1)
+        session.ship(ADDRESS, 32.0, unit="ELLIS")
+        elapsed += time.monotonic() - started
+    return (upstream.connections - connections) / labels, elapsed / labels
+
+
+def main():
+    """Ship labels after idle pauses with the health monitor off and on."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=4, help="labels to ship")
+    parser.add_argument(
+        "--pause", type=float, default=3.0, help="seconds idle before each label"
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=2.0,
+        help="seconds the fake keeps an idle connection open",
+    )
+    parser.add_argument(
+        "--handshake", type=float, default=0.1, help="seconds per new connection"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    upstream = FakeUpstream().start()
+    upstream.idle_timeout, upstream.handshake = args.idle_timeout, args.handshake
+    interval = args.idle_timeout / 2
+
+    for name, enabled in (("no keep-warm", "false"), ("keep-warm", "true")):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            session = build_session(
+                upstream,
+                tmpdir,
+                f"\n[health]\nenabled = {enabled}\ninterval = {interval:g}\n",
+            )
+            if session.health is not None:
+                session.health.start()  # As the interactive modes do.
+            connections, seconds = ship_after_pauses(
+                upstream, session, args.labels, args.pause
+            )
+            print(
+                f"{name:12}  {connections:.1f} new connections, "
+                f"{1000 * seconds:6.1f} ms per label"
+            )
+
+            if session.health is not None:
+                print(f"  before the next package: {session.health.status()}")
+                upstream.offline = True
+                time.sleep(interval + 1.5)
+                print(f"  upstream offline:        {session.health.status()}")
+                upstream.offline = False
+                session.health.stop()
+            session.journal.close()
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
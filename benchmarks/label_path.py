@@ -0,0 +1,150 @@
+"""Compare the PNG and ZPL label paths from download to printer.
+
+Both paths fetch labels from :class:`fakes.FakeUpstream` and deliver them to a
+fake printer sink listening on a local TCP port, timing each label from the
+start of the download until the sink has received the last byte:
+
+* PNG: download, decode, paste the logo, and spool the 24-bit bitmap a GDI
+  print job carries to the printer driver;
+* ZPL: download, inject the cached logo graphic field, and send the bytes raw
+  with :func:`shippy.printing.base.send_to_device`, as ``print_raw`` does.
+
+Run from the repository root::
+
+    python benchmarks/label_path.py [--labels N] [--latency SECONDS]
+"""
+
+import argparse
+import os
+import pathlib
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from fakes import FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+class Sink:  # pylint: disable=too-few-public-methods
+    """A fake printer port that records how much each job sent, and when."""
+
+    def __init__(self):
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self.received: queue.Queue = queue.Queue()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    @property
+    def device(self) -> str:
+        """The sink as a ``[printer] device`` value."""
+        host, port = self._listener.getsockname()[:2]
+        return f"tcp:{host}:{port}"
+
+    def _serve(self):
+        while True:
+            connection, _ = self._listener.accept()
+            with connection:
+                size = 0
+                while chunk := connection.recv(1 << 16):
+                    size += len(chunk)
+            self.received.put((size, time.monotonic()))
+
+
+def run_png(upstream, sink, count):
+    """Yield ``(seconds, spooled_bytes)`` for labels through the PNG path."""
+    # pylint: disable=import-outside-toplevel
+    from shippy.misc import grab_png_from_url
+    from shippy.printing.base import send_to_device
+    from shippy.session import load_logo
+
+    logo = load_logo()
+    for index in range(count):
+        started = time.monotonic()
+        image = grab_png_from_url(f"{upstream.url}/labels/shp_{index}.png")
+        image.paste(logo, (450, 425))
+        send_to_device(sink.device, image.convert("RGB").tobytes())
+        size, done = sink.received.get()
+        yield done - started, size
+
+
+def run_zpl(upstream, sink, count):
+    """Yield ``(seconds, spooled_bytes)`` for labels through the ZPL path."""
+    # pylint: disable=import-outside-toplevel
+    from shippy import zpl
+    from shippy.misc import grab_bytes_from_url
+    from shippy.printing.base import send_to_device
+
+    field = zpl.logo_field()
+    for index in range(count):
+        started = time.monotonic()
+        label = grab_bytes_from_url(f"{upstream.url}/labels/shp_{index}.zpl")
+        send_to_device(sink.device, zpl.inject(label, field))
+        size, done = sink.received.get()
+        yield done - started, size
+
+
+def time_logo_field() -> tuple[float, float]:
+    """Return seconds to prepare the logo field cold, then from the disk cache."""
+    from shippy import zpl  # pylint: disable=import-outside-toplevel
+
+    timings = []
+    for _ in range(2):
+        zpl._cached_logo_field.cache_clear()  # pylint: disable=protected-access
+        started = time.monotonic()
+        zpl.logo_field()
+        timings.append(time.monotonic() - started)
+    return timings[0], timings[1]
+
+
+def summarize(name, runs):
+    """Print the median and worst time-to-printer and the spool size."""
+    seconds = sorted(duration for duration, _ in runs)
+    size = sum(size for _, size in runs) / len(runs)
+    median = seconds[len(seconds) // 2]
+    print(
+        f"{name:4s} median {1000 * median:7.1f} ms  max {1000 * seconds[-1]:7.1f} ms"
+        f"  spooled {size / 1024:8.1f} KiB/label"
+    )
+    return median, size
+
+
+def main():
+    """Time labels through the PNG and ZPL paths to a fake printer."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=50, help="labels per path")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to label downloads"
+    )
+    args = parser.parse_args()
+
+    # Keep the cached logo field out of the real data directory.
+    scratch = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+    os.environ["XDG_DATA_HOME"] = scratch.name
+    os.environ.pop("LOCALAPPDATA", None)
+    sys.path.insert(0, str(ROOT))
+
+    upstream = FakeUpstream({"labels": Profile(args.latency)}).start()
+    sink = Sink()
+
+    cold, cached = time_logo_field()
+    print(
+        f"logo field: {1000 * cold:.1f} ms to prepare, "
+        f"{1000 * cached:.2f} ms from the cache"
+    )
+
+    png_time, png_size = summarize("png", list(run_png(upstream, sink, args.labels)))
+    zpl_time, zpl_size = summarize("zpl", list(run_zpl(upstream, sink, args.labels)))
+    print(
+        f"zpl is {png_time / zpl_time:.1f}x faster to the printer and spools "
+        f"{png_size / zpl_size:.0f}x less"
+    )
+
+    upstream.shutdown()
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Check that memory stays flat over a long shipping session.
+
+A :class:`shippy.session.Session` talks to :class:`fakes.FakeUpstream` and
+discards labels through the ``null`` printer backend, shipping thousands of PNG
+labels the way a station does over a day, with an address typed into the Google
+Maps completer for each. :class:`shippy.memory.MemoryTracker` reports resident
+memory every ``--every`` labels; the summary compares the growth per 100 labels
+after warm-up with the size of one decoded label.
+
+Run from the repository root::
+
+    python benchmarks/memory.py [--labels N] [--every N] [--allocations]
+"""
+
+import argparse
+import io
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import ADDRESS, build_session
+from fakes import FakeUpstream
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+class FakeMaps:  # pylint: disable=too-few-public-methods
+    """Google Maps client answering autocomplete without the network."""
+
+    def places_autocomplete(self, input_text, **_kwargs):
+        """Return two predictions for the text."""
+        return [{"description": f"{input_text} {suffix}"} for suffix in ("St", "Ave")]
+
+
+def type_address(completer, number: int):
+    """Ask the completer for a new address, as typing one at the prompt does."""
+    # pylint: disable-next=import-outside-toplevel
+    from prompt_toolkit.document import Document
+
+    list(completer.get_completions(Document(f"{number} W 12th"), None))
+
+
+def ship_labels(session, completer, labels: int, report: io.StringIO) -> float:
+    """Ship labels, echoing the tracker's reports; return the seconds it took."""
+    reports = 0
+    started = time.monotonic()
+    for number in range(labels):
+        type_address(completer, number)
+        session.ship(ADDRESS, 32.0, unit="ELLIS")
+        lines = report.getvalue().splitlines()
+        if len(lines) > reports:
+            print(lines[-1])
+            reports = len(lines)
+    return time.monotonic() - started
+
+
+def rss_samples(output: str) -> list[float]:
+    """Return the RSS in MiB of each tracker report."""
+    return [
+        float(line.split("RSS ", 1)[1].split(" MiB", 1)[0])
+        for line in output.splitlines()
+        if "RSS " in line
+    ]
+
+
+def main():
+    """Ship thousands of labels and report how resident memory grows."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=5000, help="labels to ship")
+    parser.add_argument("--every", type=int, default=500, help="labels per report")
+    parser.add_argument(
+        "--allocations",
+        action="store_true",
+        help="also follow Python allocations (slower)",
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    # pylint: disable=import-outside-toplevel
+    from shippy import memory
+    from shippy.autocompletion import GoogleMapsCompleter
+
+    upstream = FakeUpstream().start()
+    report = io.StringIO()
+    tracker = memory.MemoryTracker(args.every, args.allocations, report)
+    completer = GoogleMapsCompleter(FakeMaps(), debounce_delay=0.0)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = build_session(upstream, tmpdir)
+        tracker.start()
+        memory.install(tracker)
+        elapsed = ship_labels(session, completer, args.labels, report)
+        memory.install(None)
+        tracker.stop()
+        session.journal.close()
+    upstream.shutdown()
+
+    samples = rss_samples(report.getvalue())
+    half = len(samples) // 2
+    intervals = max(len(samples) - 1 - half, 1)
+    growth = 100 * (samples[-1] - samples[half]) / (intervals * args.every)
+    print(
+        f"{args.labels} labels in {elapsed:.0f} s; RSS {samples[0]:.1f} MiB after "
+        f"{args.every} labels, {samples[-1]:.1f} MiB at the end; "
+        f"{1024 * growth:+.0f} KiB per 100 labels over the second half "
+        f"(one decoded label is {1200 * 1800 / 2**20:.1f} MiB); "
+        f"address cache {len(completer.cache)} of {completer.cache.maxsize} entries"
+    )
+
+
+if __name__ == "__main__":
+    main()
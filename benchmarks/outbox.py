@@ -0,0 +1,126 @@
+"""Queue labels through an upstream outage, then time the drain.
+
+A :class:`shippy.session.Session` with its outbox talks to
+:class:`fakes.FakeUpstream` and discards labels through the ``null`` printer
+backend. Labels for units are entered while every upstream request is hung up
+on, which queues them; then upstream comes back and the outbox drains. The
+report gives how long entering a label took while offline, how fast the queue
+drained, and whether the labels printed in the order they were entered. The
+run fails unless every label queued prints, in that order.
+
+Run from the repository root::
+
+    python benchmarks/outbox.py [--labels N] [--latency SECONDS] [--workers N]
+        [--rate PER_SECOND]
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import build_session
+from checks import expect, finish
+from fakes import SERVICES, FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def recording_session(upstream, tmpdir):
+    """Return a session against the fakes and the journal IDs it prints, in order."""
+    session = build_session(upstream, tmpdir)
+    printed: list = []
+    print_bought = session.print_bought
+
+    def record(bought, request_id=None):
+        print_bought(bought, request_id)
+        printed.extend(entry_id for _, entry_id in bought)
+
+    session.print_bought = record
+    return session, printed
+
+
+def printed_units(session, printed) -> list[str]:
+    """Return the units of printed journal entries."""
+    return [
+        session.journal._db.execute(  # pylint: disable=protected-access
+            "SELECT unit FROM shipments WHERE id = ?", (entry_id,)
+        ).fetchone()[0]
+        for entry_id in printed
+    ]
+
+
+def time_entries(drainer, count: int) -> float:
+    """Enter labels for ``count`` units; return the seconds it took."""
+    from shippy.server import AddressLookup  # pylint: disable=import-outside-toplevel
+
+    started = time.monotonic()
+    for index in range(count):
+        drainer.ship(AddressLookup("unit", index), [32.0], unit=f"UNIT {index:03d}")
+    return time.monotonic() - started
+
+
+def time_drain(drainer) -> float:
+    """Wait for the outbox to drain; return the seconds it took."""
+    started = time.monotonic()
+    while drainer.pending():
+        time.sleep(0.05)
+    return time.monotonic() - started
+
+
+def main():
+    """Queue labels while upstream is down and time the drain once it is up."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=40, help="labels to queue")
+    parser.add_argument(
+        "--latency", type=float, default=0.1, help="seconds added to every call"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="purchases at once")
+    parser.add_argument("--rate", type=float, default=10.0, help="purchases a second")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    # pylint: disable=import-outside-toplevel
+    from shippy.models import OutboxConfig
+    from shippy.outbox import Drainer, Outbox
+
+    config = OutboxConfig(workers=args.workers, rate=args.rate, retry_interval=0.5)
+    upstream = FakeUpstream({name: Profile(args.latency) for name in SERVICES})
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session, printed = recording_session(upstream.start(), tmpdir)
+        drainer = Drainer(
+            Outbox.open(os.path.join(tmpdir, "outbox.sqlite3")), session, config
+        )
+        drainer.start()
+
+        upstream.offline = True
+        entered = time_entries(drainer, args.labels)
+        print(
+            f"offline: {args.labels} labels queued, "
+            f"{1000 * entered / args.labels:.1f} ms per entry"
+        )
+
+        upstream.offline = False
+        drained = time_drain(drainer)
+        drainer.stop()
+
+        units = printed_units(session, printed)
+        in_order = units == sorted(units) and len(units) == args.labels
+        print(
+            f"drained {len(units)} labels in {drained:.1f} s "
+            f"({60 * len(units) / drained:.0f} labels/min, including up to "
+            f"{config.retry_interval:g} s to notice upstream is back); "
+            f"printed in entry order: {'yes' if in_order else 'NO'}"
+        )
+        session.journal.close()
+
+    expect(len(units) == args.labels, "every label queued while offline prints")
+    expect(units == sorted(units), "labels print in the order they were entered")
+    upstream.shutdown()
+    finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Time labels printed through a pool of fake printers, against a single one.
+
+Several threads print labels through a :class:`shippy.printing.pool.PrinterPool`
+of :class:`shippy.printing.pool.FakePrinter` objects, once with one printer and
+once with three under each strategy. The report gives labels per second and
+how the labels spread over the printers.
+
+The run fails unless every label prints and the pool spreads them, a job that
+never reached the spooler is retried on another printer, one that did is not
+retried, and a failed printer is left out until its cooldown ends.
+
+Run from the repository root::
+
+    python benchmarks/printer_pool.py [--labels N] [--threads N]
+"""
+
+import argparse
+import pathlib
+import sys
+import threading
+import time
+
+from checks import expect, finish
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# Seconds each fake printer takes per label, and the pool's cooldown.
+SECONDS = 0.02
+COOLDOWN = 0.2
+
+
+def print_labels(pool, printers, labels: int, threads: int) -> float:
+    """Print labels from several threads; return the seconds it took."""
+
+    def client(count):
+        for label in range(count):
+            pool.run(lambda name, label=label: printers[name].print_label(label))
+
+    started = time.monotonic()
+    clients = [
+        threading.Thread(target=client, args=(labels // threads,))
+        for _ in range(threads)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return time.monotonic() - started
+
+
+def check_retries():
+    """Check which failed jobs are retried, and the cooldown of a failed printer."""
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.printing.pool import NotSpooled, PrinterPool
+
+    pool = PrinterPool(lambda: ["A", "B"], strategy="round-robin", cooldown=COOLDOWN)
+    tried: list[str] = []
+
+    def not_spooled(name):
+        tried.append(name)
+        if name == "A":
+            raise NotSpooled("printer queue offline")
+        return name
+
+    def spooled(name):
+        tried.append(name)
+        raise RuntimeError("print job failed")
+
+    print("retries:")
+    expect(pool.run(not_spooled) == "B", "a job never spooled prints on another")
+    ejected = {name for name, _, out in pool.status() if out}
+    expect(ejected == {"A"}, "the printer that failed is left out")
+    tried.clear()
+    try:
+        pool.run(spooled)
+    except RuntimeError:
+        pass
+    expect(tried == ["B"], "a job the spooler took is not retried")
+    expect(all(out for _, _, out in pool.status()), "both failed printers are left out")
+    time.sleep(COOLDOWN * 2.5)
+    expect(
+        pool.run(lambda name: name) in ("A", "B"), "a printer returns after cooldown"
+    )
+
+
+def main():
+    """Print labels through one fake printer and through pools of three."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=60, help="labels per run")
+    parser.add_argument("--threads", type=int, default=4, help="printing threads")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.printing.pool import STRATEGIES, FakePrinter, PrinterPool
+
+    labels = args.labels - args.labels % args.threads
+    runs = [("one printer", "least-busy", 1)]
+    runs += [(strategy, strategy, 3) for strategy in STRATEGIES]
+    for name, strategy, count in runs:
+        printers = {f"Desk {n}": FakePrinter(SECONDS) for n in range(1, count + 1)}
+        pool = PrinterPool(lambda printers=printers: list(printers), strategy)
+        elapsed = print_labels(pool, printers, labels, args.threads)
+        spread = [printer.printed for printer in printers.values()]
+        print(
+            f"{name:11} {labels / elapsed:6.1f} labels/s, "
+            f"printed {'/'.join(map(str, spread))}"
+        )
+        expect(sum(spread) == labels, "every label prints")
+        expect(min(spread) > 0, "every printer prints some labels")
+
+    check_retries()
+    finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Count postage wasted on a printer out of paper, with and without the watch.
+
+A :class:`shippy.session.Session` talks to :class:`fakes.FakeUpstream` and
+prints through the ``null`` backend, which here fails like a printer out of
+paper while a :class:`shippy.printing.watch.FakeSpooler` reports
+``PAPER_OUT``. The printer runs out after a third of the labels and is fixed
+``--out`` labels later. Without the watch, every label entered meanwhile is
+bought, fails to print and is refunded; with it, they are refused before
+anything is bought. The report also gives the watch's cost per label when the
+printer is ready.
+
+The run fails unless, with the watch, exactly the labels entered while out of
+paper are refused, nothing is refunded, and checking the printer never waits
+on the spooler.
+
+Run from the repository root::
+
+    python benchmarks/printer_watch.py [--labels N] [--out N]
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import ADDRESS, build_session
+from checks import expect, finish
+from fakes import FakeUpstream
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# Seconds the operator takes between labels, and between status samples.
+PACE = 0.05
+INTERVAL = 0.02
+
+
+def out_of_paper(null, spooler):
+    """Make the null backend fail while the spooler reports a problem."""
+    print_images = null.print_images
+
+    def print_or_fail(images, printer=None):
+        if spooler.problems:
+            raise RuntimeError("print job failed: out of paper")
+        print_images(images, printer)
+
+    null.print_images = print_or_fail
+
+
+def count_refunds(upstream) -> list[str]:
+    """Record the shipments EasyPost is asked to refund."""
+    refunds: list[str] = []
+    route_easypost = upstream.route_easypost
+
+    def route(method, path, body=b""):
+        if path.endswith("/refund"):
+            refunds.append(path)
+        return route_easypost(method, path, body)
+
+    upstream.route_easypost = route
+    return refunds
+
+
+def ship(session, spooler, labels: int, out: int) -> tuple[int, int]:
+    """Ship labels while the printer runs out; return (printed, refused)."""
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.printing.watch import PrinterNotReady
+
+    printed = refused = 0
+    for number in range(labels):
+        spooler.problems = ["PAPER_OUT"] if 0 <= number - labels // 3 < out else []
+        time.sleep(PACE)
+        try:
+            session.ship(ADDRESS, 32.0)
+            printed += 1
+        except PrinterNotReady:
+            refused += 1
+        except RuntimeError:
+            pass
+    return printed, refused
+
+
+def gate_cost(watch, checks: int = 10_000) -> float:
+    """Return microseconds per check of a ready printer."""
+    started = time.perf_counter()
+    for _ in range(checks):
+        watch.check()
+    return 1e6 * (time.perf_counter() - started) / checks
+
+
+def main():
+    """Ship labels through a paper outage with and without the printer watch."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=30, help="labels to ship")
+    parser.add_argument(
+        "--out", type=int, default=6, help="labels entered while out of paper"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    # pylint: disable=import-outside-toplevel
+    from shippy.printing import null
+    from shippy.printing.watch import FakeSpooler, PrinterWatch
+
+    upstream = FakeUpstream().start()
+    refunds = count_refunds(upstream)
+    spooler = FakeSpooler(delay=0.002)
+    out_of_paper(null, spooler)
+    queries = 0
+
+    for mode in ("no watch", "watch"):
+        refunds.clear()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            session = build_session(upstream, tmpdir, "watch = false\n")
+            if mode == "watch":
+                session.printer = PrinterWatch(spooler.status, INTERVAL)
+                session.printer.start()
+            printed, refused = ship(session, spooler, args.labels, args.out)
+            cost = ""
+            if session.printer is not None:
+                cost = f"; {gate_cost(session.printer):.2f} us per check when ready"
+                session.printer.stop()
+                queries = spooler.queries
+                gate_cost(session.printer, 100)
+            session.journal.close()
+        print(
+            f"{mode:8} {printed} of {args.labels} printed, "
+            f"{args.labels - printed - refused} bought and refunded, "
+            f"{refused} refused before buying, "
+            f"{len(refunds)} refund calls" + cost
+        )
+    expect(refused == args.out, "labels entered while out of paper are refused")
+    expect(not refunds, "no label is bought while out of paper")
+    expect(spooler.queries == queries, "a check never queries the spooler")
+    upstream.shutdown()
+    finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare rating every carrier with rating only the one service bought.
+
+A :class:`shippy.session.Session` talks to :class:`fakes.FakeUpstream` and
+discards labels through the ``null`` printer backend, with every outbound call
+traced. Labels are shipped once with ``[rating] service`` empty, which rates
+every carrier on the account and then buys the lowest USPS rate, and once with
+the default Library Mail policy, which rates only the USPS carrier account and
+buys in the same call. The report gives the EasyPost calls per label, the bytes
+of shipment (rate) responses per label, and how long those calls took.
+
+The run fails unless the pinned policy makes fewer EasyPost calls and fetches
+fewer rate bytes per label than rating every carrier.
+
+Run from the repository root::
+
+    python benchmarks/rating.py [--latency SECONDS] [--labels N]
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import ADDRESS, build_session
+from checks import expect, finish
+from fakes import SERVICES, FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+POLICIES = {
+    "every carrier": "\n[rating]\nservice =\n",
+    "pinned": "",
+}
+
+
+def easypost_calls(trace_path: str, since: float) -> list[dict]:
+    """Return the traced EasyPost calls made since a timestamp."""
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.metrics import read_events
+
+    return [
+        call
+        for call in read_events(trace_path, since)
+        if call["endpoint"].startswith("/v2/")
+    ]
+
+
+def run_policy(upstream, tmpdir: str, extra: str, labels: int) -> dict[str, float]:
+    """Ship labels under a rating policy; return per-label measurements."""
+    session = build_session(upstream, tmpdir, extra)
+    session.carrier_accounts()
+    trace_path = os.path.join(tmpdir, "http-trace.jsonl")
+
+    since = time.time()
+    started = time.monotonic()
+    for _ in range(labels):
+        session.ship(ADDRESS, 32.0, unit="ELLIS")
+    elapsed = time.monotonic() - started
+    session.journal.close()
+
+    calls = easypost_calls(trace_path, since)
+    shipments = [call for call in calls if call["endpoint"].startswith("/v2/shipments")]
+    return {
+        "calls": len(calls) / labels,
+        "bytes": sum(call["bytes_in"] for call in shipments) / labels,
+        "purchase": sum(call["total_s"] for call in shipments) / labels,
+        "label": elapsed / labels,
+    }
+
+
+def main():
+    """Time buying postage with and without a pinned rating policy."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--latency", type=float, default=0.1, help="seconds added to every call"
+    )
+    parser.add_argument("--labels", type=int, default=20, help="labels per policy")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    from shippy import tracing  # pylint: disable=import-outside-toplevel
+
+    upstream = FakeUpstream({name: Profile(args.latency) for name in SERVICES}).start()
+    results = {}
+    for policy, extra in POLICIES.items():
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracing.install(os.path.join(tmpdir, "http-trace.jsonl"))
+            results[policy] = run_policy(upstream, tmpdir, extra, args.labels)
+            tracing.uninstall()
+        result = results[policy]
+        print(
+            f"{policy:13s} {result['calls']:4.1f} EasyPost calls, "
+            f"{result['bytes'] / 1024:5.1f} KiB of rates, "
+            f"{1000 * result['purchase']:6.1f} ms buying, "
+            f"{1000 * result['label']:6.1f} ms per label"
+        )
+
+    shop, pinned = results["every carrier"], results["pinned"]
+    print(
+        f"pinned rating: {shop['bytes'] / pinned['bytes']:.1f}x fewer rate bytes, "
+        f"{shop['purchase'] / pinned['purchase']:.1f}x faster purchase"
+    )
+    expect(pinned["calls"] < shop["calls"], "pinned rating makes fewer calls")
+    expect(pinned["bytes"] < shop["bytes"], "pinned rating fetches fewer rates")
+    upstream.shutdown()
+    finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Time resolving scanned request slips with and without the request index.
+
+A :class:`shippy.server.Server` talks to the IBP stand-in of
+:class:`fakes.FakeUpstream`. Compound request IDs (``TX-2400000-1``) of the
+day's packed requests are resolved to their addresses once with an empty
+request index, which asks the server for every autoid, and once after a bulk
+refresh, which only fetches the address. The report gives IBP round trips and
+milliseconds per slip.
+
+Run from the repository root::
+
+    python benchmarks/request_index.py [--slips N] [--latency SECONDS]
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from fakes import PACKED_REQUESTS, FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def packed_slips(count: int) -> list[tuple[str, int, int]]:
+    """Return compound request IDs of the day's packed requests."""
+    slips = []
+    for key in list(PACKED_REQUESTS)[:count]:
+        jurisdiction, inmate_id, index = key.split("-")
+        slips.append((jurisdiction, int(inmate_id), int(index)))
+    return slips
+
+
+def resolve_slips(upstream, server, slips: list) -> tuple[float, float]:
+    """Resolve slips' addresses; return round trips and seconds per slip."""
+    calls = upstream.requests["ibp"]
+    started = time.monotonic()
+    for request_id in slips:
+        server.request_address(request_id)
+    elapsed = time.monotonic() - started
+    return (upstream.requests["ibp"] - calls) / len(slips), elapsed / len(slips)
+
+
+def main():
+    """Resolve request slips with a cold and a refreshed request index."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--slips", type=int, default=50, help="slips to resolve")
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds added to every call"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    # pylint: disable=import-outside-toplevel
+    from shippy.request_index import RequestIndex
+    from shippy.server import Server
+
+    upstream = FakeUpstream({"ibp": Profile(args.latency)}).start()
+    slips = packed_slips(args.slips)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = Server(f"{upstream.url}/ibp/", "fake")
+        server.request_index = RequestIndex.load(os.path.join(tmpdir, "index.json"))
+        cold = resolve_slips(upstream, server, slips)
+
+        server.request_index = RequestIndex.load(os.path.join(tmpdir, "fresh.json"))
+        started = time.monotonic()
+        indexed = server.refresh_request_index()
+        refresh = time.monotonic() - started
+        warm = resolve_slips(upstream, server, slips)
+
+    print(f"cold index {cold[0]:.1f} round trips, {1000 * cold[1]:6.1f} ms per slip")
+    print(f"refreshed  {warm[0]:.1f} round trips, {1000 * warm[1]:6.1f} ms per slip")
+    print(
+        f"bulk refresh of {indexed} requests took {1000 * refresh:.0f} ms; "
+        f"slips resolve {cold[1] / warm[1]:.1f}x faster after it"
+    )
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Count pages per label when printing labels on sheets of office paper.
+
+A :class:`shippy.session.Session` talks to :class:`fakes.FakeUpstream` and
+ships labels through the ``null`` printer backend, once one label per page and
+once each ``2-up`` on letter paper and ``4-up`` on legal paper. The last sheet
+is left partly filled, to be printed when shippy exits. The report gives pages
+and milliseconds per label, the page size in inches, and how many labels the
+journal settled as printed. The run fails unless every label, the last
+sheet's included, is printed and journaled.
+
+Run from the repository root::
+
+    python benchmarks/sheets.py [--labels N]
+"""
+
+import argparse
+import collections
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import ADDRESS, build_session
+from checks import expect, finish
+from fakes import FakeUpstream
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+MODES = {
+    "one per page": "",
+    "2-up letter": "sheet = 2-up\nsheet_paper = letter\n",
+    "4-up legal": "sheet = 4-up\nsheet_paper = legal\n",
+}
+
+
+def count_pages(null, pages: collections.Counter):
+    """Count the pages the null backend is asked to print, and their size."""
+    print_images, print_pages = null.print_images, null.print_pages
+
+    def count_images(images, printer=None):
+        pages["pages"] += len(images)
+        print_images(images, printer)
+
+    def count_sheets(sheets, dpi, printer=None):
+        pages["pages"] += len(sheets)
+        pages["inches"] = tuple(round(size / dpi, 2) for size in sheets[0].size)
+        print_pages(sheets, dpi, printer)
+
+    null.print_images, null.print_pages = count_images, count_sheets
+
+
+def ship(upstream, tmpdir, extra: str, labels: int) -> tuple[float, int]:
+    """Ship labels and flush the last sheet; return seconds and labels printed."""
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.printing import flush_sheets
+
+    session = build_session(upstream, tmpdir, extra)
+    started = time.monotonic()
+    for _ in range(labels):
+        session.ship(ADDRESS, 32.0, unit="ELLIS")
+    flush_sheets()
+    elapsed = time.monotonic() - started
+    printed = labels - len(session.in_flight())
+    session.journal.close()
+    return elapsed, printed
+
+
+def main():
+    """Ship labels one per page, 2-up and 4-up, and compare the pages printed."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=21, help="labels to ship")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    from shippy.printing import null  # pylint: disable=import-outside-toplevel
+
+    upstream = FakeUpstream().start()
+    pages: collections.Counter = collections.Counter()
+    count_pages(null, pages)
+
+    for mode, extra in MODES.items():
+        pages.clear()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            elapsed, printed = ship(upstream, tmpdir, extra, args.labels)
+        size = pages.get("inches")
+        print(
+            f"{mode:13} {pages['pages']:3d} pages, "
+            f"{pages['pages'] / args.labels:.2f} per label, "
+            f"{1000 * elapsed / args.labels:5.1f} ms per label"
+            + (f", {size[0]:g}x{size[1]:g} in pages" if size else "")
+            + f"; {printed} of {args.labels} labels journaled as printed"
+        )
+        expect(printed == args.labels, "every label is journaled printed, the last too")
+    upstream.shutdown()
+    finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Time the operator's wait per package in queue mode and with typed request IDs.
+
+A :class:`shippy.session.Session` ships the day's packed requests from the IBP
+stand-in of :class:`fakes.FakeUpstream`, with ``--latency`` seconds added to
+every IBP and EasyPost call. The operator spends ``--weigh`` seconds weighing
+each package. With typed request IDs, the address is looked up and verified
+once the weight is in; in queue mode, :class:`shippy.workqueue.WorkQueue` lists
+the ready requests and fetches the next addresses while the operator weighs,
+and acknowledges shipped requests in batches. The report gives milliseconds the
+operator waits per package, IBP calls per package, and how many requests the
+server saw acknowledged.
+
+The run fails unless every request shipped in queue mode is acknowledged, none
+before its label printed. A last pass prints labels 2-up on sheets and fails
+the second sheet: only the labels of the first may be acknowledged, and the
+one on the failed sheet must be reported as never printed.
+
+Run from the repository root::
+
+    python benchmarks/work_queue.py [--labels N] [--latency SECONDS]
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+
+from boxes import build_session
+from checks import expect, finish
+from fakes import PACKED_REQUESTS, FakeUpstream, Profile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def ship_typed(session, labels: int, weigh: float) -> float:
+    """Ship requests by autoid as typed; return the wait per package."""
+    waited = 0.0
+    for autoid in list(PACKED_REQUESTS.values())[:labels]:
+        time.sleep(weigh)
+        started = time.monotonic()
+        address = session.server.request_address(autoid)
+        session.ship(address, 32.0, request_id=str(autoid))
+        waited += time.monotonic() - started
+    return waited / labels
+
+
+def watch_acknowledgements(upstream, printed: set[int]) -> list[int]:
+    """Return the requests acknowledged before their label printed, as it goes."""
+    early: list[int] = []
+    # pylint: disable-next=protected-access
+    acknowledge = upstream._ack_requests
+
+    def ack_requests(form):
+        early.extend(sorted({int(a) for a in form["autoids"][0].split(",")} - printed))
+        return acknowledge(form)
+
+    upstream._ack_requests = ack_requests  # pylint: disable=protected-access
+    return early
+
+
+def work_queue(session, printed: set[int]):
+    """Return a queue over the ready requests, noting each label printed."""
+    # pylint: disable-next=import-outside-toplevel
+    from shippy.workqueue import WorkQueue
+
+    config = session.config.queue
+    work = WorkQueue(
+        session.server,
+        session.prefetch_address,
+        prefetch=config.prefetch,
+        page_size=config.page_size,
+        ack_batch=config.ack_batch,
+    )
+
+    def on_printed(request_id):
+        printed.add(PACKED_REQUESTS[request_id])
+        work.shipped(request_id)
+
+    session.on_printed = on_printed
+    return work
+
+
+def ship_queue(session, printed: set[int], labels: int, weigh: float):
+    """Ship the ready requests in queue mode.
+
+    Returns the wait per package, the autoids shipped, and what
+    :meth:`~shippy.workqueue.WorkQueue.close` reported.
+    """
+    work = work_queue(session, printed)
+    waited, shipped = 0.0, set()
+    for _ in range(labels):
+        started = time.monotonic()
+        ready = work.next()
+        waited += time.monotonic() - started
+        time.sleep(weigh)
+        started = time.monotonic()
+        work.entered(ready)
+        session.ship(ready.destination(), 32.0, request_id=ready.request_id)
+        shipped.add(ready.autoid)
+        waited += time.monotonic() - started
+    closed = work.close()
+    session.on_printed = None
+    return waited / labels, shipped, closed
+
+
+def check_sheets(upstream, printed: set[int]):
+    """Ship three requests 2-up on sheets, the second sheet failing."""
+    # pylint: disable=import-outside-toplevel
+    from shippy.printing import flush_sheets, null
+
+    acknowledged = set(upstream.acknowledged)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = build_session(upstream, tmpdir, "sheet = 2-up\n")
+        work = work_queue(session, printed)
+        entered = []
+        for _ in range(3):
+            ready = work.next()
+            work.entered(ready)
+            session.ship(ready.destination(), 32.0, request_id=ready.request_id)
+            entered.append(ready.autoid)
+
+        print_pages = null.print_pages
+
+        def out_of_paper(pages, dpi, printer=None):
+            raise RuntimeError("print job failed: out of paper")
+
+        null.print_pages = out_of_paper
+        try:
+            flush_sheets()
+        finally:
+            null.print_pages = print_pages
+        unacknowledged, unshipped = work.close()
+        session.on_printed = None
+        session.journal.close()
+
+    print("sheets, the second failing:")
+    expect(
+        upstream.acknowledged - acknowledged == set(entered[:2]),
+        "only the labels of the sheet that printed are acknowledged",
+    )
+    expect(
+        (unacknowledged, unshipped) == ([], entered[2:]),
+        "the label on the failed sheet is reported as never printed",
+    )
+
+
+def main():
+    """Ship packed requests with typed request IDs and in queue mode."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--labels", type=int, default=25, help="packages to ship")
+    parser.add_argument(
+        "--latency", type=float, default=0.1, help="seconds added to every call"
+    )
+    parser.add_argument(
+        "--weigh", type=float, default=0.5, help="seconds to weigh each package"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    upstream = FakeUpstream(
+        {"ibp": Profile(args.latency), "easypost": Profile(args.latency)}
+    ).start()
+    printed: set[int] = set()
+    early = watch_acknowledgements(upstream, printed)
+    shipped: set[int] = set()
+    closed: tuple = ()
+
+    for name in ("typed IDs", "queue"):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            session = build_session(upstream, tmpdir)
+            calls = upstream.requests["ibp"]
+            if name == "queue":
+                waited, shipped, closed = ship_queue(
+                    session, printed, args.labels, args.weigh
+                )
+            else:
+                waited = ship_typed(session, args.labels, args.weigh)
+            calls = (upstream.requests["ibp"] - calls) / args.labels
+            session.journal.close()
+        print(
+            f"{name:9}  {1000 * waited:6.1f} ms waiting per package, "
+            f"{calls:.2f} IBP calls per package"
+        )
+
+    print(
+        f"{len(upstream.acknowledged)} of {args.labels} queued requests "
+        "acknowledged on the server"
+    )
+    expect(upstream.acknowledged == shipped, "every request shipped is acknowledged")
+    expect(closed == ([], []), "nothing is left unacknowledged or unprinted")
+
+    check_sheets(upstream, printed)
+    expect(not early, "no request is acknowledged before its label printed")
+    upstream.shutdown()
+    finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,64 @@
 """Autocompletion for questionary."""
 
 import os
+import re
 import sys
 import threading
-import time
+import typing
 
-import googlemaps  # type: ignore
 import questionary
 from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
 from prompt_toolkit.document import Document
 
+from .history import UnitHistory
+from .memory import BoundedCache
+
+if typing.TYPE_CHECKING:
+    import googlemaps  # type: ignore
+
 
 class GoogleMapsCompleter(Completer):
-    """Address completer that uses Google Maps."""
+    """Address completer that uses Google Maps.
+
+    Predictions are cached for the most recent ``cache_size`` texts. Typing
+    wakes the completion threads of older keystrokes, which then end at once
+    instead of sleeping out the debounce delay.
+    """
 
-    gmaps: googlemaps.Client
-    cache: dict[str, list[Completion]]
+    gmaps: "googlemaps.Client"
+    cache: BoundedCache[str, list[Completion]]
     debounce_delay: float
     latest_text: str
     lock: threading.Lock
 
-    def __init__(self, gmaps: googlemaps.Client, debounce_delay: float = 2.0):
+    def __init__(
+        self,
+        gmaps: "googlemaps.Client",
+        debounce_delay: float = 2.0,
+        cache_size: int = 256,
+    ):
         self.gmaps = gmaps
-        self.cache = {}
+        self.cache = BoundedCache(cache_size)
         self.debounce_delay = float(debounce_delay)
         self.latest_text = ""
         self.lock = threading.Lock()
+        self._typed = threading.Condition()
         super().__init__()
 
     def get_completions(self, document: Document, complete_event):
         """Get address completions."""
-        self.latest_text = text = document.text_before_cursor
-        time.sleep(self.debounce_delay)
+        import googlemaps  # pylint: disable=import-outside-toplevel,redefined-outer-name
 
-        # After sleeping, check if a newer keystroke has changed the desired text.
-        # If so, this thread is outdated and should abort.
-        if self.latest_text != text:
-            return
+        text = document.text_before_cursor
+        with self._typed:
+            self.latest_text = text
+            self._typed.notify_all()
+            # Wait out the debounce delay unless a newer keystroke changes the
+            # desired text, in which case this thread is outdated and aborts.
+            if self._typed.wait_for(
+                lambda: self.latest_text != text, self.debounce_delay
+            ):
+                return
 
         if len(text) < 3:
             return
@@ -69,8 +91,162 @@ class GoogleMapsCompleter(Completer):
         yield from predictions
 
 
+_NON_ALNUM_RE = re.compile(r"[^0-9A-Z]+")
+
+
+def _normalize(text: str) -> list[str]:
+    """Split text into uppercase alphanumeric tokens."""
+    return [token for token in _NON_ALNUM_RE.split(text.upper()) if token]
+
+
+def _within_distance(query: str, target: str, limit: int) -> bool:
+    """Return whether two strings are within ``limit`` edits of each other.
+
+    Banded Levenshtein: only cells within ``limit`` of the diagonal can stay
+    under the limit, and a row whose minimum exceeds it ends the search early.
+    """
+    if abs(len(query) - len(target)) > limit:
+        return False
+
+    previous = list(range(len(target) + 1))
+    for i, query_char in enumerate(query, start=1):
+        current = [i] + [limit + 1] * len(target)
+        for j in range(max(1, i - limit), min(len(target), i + limit) + 1):
+            cost = 0 if query_char == target[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost
+            )
+        if min(current) > limit:
+            return False
+        previous = current
+
+    return previous[-1] <= limit
+
+
+def _is_subsequence(query: str, target: str) -> bool:
+    """Return whether every character of query appears in order in target."""
+    remaining = iter(target)
+    return all(char in remaining for char in query)
+
+
+def _typo_limit(token: str) -> int:
+    """Number of typos tolerated in a query token of this length."""
+    if len(token) >= 7:
+        return 2
+    if len(token) >= 4:
+        return 1
+    return 0
+
+
+class _IndexedName:  # pylint: disable=too-few-public-methods
+    """Precomputed match keys for one unit name."""
+
+    __slots__ = ("name", "compact", "tokens", "initials")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tokens = _normalize(name)
+        self.compact = "".join(self.tokens)
+        self.initials = "".join(token[0] for token in self.tokens)
+
+
+class UnitIndex:  # pylint: disable=too-few-public-methods
+    """Fuzzy index over unit names, ranked by shipping history.
+
+    A query matches a unit in one of several tiers, best first: an exact name,
+    a prefix of the name, every query token a prefix of some name token (in any
+    order), an abbreviation (initials or an in-order subsequence), a substring,
+    and finally a token within one or two typos of a name token. Within a tier,
+    units this station ships to often and recently sort first.
+    """
+
+    history: UnitHistory
+    limit: int
+
+    def __init__(
+        self, units, history: UnitHistory, limit: int = 12, cache_size: int = 256
+    ):
+        self._names = [_IndexedName(unit) for unit in units]
+        self.history = history
+        self.limit = int(limit)
+        self._cache: BoundedCache[tuple[str, float], tuple[str, ...]] = BoundedCache(
+            cache_size
+        )
+
+    @staticmethod
+    def _tier(entry: _IndexedName, query: str, tokens: list[str]) -> int:
+        """Return the match tier of a unit for a query; 0 means no match."""
+        # pylint: disable=too-many-return-statements
+        if query == entry.compact:
+            return 6
+        if entry.compact.startswith(query):
+            return 5
+        if all(
+            any(name_token.startswith(token) for name_token in entry.tokens)
+            for token in tokens
+        ):
+            return 4
+        if entry.initials.startswith(query) or (
+            query[0] == entry.compact[0] and _is_subsequence(query, entry.compact)
+        ):
+            return 3
+        if query in entry.compact:
+            return 2
+        if all(
+            any(
+                _within_distance(token, name_token[: len(token)], _typo_limit(token))
+                for name_token in entry.tokens
+            )
+            for token in tokens
+        ):
+            return 1
+        return 0
+
+    def _search(self, query: str) -> tuple[str, ...]:
+        """Return ranked unit names for a normalized query."""
+        tokens = query.split()
+        compact = "".join(tokens)
+
+        scored = []
+        for entry in self._names:
+            tier = self._tier(entry, compact, tokens) if compact else 1
+            if tier:
+                scored.append((-tier, -self.history.score(entry.name), entry.name))
+
+        scored.sort()
+        return tuple(name for _, _, name in scored[: self.limit])
+
+    def search(self, text: str) -> tuple[str, ...]:
+        """Return the best-ranked unit names for a query, best first."""
+        query = " ".join(_normalize(text))
+        # Keying the cache on the newest history timestamp invalidates it as
+        # soon as a shipment is recorded, while repeated refreshes of the same
+        # text between shipments are served without rescoring.
+        key = (query, self.history.latest)
+        if key not in self._cache:
+            self._cache[key] = self._search(query)
+        return self._cache[key]
+
+
+class UnitCompleter(Completer):
+    """Unit name completer backed by a prebuilt :class:`UnitIndex`."""
+
+    index: UnitIndex
+
+    def __init__(self, index: UnitIndex):
+        self.index = index
+        super().__init__()
+
+    def get_completions(self, document: Document, complete_event):
+        """Get ranked unit completions replacing the whole input."""
+        text = document.text_before_cursor
+        for name in self.index.search(text):
+            yield Completion(text=name, start_position=-len(text))
+
+
 def demo():
     """Prompts the user for an address using the custom completer."""
+    import googlemaps  # pylint: disable=import-outside-toplevel,redefined-outer-name
 
     api_key = os.getenv("Maps_API_KEY")
     if not api_key:
@@ -1,95 +1,353 @@
-"""Run the application in a CLI."""
+"""Run the application in a CLI.
+
+Only the standard library is imported at module load. Every subcommand imports
+what it needs when it runs, so ``diagnose-printer`` never loads EasyPost or
+questionary and only ``manual`` pays for Google Maps; see
+``benchmarks/import_time.py``, which checks every subcommand's startup imports.
+"""
+
+# pylint: disable=import-outside-toplevel
 
 import argparse
 import configparser
 import contextlib
-import importlib.resources
 import pathlib
+import sys
+import time
+import typing
+
+from . import stream
+
+if typing.TYPE_CHECKING:
+    from .models import Config
+    from .outbox import Drainer
+    from .scale import Scale
+    from .startup import Startup
+
+
+def detect_scale(
+    config: "Config", startup: "Startup"
+) -> typing.Callable[[], typing.Optional["Scale"]]:
+    """Start looking for the configured scale; return a getter waiting for it.
+
+    Detection can take a couple of seconds, so it runs alongside the rest of
+    startup and is only waited for at the first weight prompt.
+    """
+    if config.scale.port is None:
+        return lambda: None
+
+    from . import console
+    from .scale import Scale
+
+    startup.submit("scale", Scale.from_config, config.scale)
+    found: list[typing.Optional[Scale]] = []
+
+    def get_scale():
+        if not found:
+            scale = startup.result(
+                "scale",
+                f"Looking for a scale on {config.scale.port}",
+                stage="Looking for a scale",
+            )
+            if scale is None:
+                console.warn("No scale detected, weights will be entered by hand.")
+            found.append(scale)
+        return found[0]
 
-import easypost  # type: ignore
-import googlemaps  # type: ignore
-import questionary
-from PIL import Image
+    return get_scale
 
-from . import console, shipping
-from .misc import grab_png_from_url
-from .models import Config
-from .printing import print_image, snapshot_printer_state
-from .server import Server
 
+def generate_addresses_bulk(config: "Config", startup: "Startup", _session):
+    """Generate address lookups, weights in ounces and journal keys for units.
+
+    Several boxes may go to one unit, so the weight is a list of weights.
+    """
+    from . import console
+    from .history import UnitHistory
+    from .server import AddressLookup, Server
 
-def generate_addresses_bulk(config: Config):
-    """Generate addresses for bulk shipping."""
     server = Server.from_config(config.ibp)
+    startup.submit("unit list", server.unit_ids)
+    startup.submit("unit history", UnitHistory.load)
+    scale = detect_scale(config, startup)
 
-    with console.task_message("Grabbing units list from IBP server"):
-        units = server.unit_ids()
+    units = startup.result("unit list", "Grabbing units list from IBP server")
 
     # Normalize unit names to uppercase.
     units = {key.upper(): value for key, value in units.items()}
 
+    history = startup.result("unit history", "Loading unit history")
+    prompt = console.UnitPrompt(units, history)
+
     while True:
-        unit = console.query_unit(units)
+        startup.mark("first prompt")
+        unit = prompt.ask()
         if unit is None:
             continue
 
-        unit_id = units[unit]
-        to_addr = server.unit_address(unit_id)
+        # Looked up when shipping, so that it can wait if the server is down.
+        to_addr = AddressLookup("unit", units[unit])
 
-        weight = console.query_weight()
-        if weight is None:
+        weights = console.query_box_ounces(scale())
+        if weights is None:
             continue
 
-        yield to_addr, weight
+        yield to_addr, weights, {"unit": unit}
 
+        # Resuming means the label was shipped; rank this unit higher next time.
+        history.record(unit)
 
-def generate_addresses_individual(config: Config):
-    """Generate addresses for individual shipping."""
-    server = Server.from_config(config.ibp)
+
+def generate_addresses_individual(config: "Config", startup: "Startup", _session):
+    """Generate address lookups, weights in ounces and journal keys for requests."""
+    from . import console
+    from .server import AddressLookup
+
+    scale = detect_scale(config, startup)
 
     while True:
+        startup.mark("first prompt")
         request_id = console.query_request_id()
         if request_id is None:
             continue
 
-        to_addr = server.request_address(request_id)
+        to_addr = AddressLookup("request", request_id)
 
-        weight = console.query_weight()
+        weight = console.query_ounces(scale())
         if weight is None:
             continue
 
-        yield to_addr, weight
+        yield to_addr, weight, {"request_id": stream.format_request_id(request_id)}
 
 
-def generate_addresses_manual(config: Config):
-    """Generate addresses for manual shipping."""
-    gmaps = googlemaps.Client(key=config.googlemaps.apikey)
+def generate_addresses_manual(config: "Config", startup: "Startup", _session):
+    """Generate addresses, weights in ounces and journal keys for manual shipping."""
+    import googlemaps  # type: ignore
+    import requests
+
+    from . import console
+    from .deadline import bound
+
+    gmaps = googlemaps.Client(
+        key=config.googlemaps.apikey,
+        base_url=str(config.googlemaps.base_url).rstrip("/"),
+        # Traced like every other call.
+        requests_session=bound(requests.Session()),
+    )
+    scale = detect_scale(config, startup)
 
     while True:
+        startup.mark("first prompt")
         to_addr = console.query_address(gmaps)
         if not to_addr:
             continue
 
-        weight = console.query_weight()
+        weight = console.query_ounces(scale())
         if weight is None:
             continue
 
-        yield to_addr, weight
+        yield to_addr, weight, {}
+
+
+def generate_addresses_queue(config: "Config", startup: "Startup", session):
+    """Generate addresses, weights in ounces and journal keys for ready requests.
+
+    The IBP server lists the requests; the operator only weighs each one.
+    """
+    from . import console
+    from .outbox import is_offline
+    from .workqueue import WorkQueue
+
+    work = WorkQueue(
+        session.server,
+        session.prefetch_address,
+        prefetch=config.queue.prefetch,
+        page_size=config.queue.page_size,
+        ack_batch=config.queue.ack_batch,
+    )
+    scale = detect_scale(config, startup)
+    # Acknowledge a request once its label prints, wherever it is printed.
+    session.on_printed = work.shipped
+
+    try:
+        while True:
+            startup.mark("first prompt")
+            try:
+                ready = work.next()
+            except Exception as exc:  # pylint: disable=broad-except
+                if not is_offline(exc):
+                    raise
+                retry = config.outbox.retry_interval
+                console.warn(
+                    f"Could not list ready requests ({exc}); retrying in {retry:g} s."
+                )
+                time.sleep(retry)
+                continue
+            if ready is None:
+                console.status("Every ready request is shipped.")
+                return
+
+            console.show_ready(ready)
+            weight = console.query_ounces(scale())
+            if weight is None:
+                continue  # Skipped; offered again on the next pass.
+
+            # Acknowledged once its label prints, which may be from the outbox.
+            work.entered(ready)
+            yield ready.destination(), weight, {"request_id": ready.request_id}
+    finally:
+        session.on_printed = None
+        unacknowledged, unshipped = work.close()
+        if unacknowledged:
+            console.warn(
+                f"Could not acknowledge {len(unacknowledged)} shipped requests; "
+                "the server still lists them as ready: "
+                + ", ".join(map(str, unacknowledged))
+            )
+        if unshipped:
+            console.warn(
+                f"{len(unshipped)} requests entered were not printed (failed, or "
+                "still queued); the server still lists them as ready: "
+                + ", ".join(map(str, unshipped))
+            )
 
 
 def run_diagnose_printer(_args):
     """Print a snapshot of printer/USB state to help debug detection failures."""
+    from .printing import snapshot_printer_state
+
     print(snapshot_printer_state())
 
 
-def load_logo() -> Image.Image:
-    """Load logo image."""
-    logo_fpath = importlib.resources.files("shippy.assets").joinpath("logo.jpg")
-    return Image.open(str(logo_fpath))
+def run_stats(args):
+    """Print per-stage latency percentiles, error rates and labels per hour.
+
+    With ``--http``, print outbound call latency by provider and endpoint.
+    """
+    from . import metrics, tracing
+
+    module = tracing if args.http else metrics
+    path = args.path
+    if path is None and args.config is not None:
+        config = load_config(args.config)
+        path = config.tracing.path if args.http else config.metrics.path
+    path = path or module.default_path()
+
+    try:
+        window = metrics.parse_duration(args.since)
+    except ValueError as exc:
+        sys.exit(f"shippy stats: {exc}")
+
+    print(module.report(path, time.time() - window))
+
+
+@contextlib.contextmanager
+def recording_metrics(config: "Config"):
+    """Record every stage's timing in the configured metrics store."""
+    if not config.metrics.enabled:
+        yield
+        return
+
+    from . import metrics
+
+    try:
+        store = metrics.MetricsStore(
+            config.metrics.path or metrics.default_path(),
+            config.metrics.prometheus_textfile,
+            config.metrics.prometheus_interval,
+        )
+    except OSError:
+        yield  # Metrics are a diagnostic aid; ship without them.
+        return
+
+    metrics.install(store)
+    try:
+        yield
+    finally:
+        metrics.install(None)
+        store.close()
+
+
+@contextlib.contextmanager
+def profiling_session(prefix: typing.Optional[str]):
+    """Sample the whole session if asked to; write the profile on exit."""
+    if prefix is None:
+        yield
+        return
+
+    from . import profiling
+
+    profiler = profiling.Profiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        prefix = prefix or profiling.default_prefix()
+        summary = profiler.summary()
+        try:
+            profiler.write_folded(f"{prefix}.folded")
+            with open(f"{prefix}.txt", "w", encoding="utf-8") as handle:
+                handle.write(summary + "\n")
+        except OSError as exc:
+            print(f"Could not write the profile: {exc}", file=sys.stderr)
+        else:
+            print(f"{summary}\n\nProfile written to {prefix}.folded", file=sys.stderr)
+
+
+@contextlib.contextmanager
+def tracking_memory(every: typing.Optional[int]):
+    """Report memory growth every so many labels if asked to."""
+    if every is None:
+        yield
+        return
+
+    from . import memory
+
+    tracker = memory.MemoryTracker(every)
+    tracker.start()
+    memory.install(tracker)
+    try:
+        yield
+    finally:
+        memory.install(None)
+        tracker.stop()
+
+
+@contextlib.contextmanager
+def tracing_calls(config: "Config"):
+    """Trace outbound HTTP calls to the configured rotating file."""
+    if not config.tracing.enabled:
+        yield
+        return
+
+    from . import tracing
+
+    tracing.register_provider(str(config.ibp.url), "ibp")
+    tracing.register_provider(str(config.easypost.api_base), "easypost")
+    tracing.register_provider(
+        str(config.googlemaps.base_url).rstrip("/") + "/maps/api", "googlemaps"
+    )
+    try:
+        tracing.install(
+            config.tracing.path or tracing.default_path(),
+            config.tracing.max_bytes,
+            config.tracing.backups,
+        )
+    except OSError:
+        yield  # Tracing is a diagnostic aid; ship without it.
+        return
+
+    try:
+        yield
+    finally:
+        tracing.uninstall()
 
 
-def load_config(filepath: pathlib.Path) -> Config:
+def load_config(filepath: pathlib.Path) -> "Config":
     """Load and validate the config file."""
+    from .models import Config
+
     parser = configparser.ConfigParser()
     parser.read(filepath)
 
@@ -106,108 +364,566 @@ def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description=main.__doc__)
 
     parser.add_argument("--config", type=pathlib.Path, help="Configuration file path")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="PREFIX",
+        help="profile the session; write PREFIX.folded (flame graph stacks) and "
+        "PREFIX.txt on exit (default: in the data directory's profiles folder)",
+    )
+    parser.add_argument(
+        "--memory",
+        nargs="?",
+        const=100,
+        type=int,
+        metavar="LABELS",
+        help="report memory and allocation growth every LABELS labels (default 100)",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print a startup timing breakdown after the first label",
+    )
 
     subparsers = parser.add_subparsers(
         dest="shipping_type", required=True, help="Select command"
     )
 
     subparsers.add_parser("individual", help="ship individual packages").set_defaults(
-        generate_addresses=generate_addresses_individual
+        run=run_interactive, generate_addresses=generate_addresses_individual
     )
 
     subparsers.add_parser("bulk", help="ship bulk packages").set_defaults(
-        generate_addresses=generate_addresses_bulk
+        run=run_interactive, generate_addresses=generate_addresses_bulk
     )
 
     subparsers.add_parser("manual", help="ship manual packages").set_defaults(
-        generate_addresses=generate_addresses_manual
+        run=run_interactive, generate_addresses=generate_addresses_manual
     )
 
     subparsers.add_parser(
-        "diagnose-printer",
-        help="print a snapshot of printer/USB state (no config needed)",
-    ).set_defaults(func=run_diagnose_printer)
+        "queue", help="ship the requests the IBP server lists as ready"
+    ).set_defaults(run=run_interactive, generate_addresses=generate_addresses_queue)
 
-    return parser
+    stream_parser = subparsers.add_parser(
+        "stream", help="ship records streamed by a scanner or another program"
+    )
+    stream_parser.add_argument(
+        "--source",
+        default="-",
+        help="'-' for stdin (default), a file or FIFO path, "
+        "'unix:PATH' or 'tcp:HOST:PORT' to listen on a local socket",
+    )
+    stream_parser.add_argument(
+        "--buffer",
+        type=int,
+        default=stream.DEFAULT_BUFFER,
+        help="records to accept ahead of the printer before pushing back",
+    )
+    stream_parser.set_defaults(run=run_stream)
 
+    stats_parser = subparsers.add_parser(
+        "stats", help="report per-stage latency and labels per hour (no config needed)"
+    )
+    stats_parser.add_argument(
+        "--since", default="24h", help="time window, e.g. 90m, 8h, 7d (default 24h)"
+    )
+    stats_parser.add_argument(
+        "--path",
+        help="metrics or trace file (default: from --config, else the data directory)",
+    )
+    stats_parser.add_argument(
+        "--http",
+        action="store_true",
+        help="report outbound HTTP calls by provider and endpoint instead",
+    )
+    stats_parser.set_defaults(func=run_stats)
 
-def main():
-    """Ship to an inmate or a unit."""
+    serve_parser = subparsers.add_parser(
+        "serve", help="serve shipping jobs to thin clients from one warm process"
+    )
+    serve_parser.add_argument(
+        "--listen", help="HOST:PORT to listen on (default: from config, 127.0.0.1:8765)"
+    )
+    serve_parser.add_argument(
+        "--workers", type=int, help="purchases run at once (default: from config, 4)"
+    )
+    serve_parser.set_defaults(run=run_serve)
 
-    parser = build_parser()
-    args = parser.parse_args()
+    submit_parser = subparsers.add_parser(
+        "submit", help="send records to a running 'shippy serve' (no config needed)"
+    )
+    submit_parser.add_argument(
+        "records", nargs="*", help="records to ship (default: one per line on stdin)"
+    )
+    submit_parser.add_argument(
+        "--daemon", default="http://127.0.0.1:8765", help="daemon URL"
+    )
+    submit_parser.add_argument("--token", help="the daemon's access token, if set")
+    submit_parser.add_argument(
+        "--timeout", type=float, default=120.0, help="seconds to wait per record"
+    )
+    submit_parser.set_defaults(func=run_submit)
 
-    # Utility subcommands (e.g. diagnose-printer) run without config and exit.
-    if getattr(args, "func", None) is not None:
-        args.func(args)
-        return
+    track_parser = subparsers.add_parser(
+        "track", help="refresh and query the delivery status of shipped labels"
+    )
+    track_parser.add_argument(
+        "ids",
+        nargs="*",
+        help="shipment IDs, tracker IDs or tracking codes from local history to "
+        "refresh now (default: every shipment due for a refresh)",
+    )
+    track_parser.add_argument(
+        "--stale-after",
+        default="12h",
+        help="refresh a shipment not delivered yet when its status is older than "
+        "this (default 12h)",
+    )
+    track_parser.add_argument(
+        "--workers", type=int, default=8, help="trackers fetched at once (default 8)"
+    )
+    track_parser.add_argument(
+        "--undelivered",
+        metavar="AGE",
+        help="list shipments still in transit this long after shipping, e.g. 14d",
+    )
+    track_parser.add_argument(
+        "--no-refresh", action="store_true", help="only query the stored statuses"
+    )
+    track_parser.set_defaults(run=run_track)
 
-    if args.config is None:
-        parser.error("--config is required for shipping commands")
+    subparsers.add_parser(
+        "diagnose-printer",
+        help="print a snapshot of printer/USB state (no config needed)",
+    ).set_defaults(func=run_diagnose_printer)
 
-    config = load_config(args.config)
+    return parser
 
-    easypost_client = easypost.EasyPostClient(config.easypost.apikey)
-    server = Server.from_config(config.ibp)
 
-    logo = load_logo()
+def run_interactive(args, config: "Config"):
+    """Ship packages entered at interactive prompts."""
+    import questionary
+
+    from . import console, tracing
+    from .session import Session
+    from .startup import Startup
+
+    startup = Startup()
+    session = Session.from_config(config, startup)
+    session.start()
+    if session.health is not None:
+        session.health.start()
 
     questionary.print(console.WELCOME, style="fg:white")
     questionary.print(
         "\nWelcome! Answer prompts to print postage, hit CTRL+C to cancel and restart\n"
     )
 
-    with console.task_message("Grabbing return address from IBP server"):
-        from_addr = shipping.build_address(easypost_client, **server.return_address())
+    resolve_in_flight(session)
+
+    addresses = args.generate_addresses(config, startup, session)
+    drainer = _start_outbox(config, session)
+    try:
+        with _startup_report(args, startup):
+            while True:
+                for line in drainer.report() if drainer is not None else []:
+                    console.warn(line)
+                if session.health is not None:
+                    console.status(session.health.status(), session.health.healthy())
+                if session.printer is not None:
+                    _show_printer(session.printer)
+
+                # Trace the lookups for a label together with its purchase.
+                with tracing.trace():
+                    try:
+                        to_addr, weight, keys = next(addresses)
+                    except StopIteration:
+                        break
+                    _ship_when_printer_ready(session, drainer, to_addr, weight, keys)
+                _print_startup_report(args, startup)
+    finally:
+        if drainer is not None:
+            drainer.stop()
+        addresses.close()
+        if session.health is not None:
+            session.health.stop()
+        if session.printer is not None:
+            session.printer.stop()
+        for line in session.hedging():
+            console.status(line)
+
+
+def _start_outbox(config: "Config", session) -> typing.Optional["Drainer"]:
+    """Start shipping labels queued while upstream is unreachable, if enabled."""
+    import sqlite3
+
+    from . import console
+    from .outbox import Drainer, Outbox
+
+    if not config.outbox.enabled:
+        return None
 
     try:
-        with console.task_message("Verifying return address"):
-            easypost_client.address.verify(from_addr.id)
-    except easypost.errors.InvalidRequestError:
-        questionary.print(
-            "  Failed to verify return address, consider double-checking before shipping.",
-            style="fg:yellow",
+        outbox = Outbox.open()
+    except (OSError, sqlite3.Error) as exc:
+        console.warn(f"Label queue unavailable ({exc}); shipping without it.")
+        return None
+
+    if outbox.depth():
+        console.warn(
+            f"{outbox.depth()} labels queued by an earlier run are shipped first."
         )
+    drainer = Drainer(outbox, session, config.outbox)
+    drainer.start()
+    return drainer
 
-    for to_addr_dict, weight in args.generate_addresses(config):
-        to_addr = shipping.build_address(easypost_client, **to_addr_dict)
 
-        try:
-            with console.task_message("Verifying address"):
-                easypost_client.address.verify(to_addr.id)
-        except easypost.errors.InvalidRequestError:
-            questionary.print(
-                "  Failed to verify address, consider double-checking before shipping.",
-                style="fg:yellow",
-            )
+def _show_printer(watch):
+    """Show the label printer's status before a package, if it is worth a look."""
+    from . import console
+
+    if watch.failing():
+        console.error(
+            f"{watch.describe()}; postage is bought without checking the printer."
+        )
+    elif not watch.ready():
+        console.status(watch.describe(), False)
 
-        weight = 16.0 * weight  # Convert to ounces.
 
-        with console.task_message("Purchasing postage"):
-            shipment = shipping.build_shipment(
-                easypost_client, from_addr, to_addr, weight, config.parcel
-            )
+def _ship_when_printer_ready(session, drainer, to_addr, weight, keys: dict):
+    """Ship an entered label, asking for the printer to be fixed if it is not ready.
 
-        @contextlib.contextmanager
-        def request_refund_on_error(shipment):
-            """Manage a shipment context where a refund is requested on error."""
-            try:
-                yield shipment
-            except Exception:
-                with console.task_message("Requesting refund"):
-                    easypost_client.shipment.refund(shipment.id)
+    The same label is tried again once the operator says the printer is fixed,
+    so a queued request is not passed over (and acknowledged) unshipped.
+    """
+    from . import console
+    from .printing.watch import PrinterNotReady
+
+    while True:
+        try:
+            # The label's time budget starts once its weight is in.
+            with session.budget():
+                _ship_entry(session, drainer, to_addr, weight, keys)
+            return
+        except PrinterNotReady as exc:
+            if not console.query_printer_fixed(str(exc)):
                 raise
+            session.printer.refresh()
+
+
+def _ship_entry(session, drainer, to_addr, weight, keys: dict):
+    """Ship an entered label, through the outbox if there is one."""
+    from .server import AddressLookup
+
+    weights = weight if isinstance(weight, list) else [weight]
+    if drainer is not None:
+        drainer.ship(to_addr, weights, **keys)
+        return
+
+    if isinstance(to_addr, AddressLookup):
+        to_addr = to_addr.resolve(session.server)
+    if len(weights) > 1:
+        session.ship_boxes(to_addr, weights, **keys)
+    else:
+        session.ship(to_addr, weights[0], **keys)
+
+
+def resolve_in_flight(session):
+    """Offer to print, reprint or refund shipments an earlier run left unsettled."""
+    from . import console
+
+    for entry in session.in_flight():
+        action = console.query_in_flight(entry)
+        try:
+            if action == "print":
+                session.resume(entry)
+            elif action == "refund":
+                session.refund(entry)
+            elif action is not None:
+                session.settle(entry, action)
+        except Exception as exc:  # pylint: disable=broad-except
+            # Leave it in flight; it is offered again on the next start.
+            console.error(f"Error: {exc}")
+
+
+def run_stream(args, config: "Config"):
+    """Ship records streamed from stdin, a FIFO or a local socket.
+
+    Status messages go to stderr; one JSON result per record goes back to the
+    producer (stdout for stdin and FIFO sources), in the order records arrived.
+    A record without a weight is weighed on the configured scale.
+    """
+    startup, session = _start_headless(config)
+    scale = detect_scale(config, startup)
+
+    with _startup_report(args, startup):
+        for record in stream.read_records(args.source, buffer=args.buffer):
+            startup.mark("first record")
+            record.reply(ship_result(session, record, scale))
+            _print_startup_report(args, startup)
+
+
+def run_serve(args, config: "Config"):
+    """Serve shipping jobs to thin clients from one warm process.
+
+    Purchases for different clients run concurrently; printing is serialized.
+    Records must carry a weight, since the clients are not at this scale.
+    """
+    from .daemon import Daemon
+
+    startup, session = _start_headless(config, whole_lines=True)
+    listen = args.listen or config.serve.listen
+    host, _, port = listen.rpartition(":")
+
+    def ship(record: stream.Record) -> dict:
+        return ship_result(session, record, lambda: None)
+
+    daemon = Daemon(
+        (host or "127.0.0.1", int(port)),
+        ship,
+        token=config.serve.token,
+        workers=args.workers or config.serve.workers,
+    )
+    print(f"Serving shipping jobs on {daemon.url}", file=sys.stderr)
+    with _startup_report(args, startup):
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.server_close()
+
+
+def _start_headless(config: "Config", whole_lines: bool = False):
+    """Start a session that reports to stderr; return ``(startup, session)``."""
+    from . import console
+    from .session import Session
+    from .startup import Startup
+
+    console.set_output(sys.stderr, whole_lines)
+
+    startup = Startup()
+    session = Session.from_config(config, startup)
+    session.start()
+    startup.submit("unit list", session.server.unit_ids)
+
+    for entry in session.in_flight():
+        # Nobody to ask: re-sending the same request prints the paid label.
+        console.warn(f"Unsettled shipment from an earlier run: {entry.describe()}")
+
+    return startup, session
+
+
+def ship_result(session, record: stream.Record, scale) -> dict[str, typing.Any]:
+    """Ship a record and return its JSON result; errors are reported, not raised."""
+    from . import tracing
+
+    result: dict[str, typing.Any] = {"line": record.line}
+    started = time.monotonic()
+    try:
+        with tracing.trace() as trace_id:
+            result["trace"] = trace_id
+            shipment = _ship_record(session, record, scale)
+    except Exception as exc:  # pylint: disable=broad-except
+        # One bad record must not stop a scanner feeding a whole cart.
+        result.update(status="error", error=f"{type(exc).__name__}: {exc}")
+    else:
+        result.update(
+            status="ok",
+            shipment_id=shipment.id,
+            tracking_code=shipment.tracking_code,
+            rate=shipment.selected_rate.rate,
+        )
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
 
-        with request_refund_on_error(shipment):
+def run_submit(args):
+    """Send records to a running ``shippy serve`` and print each JSON result."""
+    import json
+    import urllib.error
+    import urllib.request
+
+    headers = {"Content-Type": "text/plain; charset=utf-8"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    failed = False
+    for line in args.records or sys.stdin:
+        if not line.strip():
+            continue
+        request = urllib.request.Request(
+            args.daemon.rstrip("/") + "/ship",
+            data=line.strip().encode("utf-8"),
+            headers=headers,
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=args.timeout) as response:
+                result = json.load(response)
+        except urllib.error.HTTPError as exc:
             try:
-                with console.task_message("Printing postage"):
-                    label_url = shipment.postage_label.label_url
-                    image = grab_png_from_url(label_url)
+                result = json.load(exc)
+            except (OSError, ValueError):
+                # Not the daemon's JSON answer, e.g. a proxy's error page.
+                result = {
+                    "line": line.strip(),
+                    "status": "error",
+                    "error": f"HTTP {exc.code} {exc.reason}",
+                }
+        except (OSError, ValueError) as exc:
+            result = {"line": line.strip(), "status": "error", "error": str(exc)}
+        failed |= result.get("status") != "ok"
+        print(json.dumps(result), flush=True)
+
+    sys.exit(1 if failed else 0)
+
+
+def run_track(args, config: "Config"):
+    """Refresh the delivery status of shipped labels and report on it."""
+    from . import metrics, tracking
+
+    try:
+        stale_after = metrics.parse_duration(args.stale_after)
+        older_than = (
+            None
+            if args.undelivered is None
+            else metrics.parse_duration(args.undelivered)
+        )
+    except ValueError as exc:
+        sys.exit(f"shippy track: {exc}")
 
-                    if logo is not None:
-                        image.paste(logo, (450, 425))
+    store = tracking.TrackingStore.open()
+    try:
+        store.sync_journal()
+        if args.ids:
+            found = [key for key in args.ids if _tracked(store, key)]
+            due = [typing.cast(tracking.Status, store.find(key)) for key in found]
+        else:
+            due = store.due(stale_after)
+
+        if due and not args.no_refresh:
+            _refresh_tracking(config, store, due, args.workers)
+
+        if args.ids:
+            for key in found:
+                print(typing.cast(tracking.Status, store.find(key)).describe())
+        elif older_than is not None:
+            for status in store.undelivered(older_than):
+                print(status.describe())
+        else:
+            for name, count in store.counts().items():
+                print(f"{name.replace('_', ' '):20s} {count:7d}")
+    finally:
+        store.close()
+
+
+def _tracked(store, key: str) -> bool:
+    """Check that a shipment is in the tracking table, reporting it if not."""
+    if store.find(key) is None:
+        print(f"{key}: not in local shipping history", file=sys.stderr)
+        return False
+    return True
+
+
+def _refresh_tracking(config: "Config", store, due, workers: int):
+    """Fetch fresh trackers for shipments, reporting progress on stderr."""
+    import easypost  # type: ignore
+
+    from .tracking import refresh
+
+    client = easypost.EasyPostClient(
+        config.easypost.apikey, api_base=str(config.easypost.api_base).rstrip("/")
+    )
+    started, failed = time.monotonic(), 0
+    for status, exc in refresh(store, client, due, workers):
+        if exc is not None:
+            failed += 1
+            print(f"{status.describe()}: {exc}", file=sys.stderr)
+    print(
+        f"Refreshed {len(due) - failed} of {len(due)} shipments in "
+        f"{time.monotonic() - started:.1f} s",
+        file=sys.stderr,
+    )
 
-                    print_image(image)
-            except RuntimeError as exc:
-                questionary.print(f"  Error: {exc}", style="fg:red")
-                raise
+
+def _ship_record(session, record: stream.Record, scale):
+    """Resolve a streamed record's address and weight, then ship it."""
+    if record.error is not None:
+        raise record.error
+
+    if record.kind == "unit":
+        units = session.startup.result(
+            "unit list", "Grabbing units list from IBP server"
+        )
+        units = {key.upper(): value for key, value in units.items()}
+        if record.value not in units:
+            raise stream.RecordError(f"unknown unit {record.value!r}")
+        to_addr = session.server.unit_address(units[record.value])
+        keys = {"unit": record.value}
+    else:
+        to_addr = session.server.request_address(record.value)
+        keys = {"request_id": stream.format_request_id(record.value)}
+
+    weight: typing.Optional[float] = None
+    if record.weight is not None:
+        weight = 16.0 * record.weight
+    elif scale() is not None:
+        weight = scale().read_stable()
+
+    if weight is None:
+        raise stream.RecordError("no weight given and no stable scale reading")
+
+    return session.ship(to_addr, weight, **keys)
+
+
+def _print_startup_report(args, startup: "Startup"):
+    """Print the startup timing breakdown once, if it was asked for."""
+    if args.timings and not getattr(args, "timings_printed", False):
+        args.timings_printed = True
+        print(startup.report(), file=sys.stderr)
+
+
+@contextlib.contextmanager
+def _startup_report(args, startup: "Startup"):
+    """Print the startup breakdown on exit if no label got far enough to."""
+    try:
+        yield
+    finally:
+        _print_startup_report(args, startup)
+        startup.shutdown()
+
+
+def main():
+    """Ship to an inmate or a unit."""
+
+    parser = build_parser()
+    args = parser.parse_args()
+
+    with profiling_session(args.profile), tracking_memory(args.memory):
+        _run(parser, args)
+
+
+def _run(parser: argparse.ArgumentParser, args):
+    """Run the selected subcommand."""
+    # Utility subcommands (e.g. diagnose-printer) run without config and exit.
+    if getattr(args, "func", None) is not None:
+        args.func(args)
+        return
+
+    if args.config is None:
+        parser.error("--config is required for shipping commands")
+
+    config = load_config(args.config)
+
+    from .printing import configure, flush_sheets
+
+    configure(config.printer)
+
+    with recording_metrics(config), tracing_calls(config):
+        try:
+            args.run(args, config)
+        finally:
+            # Labels still waiting for their sheet to fill print now.
+            flush_sheets()
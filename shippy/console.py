@@ -1,38 +1,64 @@
 """Methods for console user interaction."""
 
 import contextlib
+import functools
+import threading
+import time
 import typing
 
-import googlemaps  # type: ignore
 import questionary
 from prompt_toolkit.completion import ThreadedCompleter
 
-from .addresses import AddressParser
-from .autocompletion import GoogleMapsCompleter
+from . import metrics
+from .autocompletion import GoogleMapsCompleter, UnitCompleter, UnitIndex
+from .history import UnitHistory
 
+if typing.TYPE_CHECKING:
+    import googlemaps  # type: ignore
 
-def query_unit(units: typing.Dict[str, int]) -> typing.Optional[str]:
-    """Query a name of a unit from the user."""
+    from .journal import Entry
+    from .scale import Scale
+    from .workqueue import Ready
 
-    def validate(unit):
-        return unit.upper() in units
 
-    style = questionary.Style(
-        [
-            ("completion-menu", "bg:#2c3e50"),
-            ("completion-menu.completion", "bg:#2c3e50 #ecf0f1"),
-            ("completion-menu.completion.current", "bg:#16a085 #ecf0f1"),
-        ]
-    )
+class UnitPrompt:  # pylint: disable=too-few-public-methods
+    """Reusable unit-name prompt with fuzzy, history-ranked suggestions.
 
-    unit = questionary.autocomplete(
-        "Enter name of unit:",
-        choices=list(units),
-        validate=validate,
-        style=style,
-    ).ask()
+    The index, style and prompt session are built once per shipping session;
+    each :meth:`ask` only clears the input buffer and runs the prompt again.
+    """
+
+    units: typing.Dict[str, int]
 
-    return unit.upper() if unit is not None else None
+    def __init__(self, units: typing.Dict[str, int], history: UnitHistory):
+        self.units = units
+
+        def validate(unit):
+            if unit.upper() in units:
+                return True
+            return "Unknown unit, pick one of the suggestions."
+
+        style = questionary.Style(
+            [
+                ("completion-menu", "bg:#2c3e50"),
+                ("completion-menu.completion", "bg:#2c3e50 #ecf0f1"),
+                ("completion-menu.completion.current", "bg:#16a085 #ecf0f1"),
+            ]
+        )
+
+        self._question = questionary.autocomplete(
+            "Enter name of unit:",
+            choices=list(units),
+            completer=UnitCompleter(UnitIndex(units, history)),
+            validate=validate,
+            style=style,
+        )
+
+    def ask(self) -> typing.Optional[str]:
+        """Query a name of a unit from the user."""
+        self._question.application.current_buffer.reset()
+        unit = self._question.ask()
+        return unit.upper() if unit is not None else None
 
 
 def query_weight() -> typing.Optional[int]:
@@ -53,6 +79,117 @@ def query_weight() -> typing.Optional[int]:
     return int(weight) if weight is not None else None
 
 
+def parse_weights(text: str) -> typing.List[int]:
+    """Parse box weights in pounds, e.g. ``12, 14, 9, 11``.
+
+    ``4x12`` stands for four boxes of 12 pounds and may be mixed with single
+    weights. Raises ValueError with a message for the user.
+    """
+    weights = []
+    for item in text.replace(",", " ").split():
+        count, _, weight = item.lower().rpartition("x")
+        try:
+            boxes, pounds = int(count or 1), int(weight)
+        except ValueError:
+            raise ValueError(
+                "Weights must be integers, e.g. 12, 14, 9 or 4x12."
+            ) from None
+        if boxes <= 0 or pounds <= 0:
+            raise ValueError("Weights and box counts must be strictly positive.")
+        weights += [pounds] * boxes
+
+    if not weights:
+        raise ValueError("Weight must be an integer.")
+    return weights
+
+
+def query_weights(scale: bool = False) -> typing.Optional[typing.List[int]]:
+    """Query the weights of one or more boxes from the user.
+
+    With ``scale``, an empty answer means the box is on the scale, and is
+    returned as an empty list.
+    """
+
+    def validate(text):
+        if scale and not text.strip():
+            return True
+        try:
+            parse_weights(text)
+        except ValueError as exc:
+            return str(exc)
+        return True
+
+    message = "Please enter weight in pounds (several boxes: 12, 14, 9 or 4x12):"
+    if scale:
+        message = (
+            "Put the box on the scale and press Enter, or enter weights in pounds "
+            "(several boxes: 12, 14, 9 or 4x12):"
+        )
+    text = questionary.text(message, validate=validate).ask()
+    if text is None:
+        return None
+    return [] if scale and not text.strip() else parse_weights(text)
+
+
+def _read_scale(scale: typing.Optional["Scale"]) -> typing.Optional[float]:
+    """Weigh a package on the scale, if there is one, in ounces."""
+    if scale is None:
+        return None
+
+    try:
+        with task_message("Reading weight from scale"):
+            weight = scale.read_stable()
+    except OSError as exc:
+        # E.g. the USB adapter was unplugged; the session goes on without it.
+        warn(f"Could not read the scale ({exc}), enter the weight instead.")
+        return None
+
+    if weight is None:
+        warn("No stable reading from the scale, enter the weight instead.")
+        return None
+
+    pounds, ounces = divmod(weight, 16.0)
+    questionary.print(f"  Weight: {pounds:.0f} lb {ounces:.1f} oz", style="fg:white")
+    return weight
+
+
+def query_ounces(scale: typing.Optional["Scale"]) -> typing.Optional[float]:
+    """Weigh a package on the scale, or query its weight from the user.
+
+    Returns the weight in ounces. Without a scale, or if no stable reading
+    arrives in time, this falls back to asking for whole pounds.
+    """
+    weight = _read_scale(scale)
+    if weight is not None:
+        return weight
+
+    pounds = query_weight()
+    return 16.0 * pounds if pounds is not None else None
+
+
+def query_box_ounces(
+    scale: typing.Optional["Scale"],
+) -> typing.Optional[typing.List[float]]:
+    """Weigh one box on the scale, or query the weights of several boxes.
+
+    Returns the weights in ounces. Like :func:`query_ounces`, but boxes whose
+    weights are typed in may be several, all shipped to the same address; with
+    a scale, the operator presses Enter to weigh one box or types the weights.
+    """
+    if scale is not None:
+        typed = query_weights(scale=True)
+        if typed is None:
+            return None
+        if typed:
+            return [16.0 * pounds for pounds in typed]
+        weight = _read_scale(scale)
+        if weight is not None:
+            return [weight]
+
+    weights = query_weights()
+    return [16.0 * pounds for pounds in weights] if weights is not None else None
+
+
 def query_request_id() -> (
     typing.Optional[typing.Union[typing.Tuple[str, int, int], int]]
 ):
@@ -91,8 +228,78 @@ def query_request_id() -> (
     return jurisdiction, int(inmate_id), int(index)
 
 
-def query_address(gmaps: googlemaps.Client) -> typing.Optional[typing.Dict[str, str]]:
+def query_in_flight(entry: "Entry") -> typing.Optional[str]:
+    """Ask what to do with a shipment an earlier run left unsettled.
+
+    Returns ``print``, ``refund``, ``printed`` or ``dismissed``, or None to
+    decide on the next start.
+    """
+    if entry.state == "purchasing":
+        question = "Postage may have been bought (check EasyPost for a charge):"
+        choices = [questionary.Choice("Dismiss", "dismissed")]
+    elif entry.state == "printing":
+        question = "Postage was bought, but the label may not have printed:"
+        choices = [
+            questionary.Choice("Reprint the label", "print"),
+            questionary.Choice("It printed fine", "printed"),
+            questionary.Choice("Refund it", "refund"),
+        ]
+    else:
+        question = "Postage was bought, but the label was never printed:"
+        choices = [
+            questionary.Choice("Print the label", "print"),
+            questionary.Choice("Refund it", "refund"),
+        ]
+    choices.append(questionary.Choice("Decide later", "later"))
+
+    action = questionary.select(
+        f"{question}\n  {entry.describe()}", choices=choices
+    ).ask()
+    return None if action in (None, "later") else action
+
+
+def query_printer_fixed(problem: str) -> bool:
+    """Ask the operator to fix the label printer; False if they cancel."""
+    error(f"{problem}; no postage was bought.")
+    answer = questionary.text("Fix the printer, then press Enter to ship:").ask()
+    return answer is not None
+
+
+def show_ready(ready: "Ready"):
+    """Show the next ready request and where it goes, before its weight."""
+    questionary.print(f"Request {ready.request_id}", style="bold")
+    if ready.address is None:
+        warn(f"Address not looked up yet ({ready.error}); looked up when shipping.")
+        return
+
+    address = ready.address
+    questionary.print(
+        f"  {address.get('name', '')}, {address.get('street1', '')}, "
+        f"{address.get('city', '')}, {address.get('state', '')} "
+        f"{address.get('zipcode', '')}",
+        style="fg:white",
+    )
+    if ready.verified is False:
+        warn("Failed to verify address, consider double-checking before shipping.")
+
+
+@functools.lru_cache(maxsize=1)
+def _address_completer(gmaps: "googlemaps.Client") -> ThreadedCompleter:
+    """Return the address completer, shared by every address prompt.
+
+    Its prediction cache then carries over from one address to the next
+    instead of being rebuilt (and dropped) per prompt.
+    """
+    return ThreadedCompleter(GoogleMapsCompleter(gmaps))
+
+
+def query_address(
+    gmaps: "googlemaps.Client",
+) -> typing.Optional[typing.Dict[str, str]]:
     """Query an address from the user."""
+    # Only manual mode parses addresses; keep Google Maps out of the others.
+    from .addresses import AddressParser  # pylint: disable=import-outside-toplevel
+
     name = questionary.text("Enter name:").ask()
     if name is None:
         return None
@@ -101,16 +308,13 @@ def query_address(gmaps: googlemaps.Client) -> typing.Optional[typing.Dict[str,
     if company is None:
         return None
 
-    gmaps_completer = GoogleMapsCompleter(gmaps)
-    threaded_completer = ThreadedCompleter(gmaps_completer)
-
     def validate(text):
         return True if len(text) > 0 else "Please enter an address."
 
     address_text = questionary.autocomplete(
         "Enter address:",
         choices=[],
-        completer=threaded_completer,
+        completer=_address_completer(gmaps),
         validate=validate,
     ).ask()
 
@@ -126,17 +330,93 @@ def query_address(gmaps: googlemaps.Client) -> typing.Optional[typing.Dict[str,
     return address
 
 
+_OUTPUT: typing.Optional[typing.TextIO] = None
+_WHOLE_LINES = False
+_QUIET = threading.local()
+
+
+def set_output(file: typing.Optional[typing.TextIO], whole_lines: bool = False):
+    """Send status messages to a file instead of stdout (e.g. in headless mode).
+
+    With ``whole_lines``, a task is reported in one line once it ends, so that
+    tasks running in several threads at once do not interleave mid-line.
+    """
+    global _OUTPUT, _WHOLE_LINES  # pylint: disable=global-statement
+    _OUTPUT = file
+    _WHOLE_LINES = whole_lines
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence this thread's messages, e.g. a background worker's.
+
+    Tasks are still recorded in the metrics store.
+    """
+    _QUIET.active = True
+    try:
+        yield
+    finally:
+        _QUIET.active = False
+
+
+def _silenced() -> bool:
+    return getattr(_QUIET, "active", False)
+
+
+def warn(msg: str):
+    """Print an indented warning message."""
+    if not _silenced():
+        questionary.print(f"  {msg}", style="fg:yellow", file=_OUTPUT)
+
+
+def error(msg: str):
+    """Print an indented error message."""
+    if not _silenced():
+        questionary.print(f"  {msg}", style="fg:red", file=_OUTPUT)
+
+
+def status(msg: str, ok: bool = True):
+    """Print an indented status line, dimmed unless something is wrong."""
+    if not _silenced():
+        style = "fg:gray" if ok else "fg:red"
+        questionary.print(f"  {msg}", style=style, file=_OUTPUT)
+
+
 @contextlib.contextmanager
-def task_message(msg):
-    """Capture a task context with messaging."""
+def task_message(msg, stage=None):
+    """Capture a task context with messaging.
+
+    The task's duration and outcome are recorded under ``stage`` (by default
+    the message itself) in the metrics store, if one is installed.
+    """
+    started = time.perf_counter()
+    if _silenced():
+        try:
+            yield
+        except Exception:
+            metrics.record(stage or msg, time.perf_counter() - started, False)
+            raise
+        metrics.record(stage or msg, time.perf_counter() - started, True)
+        return
+
+    prefix = f"{msg} ... "
     try:
-        questionary.print(f"{msg} ... ", end="", flush=True)
+        if not _WHOLE_LINES:
+            questionary.print(prefix, end="", flush=True, file=_OUTPUT)
+            prefix = ""
         yield
     except Exception:
-        questionary.print("error!", style="fg:red", flush=True)
+        elapsed = time.perf_counter() - started
+        metrics.record(stage or msg, elapsed, False)
+        questionary.print(f"{prefix}error!", style="fg:red", flush=True, file=_OUTPUT)
         raise
 
-    questionary.print("done!", style="fg:orange", flush=True)
+    elapsed = time.perf_counter() - started
+    metrics.record(stage or msg, elapsed, True)
+    suffix = f" ({elapsed:.2f} s)" if _WHOLE_LINES else ""
+    questionary.print(
+        f"{prefix}done!{suffix}", style="fg:orange", flush=True, file=_OUTPUT
+    )
 
 
 WELCOME = r"""
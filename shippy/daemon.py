@@ -0,0 +1,150 @@
+"""HTTP label daemon shared by several packing tables.
+
+One warm ``shippy serve`` process keeps the EasyPost and IBP clients, the
+verified return address, caches and the printer backend loaded, and thin clients
+(``shippy submit``, a scanner script, ``curl``) post records to it::
+
+    POST /ship      body: one stream record, e.g. {"request_id": 12345, "weight": 2}
+    GET  /health    status and counters
+
+Each connection is handled in its own thread. At most ``workers`` records are
+shipped at once, so purchases for different tables overlap, while printing is
+serialized per printer by :func:`shippy.printing.print_image`.
+"""
+
+import collections
+import hmac
+import http.server
+import json
+import threading
+import time
+import typing
+
+from . import stream
+
+# Records are one line; anything bigger is not a shipping record.
+_MAX_BODY = 64 * 1024
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Translate HTTP requests into daemon calls."""
+
+    server: "Daemon"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Report health."""
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") == "/health":
+            self._reply(200, self.server.health())
+        else:
+            self._reply(404, {"status": "error", "error": "not found"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Ship the record in the request body."""
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") != "/ship":
+            self._reply(404, {"status": "error", "error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if not 0 < length <= _MAX_BODY:
+            self._reply(400, {"status": "error", "error": "expected one record"})
+            return
+
+        line = self.rfile.read(length).decode("utf-8", errors="replace")
+        result = self.server.submit(line)
+        self._reply(200 if result["status"] == "ok" else 422, result)
+
+    def _authorized(self) -> bool:
+        """Check the bearer token, replying 401 if it is wrong."""
+        token = self.server.token
+        if token is None:
+            return True
+        supplied = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if hmac.compare_digest(supplied.encode(), token.encode()):
+            return True
+        self._reply(401, {"status": "error", "error": "unauthorized"})
+        return False
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Status messages already report every record; skip access logs."""
+
+
+class Daemon(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server shipping records with a shared session."""
+
+    daemon_threads = True
+    token: typing.Optional[str]
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        ship: typing.Callable[[stream.Record], dict],
+        token: typing.Optional[str] = None,
+        workers: int = 4,
+    ):
+        super().__init__(address, _Handler)
+        self.token = token
+        self._ship = ship
+        self._slots = threading.BoundedSemaphore(max(int(workers), 1))
+        self._lock = threading.Lock()
+        self._counts: collections.Counter = collections.Counter()
+        self._started = time.monotonic()
+
+    @property
+    def url(self) -> str:
+        """Base URL of the daemon."""
+        host, port = typing.cast(tuple[str, int], self.server_address[:2])
+        return f"http://{host}:{port}"
+
+    def submit(self, line: str) -> dict:
+        """Parse and ship one record, waiting for a free worker slot."""
+        try:
+            kind, value, weight = stream.parse_line(line)
+        except stream.RecordError as exc:
+            record = stream.Record(line.strip(), _no_reply, error=exc)
+        else:
+            record = stream.Record(line.strip(), _no_reply, kind, value, weight)
+
+        with self._lock:
+            self._counts["waiting"] += 1
+        with self._slots:
+            with self._lock:
+                self._counts["waiting"] -= 1
+                self._counts["shipping"] += 1
+            try:
+                result = self._ship(record)
+            finally:
+                with self._lock:
+                    self._counts["shipping"] -= 1
+
+        with self._lock:
+            self._counts[result["status"]] += 1
+        return result
+
+    def health(self) -> dict:
+        """Return status and counters."""
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "status": "ok",
+            "uptime": round(time.monotonic() - self._started, 1),
+            "shipped": counts.get("ok", 0),
+            "failed": counts.get("error", 0),
+            "shipping": counts.get("shipping", 0),
+            "waiting": counts.get("waiting", 0),
+        }
+
+
+def _no_reply(_result: dict):
+    """Daemon results go back in the HTTP response instead."""
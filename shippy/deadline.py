@@ -0,0 +1,250 @@
+"""Time budgets per label, and hedged reads against a slow tail.
+
+Each call has a timeout of its own (30 s for the IBP server, a minute in the
+EasyPost SDK), so one label could stall the operator for minutes. Inside
+:func:`budget`, every call made for the label gets at most what is left of
+the label's budget: :func:`bound` mounts a :mod:`requests` adapter that cuts
+each call's timeout down, whichever client makes it, and a call made once the
+budget is spent raises :class:`DeadlineExceeded` without being sent. As a
+:class:`TimeoutError`, it counts as upstream being unreachable (see
+:func:`shippy.outbox.is_offline`). Purchases and refunds run :func:`unbounded`:
+one cut short may still go through. So does printing a bought label, whose
+download running out of time would otherwise have it refunded.
+
+Most slow calls are a few stragglers, not a slow server. A :class:`Hedger`
+sends an idempotent read (an IBP lookup, a label download) still unanswered
+after the 95th percentile of recent ones a second time, and uses whichever
+answer comes first.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import threading
+import time
+import typing
+
+import requests
+import requests.adapters
+
+from . import tracing
+from .metrics import percentile
+
+# Quantile of recent reads after which a read is sent again.
+HEDGE_QUANTILE = 0.95
+# Reads timed before any is hedged, and recent ones kept.
+MIN_SAMPLES = 20
+_WINDOW = 200
+
+T = typing.TypeVar("T")
+
+_DEADLINE: contextvars.ContextVar[typing.Optional[float]] = contextvars.ContextVar(
+    "shippy_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A label's time budget ran out before a call could be made."""
+
+
+@contextlib.contextmanager
+def budget(seconds: typing.Optional[float]):
+    """Give the calls made in this context ``seconds`` in all (None: no limit).
+
+    Inside another budget this keeps the earlier deadline.
+    """
+    if seconds is None or _DEADLINE.get() is not None:
+        yield
+        return
+
+    token = _DEADLINE.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextlib.contextmanager
+def unbounded():
+    """Let the calls made in this context run their own timeout in full."""
+    token = _DEADLINE.set(None)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> typing.Optional[float]:
+    """Return the seconds left of the current budget, or None without one."""
+    deadline = _DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout(default):
+    """Return a call's timeout: ``default``, cut to what is left of the budget.
+
+    ``default`` is seconds, a ``(connect, read)`` pair, or None for none.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("the label's time budget is spent")
+    if default is None:
+        return left
+    if isinstance(default, tuple):
+        return tuple(left if part is None else min(part, left) for part in default)
+    return min(default, left)
+
+
+def bind(function: typing.Callable[..., T]) -> typing.Callable[..., T]:
+    """Return ``function`` bound to the current budget, to run in another thread."""
+    deadline = _DEADLINE.get()
+
+    def bound_function(*args, **kwargs):
+        token = _DEADLINE.set(deadline)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _DEADLINE.reset(token)
+
+    return bound_function
+
+
+class _DeadlineAdapter(requests.adapters.HTTPAdapter):
+    """Cut each request's timeout to what is left of the label's budget.
+
+    Calls are traced here too, if tracing is on (see :mod:`shippy.tracing`).
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = tracing.timed_pools()
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        kwargs["timeout"] = timeout(kwargs.get("timeout"))
+        return tracing.send(super().send, request, **kwargs)
+
+
+def bound(http: requests.Session) -> requests.Session:
+    """Make every call on a pooled session keep to the label's budget, traced.
+
+    Each mounted adapter is replaced, keeping its retries (the EasyPost SDK
+    mounts its own for the API).
+    """
+    for prefix, adapter in list(http.adapters.items()):
+        retries = getattr(adapter, "max_retries", 0)
+        http.mount(prefix, _DeadlineAdapter(max_retries=retries))
+    return http
+
+
+def _hedge(function: typing.Callable[..., T], *args) -> T:
+    """Send a read again, its calls traced as a hedge."""
+    with tracing.hedge():
+        return function(*args)
+
+
+class Hedger:  # pylint: disable=too-many-instance-attributes
+    """Send a slow idempotent read again, and use the first answer.
+
+    A read still unanswered after :data:`HEDGE_QUANTILE` of the recent ones
+    took is sent a second time, at most once; until :data:`MIN_SAMPLES` reads
+    are timed none is. Each attempt runs in the caller's context, so it keeps
+    to the label's budget and its trace, where the second is marked a hedge.
+    """
+
+    name: str
+    reads: int  # Reads made.
+    hedged: int  # Reads sent a second time.
+    won: int  # Hedged reads the second attempt answered first.
+
+    def __init__(self, name: str, workers: int = 8):
+        self.name = name
+        self.reads = self.hedged = self.won = 0
+        # First attempts' durations, including those a hedge beat: what every
+        # read would have taken without hedging.
+        self._first: collections.deque[float] = collections.deque(maxlen=_WINDOW)
+        self._served: collections.deque[float] = collections.deque(maxlen=_WINDOW)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            workers, thread_name_prefix="shippy-hedge"
+        )
+        self._lock = threading.Lock()
+
+    def delay(self) -> typing.Optional[float]:
+        """Return the seconds after which a read is hedged, once known."""
+        with self._lock:
+            if len(self._first) < MIN_SAMPLES:
+                return None
+            return percentile(sorted(self._first), HEDGE_QUANTILE)
+
+    def call(self, function: typing.Callable[..., T], *args) -> T:
+        """Call an idempotent read, hedging it if it is slow."""
+        started = time.monotonic()
+        delay = self.delay()
+        if delay is None:
+            result = function(*args)
+            self._timed(self._first, started)
+            self._served_by(None, started)
+            return result
+
+        first = self._submit(function, *args)
+        first.add_done_callback(lambda future: self._finished(future, started))
+        attempts = [first]
+        done, _ = concurrent.futures.wait(attempts, timeout=delay)
+        if not done:
+            attempts.append(self._submit(_hedge, function, *args))
+
+        winner = self._first_answer(attempts)
+        result = winner.result()
+        self._served_by(None if len(attempts) == 1 else winner is attempts[1], started)
+        return result
+
+    def summary(self) -> str:
+        """Return how often reads were hedged, and the tail latency removed."""
+        with self._lock:
+            first, served = sorted(self._first), sorted(self._served)
+            reads, hedged, won = self.reads, self.hedged, self.won
+        if not served:
+            return f"{self.name}: no reads"
+        return (
+            f"{self.name}: {hedged} of {reads} reads hedged, {won} won by the "
+            f"hedge; p99 {1000 * percentile(first, 0.99):.0f} ms -> "
+            f"{1000 * percentile(served, 0.99):.0f} ms"
+        )
+
+    def _submit(self, function, *args) -> concurrent.futures.Future:
+        context = contextvars.copy_context()
+        return self._pool.submit(context.run, function, *args)
+
+    @staticmethod
+    def _first_answer(
+        attempts: list[concurrent.futures.Future],
+    ) -> concurrent.futures.Future:
+        """Wait for the first attempt to answer, or for every one to fail."""
+        pending = set(attempts)
+        while True:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in attempts:
+                if future in done and future.exception() is None:
+                    return future
+            if not pending:
+                return attempts[0]  # Every attempt failed; raise the first error.
+
+    def _finished(self, future: concurrent.futures.Future, started: float):
+        if not future.cancelled() and future.exception() is None:
+            self._timed(self._first, started)
+
+    def _timed(self, durations: collections.deque, started: float):
+        with self._lock:
+            durations.append(time.monotonic() - started)
+
+    def _served_by(self, hedge: typing.Optional[bool], started: float):
+        """Count a read answered, by the hedge if ``hedge`` (None: not hedged)."""
+        with self._lock:
+            self._served.append(time.monotonic() - started)
+            self.reads += 1
+            self.hedged += hedge is not None
+            self.won += bool(hedge)
@@ -0,0 +1,168 @@
+"""Keep upstream connections warm and know their health before the next package.
+
+An operator can be idle for minutes between packages. Servers close idle
+keep-alive connections well before that, so the next IBP call, EasyPost call or
+label download pays for a new TCP and TLS handshake, and an outage only shows
+once the operator has typed everything in.
+
+A :class:`HealthMonitor` watches the pooled :class:`requests.Session` of each
+upstream. Real calls are timed through a response hook; an upstream not called
+for ``interval`` seconds gets a ``HEAD`` probe on the same pooled connection,
+which keeps it open and tells whether the upstream still answers. Any HTTP
+answer counts as healthy: the probe only asks whether the server is reachable.
+:meth:`HealthMonitor.status` sums it up in one line for the prompt.
+"""
+
+import threading
+import time
+import typing
+import urllib.parse
+
+if typing.TYPE_CHECKING:
+    import requests
+
+# Weight of the newest call in an upstream's smoothed latency.
+LATENCY_WEIGHT = 0.3
+
+
+class Upstream:  # pylint: disable=too-many-instance-attributes
+    """Health of one upstream service, as seen through its pooled session."""
+
+    name: str
+    http: "requests.Session"
+    # Probed URL; the label host is learned from the first label downloaded.
+    url: typing.Optional[str]
+    latency: typing.Optional[float]  # Smoothed seconds to the response headers.
+    last_used: float  # Monotonic time of the last call or probe.
+    down_since: typing.Optional[float]  # Wall-clock time of the first failure.
+    error: typing.Optional[str]
+
+    def __init__(self, name: str, http: "requests.Session", url: typing.Optional[str]):
+        self.name = name
+        self.http = http
+        self.url = url
+        self.latency = None
+        # Startup calls each upstream anyway; the first probe can wait.
+        self.last_used = time.monotonic()
+        self.down_since = None
+        self.error = None
+
+    def answered(self, seconds: float, url: typing.Optional[str] = None):
+        """Record a call or probe that got an HTTP answer."""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += LATENCY_WEIGHT * (seconds - self.latency)
+        self.last_used = time.monotonic()
+        self.down_since = self.error = None
+        if self.url is None and url is not None:
+            parts = urllib.parse.urlsplit(url)
+            self.url = f"{parts.scheme}://{parts.netloc}/"
+
+    def failed(self, exc: Exception):
+        """Record a probe that got no answer."""
+        self.last_used = time.monotonic()
+        self.error = type(exc).__name__
+        if self.down_since is None:
+            self.down_since = time.time()
+
+    def describe(self) -> str:
+        """Return the upstream's part of the status line."""
+        if self.down_since is not None:
+            since = time.strftime("%H:%M", time.localtime(self.down_since))
+            return f"{self.name} DOWN since {since} ({self.error})"
+        if self.latency is None:
+            return f"{self.name} ..."
+        return f"{self.name} {1000 * self.latency:.0f} ms"
+
+
+class HealthMonitor:
+    """Probe idle upstreams every ``interval`` seconds in a background thread.
+
+    A probe is one ``HEAD`` request, sent only to an upstream no real call has
+    used for ``interval`` seconds, so a busy station sends none at all.
+    """
+
+    interval: float
+    timeout: float
+    upstreams: dict[str, Upstream]
+
+    def __init__(self, interval: float = 20.0, timeout: float = 5.0):
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        self.upstreams = {}
+        self._hooks: list[tuple["requests.Session", typing.Callable]] = []
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def watch(
+        self, name: str, http: "requests.Session", url: typing.Optional[str] = None
+    ):
+        """Watch an upstream's pooled session, probing ``url`` when it is idle.
+
+        Without a ``url``, the first response's server is probed.
+        """
+        upstream = Upstream(name, http, url)
+        self.upstreams[name] = upstream
+
+        def observe(response, *_args, **_kwargs):
+            upstream.answered(response.elapsed.total_seconds(), response.url)
+
+        http.hooks["response"].append(observe)
+        self._hooks.append((http, observe))
+
+    def start(self):
+        """Keep the watched upstreams warm in the background."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="shippy-health", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop probing and watching calls."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for http, observe in self._hooks:
+            http.hooks["response"].remove(observe)
+        self._hooks.clear()
+
+    def probe(self, upstream: Upstream):
+        """Send one probe on the upstream's pooled connection."""
+        assert upstream.url is not None
+        try:
+            upstream.http.head(
+                upstream.url, timeout=self.timeout, allow_redirects=False
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            upstream.failed(exc)
+        # An answer is recorded by the response hook.
+
+    def healthy(self) -> bool:
+        """Return whether no upstream is known to be down."""
+        return all(up.down_since is None for up in self.upstreams.values())
+
+    def status(self) -> str:
+        """Return a one-line summary of every upstream's health and latency."""
+        return "Upstream: " + ", ".join(
+            upstream.describe() for upstream in self._probed()
+        )
+
+    def _run(self):
+        while True:
+            idle_since = time.monotonic() - self.interval
+            for upstream in self._probed():
+                if upstream.last_used <= idle_since and not self._stop.is_set():
+                    self.probe(upstream)
+            if self._stop.wait(self._next_probe()):
+                return
+
+    def _probed(self) -> list[Upstream]:
+        """Return the upstreams with a known URL (the label host is learned)."""
+        return [up for up in list(self.upstreams.values()) if up.url is not None]
+
+    def _next_probe(self) -> float:
+        """Return the seconds until the least recently used upstream is idle."""
+        oldest = min((up.last_used for up in self._probed()), default=time.monotonic())
+        return max(oldest + self.interval - time.monotonic(), 1.0)
@@ -0,0 +1,76 @@
+"""Per-station shipping history used to rank suggestions."""
+
+import json
+import math
+import os
+import time
+
+from .misc import data_dir
+
+# Frecency half-life: a unit shipped to 30 days ago counts half as much as one
+# shipped to today, so seasonal changes in where books go are picked up quickly.
+HALF_LIFE = 30 * 24 * 60 * 60.0
+
+
+class UnitHistory:
+    """How often and how recently this station has shipped to each unit.
+
+    Each unit keeps a single exponentially decayed score plus the time it was
+    last updated, so recording a shipment and reading a unit's rank are both
+    O(1) and the file never grows beyond one entry per unit.
+    """
+
+    path: str
+    entries: dict[str, tuple[float, float]]
+    # Time of the newest shipment recorded, 0.0 if none.
+    latest: float
+
+    def __init__(self, path: str, entries: dict[str, tuple[float, float]]):
+        self.path = path
+        self.entries = entries
+        self.latest = max((last for _, last in entries.values()), default=0.0)
+
+    @classmethod
+    def load(cls, path: str | None = None) -> "UnitHistory":
+        """Load the history file, starting empty if it is missing or corrupt."""
+        if path is None:
+            path = os.path.join(data_dir(), "unit-history.json")
+
+        try:
+            with open(path, encoding="utf-8") as handle:
+                raw = json.load(handle)
+            entries = {
+                str(unit): (float(score), float(last))
+                for unit, (score, last) in raw.items()
+            }
+        except (OSError, ValueError, TypeError, AttributeError):
+            entries = {}
+
+        return cls(path, entries)
+
+    def score(self, unit: str, now: float | None = None) -> float:
+        """Return the decayed shipment score of a unit (0.0 if never shipped)."""
+        try:
+            score, last = self.entries[unit]
+        except KeyError:
+            return 0.0
+
+        now = time.time() if now is None else now
+        return score * math.pow(0.5, max(now - last, 0.0) / HALF_LIFE)
+
+    def record(self, unit: str, now: float | None = None):
+        """Record one shipment to a unit and persist the history."""
+        now = time.time() if now is None else now
+        self.entries[unit] = (self.score(unit, now) + 1.0, now)
+        self.latest = max(self.latest, now)
+        self.save()
+
+    def save(self):
+        """Atomically write the history file; failures are not fatal."""
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(self.entries, handle)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # Ranking is a convenience; never block shipping on it.
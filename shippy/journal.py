@@ -0,0 +1,193 @@
+"""Crash-safe journal of shipments, so a paid label is never lost or bought twice.
+
+Every shipment moves through these states, each recorded before the step it
+guards is considered done:
+
+``purchasing``
+    About to buy postage. If shippy stops here, the purchase may or may not
+    have gone through.
+``purchased``
+    Postage bought; the label has not been sent to the printer yet.
+``printing``
+    The label is being printed; it may or may not have come out.
+``printed``, ``refunded``, ``failed``, ``dismissed``
+    Settled; nothing more to do.
+
+Entries left in one of the first three states are *in flight*. On the next
+start shippy offers to print, reprint or refund them, and shipping the same
+request again prints the label already paid for instead of buying another.
+
+The journal is an SQLite database in WAL mode. A transition is one small
+indexed write that is synced before returning, which takes well under a
+millisecond next to the EasyPost round trips it sits between.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from .misc import data_dir
+
+IN_FLIGHT = ("purchasing", "purchased", "printing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shipments (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    state TEXT NOT NULL,
+    request_id TEXT,
+    unit TEXT,
+    to_address TEXT NOT NULL,
+    weight REAL NOT NULL,
+    shipment_id TEXT,
+    tracking_code TEXT,
+    label_url TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS shipments_request_id ON shipments (request_id);
+CREATE INDEX IF NOT EXISTS shipments_unit ON shipments (unit);
+CREATE INDEX IF NOT EXISTS shipments_shipment_id ON shipments (shipment_id);
+CREATE INDEX IF NOT EXISTS shipments_tracking_code ON shipments (tracking_code);
+CREATE INDEX IF NOT EXISTS shipments_state ON shipments (state);
+"""
+
+_COLUMNS = (
+    "id, created, state, request_id, unit, to_address, weight, "
+    "shipment_id, tracking_code, label_url"
+)
+
+
+def default_path() -> str:
+    """Return the default journal file in the shippy data directory."""
+    return os.path.join(data_dir(), "journal.sqlite3")
+
+
+def connect(path: str, durable: bool = False) -> sqlite3.Connection:
+    """Open the journal database for use from any thread, in autocommit mode.
+
+    With ``durable``, every write is synced to disk before it returns.
+    """
+    # Autocommit: every statement is its own durable transaction.
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    if durable:
+        db.execute("PRAGMA synchronous=FULL")
+    return db
+
+
+class Entry(typing.NamedTuple):
+    """One journaled shipment."""
+
+    id: int
+    created: float
+    state: str
+    request_id: typing.Optional[str]
+    unit: typing.Optional[str]
+    to_address: dict
+    weight: float  # Ounces.
+    shipment_id: typing.Optional[str]
+    tracking_code: typing.Optional[str]
+    label_url: typing.Optional[str]
+
+    @classmethod
+    def from_row(cls, row) -> "Entry":
+        """Build an entry from a row selected with ``_COLUMNS``."""
+        return cls._make((*row[:5], json.loads(row[5]), *row[6:]))
+
+    def describe(self) -> str:
+        """Return a one-line description for the operator."""
+        target = (
+            f"request {self.request_id}"
+            if self.request_id
+            else f"unit {self.unit}" if self.unit else self.to_address.get("name")
+        )
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created))
+        tracking = f", tracking {self.tracking_code}" if self.tracking_code else ""
+        return f"{when} {target}, {self.weight:g} oz{tracking} ({self.state})"
+
+
+class Journal:
+    """Write-ahead journal of shipment stage transitions."""
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = connect(path, durable=True)
+        self._db.executescript(_SCHEMA)
+
+    @classmethod
+    def open(cls, path: str | None = None) -> "Journal":
+        """Open (creating if needed) the journal at a path or the default one."""
+        return cls(path or default_path())
+
+    def begin(
+        self,
+        to_address: dict,
+        weight: float,
+        request_id: typing.Optional[str] = None,
+        unit: typing.Optional[str] = None,
+    ) -> int:
+        """Record that postage is about to be bought; return the entry ID."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO shipments (created, updated, state, request_id, unit, "
+                "to_address, weight) VALUES (?, ?, 'purchasing', ?, ?, ?, ?)",
+                (now, now, request_id, unit, json.dumps(to_address), weight),
+            )
+        return typing.cast(int, cursor.lastrowid)
+
+    def purchased(self, entry_id: int, shipment):
+        """Record a bought shipment and where its label is."""
+        self._update(
+            entry_id,
+            "purchased",
+            shipment_id=shipment.id,
+            tracking_code=shipment.tracking_code,
+            label_url=shipment.postage_label.label_url,
+        )
+
+    def transition(self, entry_id: int, state: str, error: typing.Optional[str] = None):
+        """Move an entry to a new state."""
+        self._update(entry_id, state, error=error)
+
+    def _update(self, entry_id: int, state: str, **columns):
+        """Set an entry's state and any other columns given."""
+        assignments = "".join(f", {name} = ?" for name in columns)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE shipments SET state = ?, updated = ?{assignments} "
+                "WHERE id = ?",
+                (state, time.time(), *columns.values(), entry_id),
+            )
+
+    def in_flight(self) -> list[Entry]:
+        """Return unsettled entries, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM shipments WHERE state IN (?, ?, ?) "
+                "ORDER BY id",
+                IN_FLIGHT,
+            ).fetchall()
+        return [Entry.from_row(row) for row in rows]
+
+    def unprinted(self, request_id: str) -> typing.Optional[Entry]:
+        """Return a bought but unprinted shipment for a request, if there is one."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM shipments WHERE request_id = ? "
+                "AND state IN ('purchased', 'printing') ORDER BY id DESC LIMIT 1",
+                (request_id,),
+            ).fetchone()
+        return None if row is None else Entry.from_row(row)
+
+    def close(self):
+        """Close the journal."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,258 @@
+"""Memory budgets for shipping sessions that run all day.
+
+A station ships thousands of labels without restarting, so anything kept per
+label must be bounded: :class:`BoundedCache` evicts the least recently used
+entries past a size, and :class:`LabelCanvases` keeps a few label-sized images
+to paste downloaded labels into instead of allocating one per label.
+
+:class:`MemoryTracker` (``--memory``) reports how resident memory and Python
+allocations grew over every 100 labels, to tell a slow leak from a steady
+state.
+"""
+
+import collections
+import os
+import sys
+import threading
+import tracemalloc
+import typing
+
+if typing.TYPE_CHECKING:
+    from PIL import Image
+
+K = typing.TypeVar("K")
+V = typing.TypeVar("V")
+
+# Label-sized images kept between labels; a job with more labels allocates the
+# extra ones and drops them afterwards.
+MAX_CANVASES = 8
+
+
+class BoundedCache(collections.OrderedDict[K, V]):
+    """Mapping that evicts its least recently used entries past ``maxsize``."""
+
+    def __init__(self, maxsize: int = 256):
+        super().__init__()
+        self.maxsize = int(maxsize)
+
+    def __getitem__(self, key: K) -> V:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: K, value: V):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+class LabelCanvases:
+    """Reusable label-sized images, allocated once per size and mode.
+
+    Downloaded labels are pasted into a canvas and closed at once, so a label
+    costs one short-lived decoded image instead of an image (plus a converted
+    copy of the logo) kept until printing is done. The logo is converted to the
+    canvas mode once, not once per label.
+    """
+
+    def __init__(self, maxsize: int = MAX_CANVASES):
+        self.maxsize = int(maxsize)
+        self._free: list["Image.Image"] = []
+        # (logo, mode, logo converted to that mode) of the last label.
+        self._logo: typing.Optional[tuple["Image.Image", str, "Image.Image"]] = None
+        self._lock = threading.Lock()
+
+    def compose(
+        self, label: "Image.Image", logo: "Image.Image", position: tuple[int, int]
+    ) -> "Image.Image":
+        """Return a canvas holding the label with the logo pasted in.
+
+        The label image is closed; give the canvas back with :meth:`release`.
+        """
+        from PIL import Image  # pylint: disable=import-outside-toplevel
+
+        with self._lock:
+            canvas = next(
+                (
+                    free
+                    for free in self._free
+                    if free.size == label.size and free.mode == label.mode
+                ),
+                None,
+            )
+            if canvas is not None:
+                self._free.remove(canvas)
+            if (
+                self._logo is None
+                or self._logo[0] is not logo
+                or self._logo[1] != label.mode
+            ):
+                converted = (
+                    logo if logo.mode == label.mode else logo.convert(label.mode)
+                )
+                self._logo = (logo, label.mode, converted)
+            converted = self._logo[2]
+
+        if canvas is None:
+            canvas = Image.new(label.mode, label.size)
+        canvas.paste(label, (0, 0))
+        label.close()
+        canvas.paste(converted, position)
+        return canvas
+
+    def release(self, canvases: typing.Iterable["Image.Image"]):
+        """Take canvases back once printed, keeping at most ``maxsize``."""
+        with self._lock:
+            for canvas in canvases:
+                if len(self._free) < self.maxsize:
+                    self._free.append(canvas)
+                else:
+                    canvas.close()
+
+
+def rss_bytes() -> typing.Optional[int]:
+    """Return the process's resident memory in bytes, if it can be read."""
+    if sys.platform == "win32":
+        return _windows_rss()
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    # Peak rather than current size, and in bytes on macOS only.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_rss() -> typing.Optional[int]:
+    """Return the working set size from ``GetProcessMemoryInfo``."""
+    # pylint: disable-next=import-outside-toplevel
+    import ctypes
+    from ctypes import wintypes  # pylint: disable=import-outside-toplevel
+
+    class Counters(ctypes.Structure):  # pylint: disable=too-few-public-methods
+        """``PROCESS_MEMORY_COUNTERS``."""
+
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = Counters(cb=ctypes.sizeof(Counters))
+    psapi = ctypes.WinDLL("psapi")  # type: ignore[attr-defined]
+    kernel32 = ctypes.WinDLL("kernel32")  # type: ignore[attr-defined]
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    process = kernel32.GetCurrentProcess()
+    if not psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+
+class MemoryTracker:
+    """Report memory growth every ``every`` labels.
+
+    Resident memory covers everything, Pillow's image buffers included; with
+    ``allocations``, :mod:`tracemalloc` also follows Python's own allocations
+    and names the lines whose allocations grew most.
+    """
+
+    every: int
+    allocations: bool
+
+    def __init__(
+        self,
+        every: int = 100,
+        allocations: bool = True,
+        output: typing.Optional[typing.TextIO] = None,
+    ):
+        self.every = int(every)
+        self.allocations = allocations
+        self.output = output
+        self.labels = 0
+        self._reported = 0  # Labels counted at the last report.
+        self._baseline: tuple = (None, None, None)
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Take the starting measurement."""
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._baseline = self._measure()
+
+    def stop(self):
+        """Stop following Python allocations."""
+        if self.allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def label(self, count: int = 1):
+        """Count printed labels, reporting after every ``every`` of them."""
+        with self._lock:
+            before = self.labels
+            self.labels += count
+            if self.labels // self.every == before // self.every:
+                return
+            line = self._report()
+        print(line, file=self.output or sys.stderr)
+
+    def _measure(self) -> tuple:
+        rss = rss_bytes()
+        if not (self.allocations and tracemalloc.is_tracing()):
+            return rss, None, None
+        return rss, tracemalloc.get_traced_memory()[0], tracemalloc.take_snapshot()
+
+    def _report(self) -> str:
+        """Describe the growth since the last report."""
+        rss, traced, snapshot = measured = self._measure()
+        previous_rss, previous_traced, previous_snapshot = self._baseline
+        self._baseline = measured
+
+        parts = [f"labels {self._reported + 1}-{self.labels}:"]
+        self._reported = self.labels
+        if rss is not None:
+            growth = "" if previous_rss is None else f" ({_mib(rss - previous_rss)})"
+            parts.append(f"RSS {rss / 2**20:.1f} MiB{growth}")
+        if traced is not None and previous_traced is not None:
+            parts.append(
+                f"Python {traced / 2**20:.1f} MiB ({_mib(traced - previous_traced)})"
+            )
+            top = snapshot.compare_to(previous_snapshot, "lineno")[:1]
+            if top and top[0].size_diff > 0:
+                frame = top[0].traceback[0]
+                parts.append(
+                    f"most from {os.path.basename(frame.filename)}:{frame.lineno} "
+                    f"(+{top[0].size_diff / 1024:.0f} KiB)"
+                )
+        return " ".join(parts)
+
+
+def _mib(delta: int) -> str:
+    return f"{delta / 2**20:+.1f}"
+
+
+_TRACKER: typing.Optional[MemoryTracker] = None
+
+
+def install(tracker: typing.Optional[MemoryTracker]):
+    """Make a tracker count every printed label (None turns tracking off)."""
+    global _TRACKER  # pylint: disable=global-statement
+    _TRACKER = tracker
+
+
+def label_printed(count: int = 1):
+    """Count printed labels in the installed tracker, if any."""
+    tracker = _TRACKER
+    if tracker is not None:
+        tracker.label(count)
@@ -0,0 +1,226 @@
+"""Per-stage latency metrics and the ``shippy stats`` report.
+
+Every :func:`shippy.console.task_message` stage ("Verifying address",
+"Purchasing postage", "Printing postage", ...) is timed and appended as one JSON
+line to a local metrics file. Recording is one buffered ``write`` of a short
+line, so it stays negligible next to the network calls it measures.
+"""
+
+import collections
+import datetime
+import json
+import math
+import os
+import re
+import threading
+import time
+import typing
+
+from .misc import data_dir
+
+# The stage whose successful completion means one more label came out.
+LABEL_STAGE = "Printing postage"
+
+# Recent durations kept per stage for the Prometheus quantiles.
+_WINDOW = 1000
+
+_DURATION_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw])$")
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def default_path() -> str:
+    """Return the default metrics file in the shippy data directory."""
+    return os.path.join(data_dir(), "metrics.jsonl")
+
+
+class _StageSummary:  # pylint: disable=too-few-public-methods
+    """Running totals and recent durations of one stage, for the export."""
+
+    __slots__ = ("recent", "count", "total", "errors")
+
+    def __init__(self):
+        self.recent: collections.deque = collections.deque(maxlen=_WINDOW)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+
+class MetricsStore:
+    """Append-only JSONL store of stage timings, with optional Prometheus export."""
+
+    path: str
+    prometheus_path: typing.Optional[str]
+    interval: float
+
+    def __init__(
+        self,
+        path: str,
+        prometheus_path: typing.Optional[str] = None,
+        interval: float = 15.0,
+    ):
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self.interval = float(interval)
+        self._file = open(path, "a", encoding="utf-8")  # pylint: disable=R1732
+        self._lock = threading.Lock()
+        self._stages: dict[str, _StageSummary] = collections.defaultdict(_StageSummary)
+        self._exported = 0.0
+
+    def record(self, stage: str, seconds: float, ok: bool):
+        """Append one stage timing."""
+        line = json.dumps(
+            {"ts": round(time.time(), 3), "stage": stage, "s": round(seconds, 4)}
+            | ({} if ok else {"error": True})
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            # Flushed per line so a crash loses at most the stage in progress.
+            self._file.flush()
+
+            if self.prometheus_path is not None:
+                summary = self._stages[stage]
+                summary.recent.append(seconds)
+                summary.count += 1
+                summary.total += seconds
+                summary.errors += 0 if ok else 1
+                if time.monotonic() - self._exported >= self.interval:
+                    self._export()
+
+    def _export(self):
+        """Write the Prometheus text-file collector format atomically."""
+        lines = [
+            "# HELP shippy_stage_duration_seconds Duration of shippy stages.",
+            "# TYPE shippy_stage_duration_seconds summary",
+        ]
+        for stage, summary in sorted(self._stages.items()):
+            label = stage.replace("\\", "\\\\").replace('"', '\\"')
+            ordered = sorted(summary.recent)
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(
+                    f'shippy_stage_duration_seconds{{stage="{label}",'
+                    f'quantile="{quantile}"}} {percentile(ordered, quantile):.6f}'
+                )
+            lines += [
+                f'shippy_stage_duration_seconds_count{{stage="{label}"}} '
+                f"{summary.count}",
+                f'shippy_stage_duration_seconds_sum{{stage="{label}"}} '
+                f"{summary.total:.6f}",
+                f'shippy_stage_errors_total{{stage="{label}"}} {summary.errors}',
+            ]
+
+        tmp_path = f"{self.prometheus_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                handle.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.prometheus_path)
+        except OSError:
+            pass  # Export is best-effort; never block shipping on it.
+        self._exported = time.monotonic()
+
+    def close(self):
+        """Flush the Prometheus export and close the metrics file."""
+        with self._lock:
+            if self.prometheus_path is not None and self._stages:
+                self._export()
+            self._file.close()
+
+
+_STORE: typing.Optional[MetricsStore] = None
+
+
+def install(store: typing.Optional[MetricsStore]):
+    """Make a store receive every stage timing (None turns recording off)."""
+    global _STORE  # pylint: disable=global-statement
+    _STORE = store
+
+
+def record(stage: str, seconds: float, ok: bool):
+    """Record a stage timing in the installed store, if any."""
+    store = _STORE
+    if store is not None:
+        try:
+            store.record(stage, seconds, ok)
+        except (OSError, ValueError):
+            pass  # A full disk must not stop a label from printing.
+
+
+def parse_duration(text: str) -> float:
+    """Parse a duration such as ``90m``, ``8h`` or ``7d`` into seconds."""
+    match = _DURATION_RE.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"invalid duration {text!r}, expected e.g. 30m, 8h, 7d")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def percentile(ordered: typing.Sequence[float], quantile: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return float("nan")
+    rank = math.ceil(quantile * len(ordered)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+def read_events(path: str, since: float) -> typing.Iterator[dict]:
+    """Yield recorded events at or after a Unix timestamp, skipping bad lines."""
+    try:
+        handle = open(path, encoding="utf-8")  # pylint: disable=R1732
+    except FileNotFoundError:
+        return
+
+    with handle:
+        for line in handle:
+            try:
+                event = json.loads(line)
+                if event["ts"] >= since:
+                    yield event
+            except (ValueError, KeyError, TypeError):
+                continue  # A line cut short by a crash.
+
+
+def report(path: str, since: float) -> str:
+    """Return the ``shippy stats`` report for events since a Unix timestamp."""
+    durations: dict[str, list[float]] = collections.defaultdict(list)
+    errors: collections.Counter = collections.Counter()
+    labels: collections.Counter = collections.Counter()
+
+    for event in read_events(path, since):
+        stage = event["stage"]
+        durations[stage].append(float(event["s"]))
+        if event.get("error"):
+            errors[stage] += 1
+        elif stage == LABEL_STAGE:
+            hour = datetime.datetime.fromtimestamp(event["ts"]).strftime(
+                "%Y-%m-%d %H:00"
+            )
+            labels[hour] += 1
+
+    start = datetime.datetime.fromtimestamp(since).strftime("%Y-%m-%d %H:%M")
+    if not durations:
+        return f"No stage timings recorded since {start} in {path}."
+
+    lines = [
+        f"Stage latency since {start}",
+        f"  {'stage':38s} {'count':>6s} {'errors':>7s} "
+        f"{'p50':>8s} {'p95':>8s} {'p99':>8s}",
+    ]
+    for stage, values in sorted(durations.items(), key=lambda item: -len(item[1])):
+        ordered = sorted(values)
+        quantiles = " ".join(
+            f"{percentile(ordered, q):7.3f}s" for q in (0.5, 0.95, 0.99)
+        )
+        error_rate = 100.0 * errors[stage] / len(values)
+        lines.append(
+            f"  {stage[:38]:38s} {len(values):6d} {error_rate:6.1f}% {quantiles}"
+        )
+
+    lines += ["", "Labels per hour"]
+    if labels:
+        lines += [f"  {hour}  {count:5d}" for hour, count in sorted(labels.items())]
+        lines.append(
+            f"  {'average':16s}  {sum(labels.values()) / len(labels):5.1f}"
+            " (over hours with labels)"
+        )
+    else:
+        lines.append("  (no labels printed)")
+
+    return "\n".join(lines)
@@ -3,9 +3,28 @@
 import os
 import tempfile
 import contextlib
-import urllib.request
+import functools
+import io
+import typing
 
-from PIL import Image
+if typing.TYPE_CHECKING:
+    import requests
+
+    from .deadline import Hedger
+
+
+def data_dir() -> str:
+    """Return (creating it if needed) the per-station shippy data directory.
+
+    This is ``%LOCALAPPDATA%\\shippy`` on the Windows shipping machines and the
+    XDG data directory elsewhere, so station history survives reboots.
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_DATA_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".local", "share")
+    directory = os.path.join(base, "shippy")
+    os.makedirs(directory, exist_ok=True)
+    return directory
 
 
 @contextlib.contextmanager
@@ -23,10 +42,46 @@ def build_tempfile(*args, **kwargs):
         os.remove(tmp.name)
 
 
-def grab_png_from_url(url: str):
-    """Grab a PNG image from a URL."""
-    with build_tempfile(suffix=".png") as tmpfile:
-        urllib.request.urlretrieve(url, tmpfile.name)
-        img = Image.open(tmpfile.name)
-        img.load()
-        return img
+@functools.lru_cache(maxsize=1)
+def label_http() -> "requests.Session":
+    """Return the pooled HTTP session every label download shares.
+
+    Labels come from one host, so from the second label on a download reuses
+    an open connection instead of paying for a new TCP and TLS handshake.
+    Downloads keep to the label's time budget (see :mod:`shippy.deadline`).
+    """
+    # pylint: disable=import-outside-toplevel
+    import requests
+
+    from .deadline import bound
+
+    return bound(requests.Session())
+
+
+def _download(
+    url: str, timeout: float, hedger: typing.Optional["Hedger"] = None
+) -> bytes:
+    def get() -> bytes:
+        response = label_http().get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    return get() if hedger is None else hedger.call(get)
+
+
+def grab_png_from_url(
+    url: str, timeout: float = 30.0, hedger: typing.Optional["Hedger"] = None
+):
+    """Grab a PNG image from a URL, sent again through ``hedger`` if slow."""
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    img = Image.open(io.BytesIO(_download(url, timeout, hedger)))
+    img.load()
+    return img
+
+
+def grab_bytes_from_url(
+    url: str, timeout: float = 30.0, hedger: typing.Optional["Hedger"] = None
+) -> bytes:
+    """Download a small file (e.g. a ZPL label) into memory."""
+    return _download(url, timeout, hedger)
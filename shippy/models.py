@@ -1,6 +1,8 @@
 """Pydantic models for configuration checking."""
 
-from pydantic import BaseModel, HttpUrl, PositiveFloat
+import typing
+
+from pydantic import BaseModel, HttpUrl, NonNegativeFloat, PositiveFloat, PositiveInt
 
 
 class IbpConfig(BaseModel):
@@ -11,15 +13,23 @@ class IbpConfig(BaseModel):
 
 
 class EasypostConfig(BaseModel):
-    """Model for Easypost configuration."""
+    """Model for Easypost configuration.
+
+    ``api_base`` only needs changing to point shippy at a local stand-in.
+    """
 
     apikey: str
+    api_base: HttpUrl = HttpUrl("https://api.easypost.com/v2")
 
 
 class GoogleMapsConfig(BaseModel):
-    """Model for Google Maps configuration."""
+    """Model for Google Maps configuration.
+
+    ``base_url`` only needs changing to point shippy at a local stand-in.
+    """
 
     apikey: str
+    base_url: HttpUrl = HttpUrl("https://maps.googleapis.com")
 
 
 class ParcelConfig(BaseModel):
@@ -36,6 +46,175 @@ class ParcelConfig(BaseModel):
     height: PositiveFloat = 10.0
 
 
+class RatingConfig(BaseModel):
+    """Model for which rates EasyPost is asked for.
+
+    With a ``service``, shipments are rated only with the ``carrier``'s
+    accounts and bought with that service in the same call that creates them.
+    The account IDs are looked up once per session unless pinned as
+    ``carrier_accounts`` (comma-separated). Leave ``service`` empty to rate
+    every carrier on the EasyPost account and buy the lowest ``carrier`` rate.
+    """
+
+    carrier: str = "USPS"
+    service: typing.Optional[str] = "LibraryMail"
+    carrier_accounts: typing.Optional[str] = None
+
+
+class ScaleConfig(BaseModel):
+    """Model for an optional serial shipping scale.
+
+    Without a ``port`` (or if nothing answers on it) shippy asks for weights at
+    the prompt as usual.
+    """
+
+    port: typing.Optional[str] = None
+    baudrate: PositiveInt = 9600
+    protocol: typing.Literal["auto", "ascii", "toledo"] = "auto"
+    stable_readings: PositiveInt = 3
+    tolerance: NonNegativeFloat = 0.1  # Ounces.
+    timeout: PositiveFloat = 15.0  # Seconds to wait for a package to settle.
+    detect_timeout: PositiveFloat = 2.0
+
+
+class PrinterConfig(BaseModel):
+    """Model for label printing.
+
+    ``backend`` is ``auto`` for the platform's printer, or ``null`` to discard
+    labels instead of printing them (benchmarks and dry runs).
+
+    ``label_format`` ``zpl`` has EasyPost return ZPL, which is sent to the
+    printer as-is: to ``device`` (a device path such as ``/dev/usb/lp0``, or
+    ``tcp:HOST:9100`` for a network printer) if set, else as a RAW job to the
+    Windows label printer.
+
+    ``pool`` spreads labels over every connected label printer with a
+    serial-named queue instead of refusing to choose between them:
+    ``least-busy`` by queued jobs, or ``round-robin``. A printer that fails is
+    left out for ``pool_cooldown`` seconds, doubling with each failure.
+
+    ``sheet`` prints PNG labels ``2-up`` or ``4-up`` on ``sheet_paper`` on an
+    office printer instead (``sheet_printer``, else the default printer), at
+    their physical size with cut guides. A partly filled sheet prints once no
+    label has been added for ``sheet_timeout`` seconds, or when shippy exits.
+    Four 4x6 labels only fit on legal paper.
+
+    ``watch`` asks the spooler for the printer's status every
+    ``watch_interval`` seconds, and no postage is bought while it is out of
+    paper, offline, paused or in error.
+    """
+
+    backend: typing.Literal["auto", "null"] = "auto"
+    label_format: typing.Literal["png", "zpl"] = "png"
+    device: typing.Optional[str] = None
+    pool: bool = False
+    pool_strategy: typing.Literal["least-busy", "round-robin"] = "least-busy"
+    pool_cooldown: PositiveFloat = 60.0
+    sheet: typing.Literal["none", "2-up", "4-up"] = "none"
+    sheet_paper: typing.Literal["letter", "legal", "a4"] = "letter"
+    sheet_printer: typing.Optional[str] = None
+    sheet_timeout: PositiveFloat = 60.0
+    watch: bool = True
+    watch_interval: PositiveFloat = 2.0
+
+
+class ServeConfig(BaseModel):
+    """Model for the ``shippy serve`` label daemon.
+
+    Listen on a LAN address only together with a ``token``: anyone who can
+    reach the daemon can buy postage.
+    """
+
+    listen: str = "127.0.0.1:8765"
+    token: typing.Optional[str] = None
+    workers: PositiveInt = 4  # Purchases run at once.
+
+
+class MetricsConfig(BaseModel):
+    """Model for the local stage-latency metrics store.
+
+    ``path`` defaults to ``metrics.jsonl`` in the shippy data directory. Set
+    ``prometheus_textfile`` to also export a summary for the node exporter's
+    text-file collector.
+    """
+
+    enabled: bool = True
+    path: typing.Optional[str] = None
+    prometheus_textfile: typing.Optional[str] = None
+    prometheus_interval: PositiveFloat = 15.0  # Seconds between exports.
+
+
+class TracingConfig(BaseModel):
+    """Model for the outbound HTTP call trace.
+
+    ``path`` defaults to ``http-trace.jsonl`` in the shippy data directory; it
+    is rotated at ``max_bytes``, keeping ``backups`` old files. Off unless
+    ``enabled``.
+    """
+
+    enabled: bool = False
+    path: typing.Optional[str] = None
+    max_bytes: PositiveInt = 5_000_000
+    backups: PositiveInt = 3
+
+
+class OutboxConfig(BaseModel):
+    """Model for the queue of labels entered while upstream is unreachable.
+
+    Queued labels are bought ``workers`` at a time, starting at most ``rate``
+    purchases a second, and printed in the order they were entered. While
+    offline, reaching upstream is retried every ``retry_interval`` seconds.
+    """
+
+    enabled: bool = True
+    workers: PositiveInt = 4
+    rate: PositiveFloat = 2.0
+    retry_interval: PositiveFloat = 15.0
+
+
+class QueueConfig(BaseModel):
+    """Model for ``queue`` mode, which ships the IBP server's ready requests.
+
+    Ready requests are listed ``page_size`` at a time. The next ``prefetch``
+    addresses are looked up and verified while the operator weighs the current
+    package, and shipped requests are acknowledged ``ack_batch`` at a time.
+    """
+
+    prefetch: PositiveInt = 4
+    page_size: PositiveInt = 50
+    ack_batch: PositiveInt = 10
+
+
+class HealthConfig(BaseModel):
+    """Model for keeping upstream connections warm between packages.
+
+    An upstream no call has used for ``interval`` seconds is sent a ``HEAD``
+    probe on its pooled connection, which keeps the connection open and shows
+    whether the upstream still answers before the next package is entered.
+    Keep ``interval`` below the servers' keep-alive timeout (often 60 s).
+    """
+
+    enabled: bool = True
+    interval: PositiveFloat = 20.0
+    timeout: PositiveFloat = 5.0  # Seconds a probe waits for an answer.
+
+
+class DeadlineConfig(BaseModel):
+    """Model for the time budget of each label, and hedged reads.
+
+    Every call made for a label, from its address lookup until its postage is
+    bought, gets at most what is left of ``label`` seconds; a label out of time
+    fails as if upstream were unreachable. The purchase, refunds, and the label
+    download and printing once postage is bought always run their full
+    timeout. With ``hedge``, an IBP
+    lookup or label download slower than 95% of recent ones is sent a second
+    time, and the first answer is used.
+    """
+
+    label: PositiveFloat = 20.0
+    hedge: bool = True
+
+
 class Config(BaseModel):
     """Model for application configuration."""
 
@@ -43,3 +222,13 @@ class Config(BaseModel):
     easypost: EasypostConfig
     googlemaps: GoogleMapsConfig
     parcel: ParcelConfig = ParcelConfig()
+    rating: RatingConfig = RatingConfig()
+    scale: ScaleConfig = ScaleConfig()
+    printer: PrinterConfig = PrinterConfig()
+    serve: ServeConfig = ServeConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    tracing: TracingConfig = TracingConfig()
+    outbox: OutboxConfig = OutboxConfig()
+    queue: QueueConfig = QueueConfig()
+    health: HealthConfig = HealthConfig()
+    deadline: DeadlineConfig = DeadlineConfig()
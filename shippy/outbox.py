@@ -0,0 +1,427 @@
+"""Labels entered while upstream is unreachable, shipped once it is back.
+
+When IBP or EasyPost cannot be reached, the operator keeps entering labels:
+each goes into an ``outbox`` table next to the shipment journal, in the same
+SQLite file, with its address (or the IBP lookup still to do) and weights. A
+:class:`Drainer` thread retries every so often and, once upstream answers,
+buys the queued labels a few at a time and prints them in the order they were
+entered. While anything is queued, new labels queue behind it.
+
+Only failures before anything was bought are queued: a purchase that fails
+half-way may have gone through, so it is reported as before rather than risk
+buying the label twice. A label printer known not to be ready holds labels the
+same way, until it prints again.
+"""
+
+import collections
+import concurrent.futures
+import json
+import socket
+import threading
+import time
+import typing
+import urllib.error
+
+import requests
+
+from . import console, tracing
+from .journal import connect, default_path
+from .printing.watch import PrinterNotReady
+from .server import AddressLookup
+
+if typing.TYPE_CHECKING:
+    from .models import OutboxConfig
+    from .session import Session
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    state TEXT NOT NULL,
+    request_id TEXT,
+    unit TEXT,
+    to_address TEXT,
+    lookup TEXT,
+    weights TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_queued ON outbox (id) WHERE state = 'queued';
+"""
+
+_COLUMNS = "id, created, request_id, unit, to_address, lookup, weights"
+
+# Errors meaning a request never got an answer, anywhere in an exception chain
+# (EasyPost wraps the requests error it caught).
+_OFFLINE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+    urllib.error.URLError,
+)
+
+
+class Unreachable(Exception):
+    """Upstream could not be reached, and nothing was bought."""
+
+
+def is_offline(exc: typing.Optional[BaseException]) -> bool:
+    """Return whether an error means an upstream service could not be reached."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, _OFFLINE_ERRORS):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class Job(typing.NamedTuple):
+    """One queued label, or several boxes to the same address."""
+
+    id: int
+    created: float
+    request_id: typing.Optional[str]
+    unit: typing.Optional[str]
+    to_address: typing.Optional[dict]  # None until looked up.
+    lookup: typing.Optional[AddressLookup]
+    weights: list[float]  # Ounces.
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        """Build a job from a row selected with ``_COLUMNS``."""
+        job_id, created, request_id, unit, to_address, lookup, weights = row
+        if lookup is not None:
+            kind, autoid = json.loads(lookup)
+            # JSON has no tuples; a compound request ID comes back as a list.
+            lookup = AddressLookup(
+                kind, tuple(autoid) if isinstance(autoid, list) else autoid
+            )
+        return cls(
+            job_id,
+            created,
+            request_id,
+            unit,
+            None if to_address is None else json.loads(to_address),
+            lookup,
+            json.loads(weights),
+        )
+
+    def describe(self) -> str:
+        """Return a short description for the operator."""
+        if self.request_id:
+            target = f"request {self.request_id}"
+        elif self.unit:
+            target = f"unit {self.unit}"
+        else:
+            target = (self.to_address or {}).get("name", "manual address")
+        boxes = f", {len(self.weights)} boxes" if len(self.weights) > 1 else ""
+        return f"{target}{boxes}"
+
+
+class Outbox:
+    """Durable, ordered queue of labels waiting for upstream."""
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = connect(path, durable=True)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str | None = None) -> "Outbox":
+        """Open the queue in the journal file at a path or the default one."""
+        return cls(path or default_path())
+
+    def put(
+        self,
+        address: typing.Union[dict, AddressLookup],
+        weights: typing.Sequence[float],
+        *,
+        request_id: typing.Optional[str] = None,
+        unit: typing.Optional[str] = None,
+    ) -> int:
+        """Queue a label: an address or the lookup giving it, and weights."""
+        to_address, lookup = (
+            (None, address) if isinstance(address, AddressLookup) else (address, None)
+        )
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (created, state, request_id, unit, to_address, "
+                "lookup, weights) VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    request_id,
+                    unit,
+                    None if to_address is None else json.dumps(to_address),
+                    None if lookup is None else json.dumps(lookup),
+                    json.dumps(list(weights)),
+                ),
+            )
+        return typing.cast(int, cursor.lastrowid)
+
+    def peek(self, limit: int) -> list[Job]:
+        """Return up to ``limit`` queued jobs, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM outbox WHERE state = 'queued' "
+                "ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def depth(self) -> int:
+        """Return how many jobs are queued."""
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE state = 'queued'"
+            ).fetchone()
+        return count
+
+    def remove(self, job_id: int):
+        """Drop a job whose postage was bought; the journal has it from here."""
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (job_id,))
+
+    def fail(self, job_id: int, error: str):
+        """Take a job that cannot succeed out of the queue, keeping its error."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET state = 'failed', error = ? WHERE id = ?",
+                (error, job_id),
+            )
+
+    def close(self):
+        """Close the queue."""
+        with self._lock:
+            self._db.close()
+
+
+Bought = list[tuple[typing.Any, typing.Optional[int]]]
+
+
+class Drainer:  # pylint: disable=too-many-instance-attributes
+    """Ship labels now, or queue them and ship them once upstream is back.
+
+    Queued labels are bought ``workers`` at a time, starting at most ``rate``
+    purchases a second, and printed strictly in queue order: a label bought
+    ahead of an earlier one still being bought waits for it.
+    """
+
+    def __init__(self, outbox: Outbox, session: "Session", config: "OutboxConfig"):
+        self.outbox = outbox
+        self.session = session
+        self.config = config
+        self.offline_since: typing.Optional[float] = None
+        # What the queue waits for while offline_since is set.
+        self.waiting_for = "upstream"
+        self._held: dict[int, tuple[Job, Bought]] = {}
+        self._draining = False
+        self._printed: collections.deque[float] = collections.deque()
+        self._notes: list[str] = []
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="shippy-outbox", daemon=True
+        )
+
+    def start(self):
+        """Start draining, beginning with anything an earlier run queued."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop draining once the labels being bought are printed."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+    def pending(self) -> int:
+        """Return how many labels are queued or being shipped from the queue."""
+        return self.outbox.depth() + len(self._held) + int(self._draining)
+
+    def ship(
+        self,
+        address: typing.Union[dict, AddressLookup],
+        weights: typing.Sequence[float],
+        request_id: typing.Optional[str] = None,
+        unit: typing.Optional[str] = None,
+    ) -> bool:
+        """Ship a label now if possible, else queue it; return whether queued.
+
+        Labels queue while upstream is unreachable and behind any already
+        queued, so they print in the order they were entered.
+        """
+        if self.offline_since is None and not self.pending():
+            try:
+                with tracing.trace(request_id=request_id, unit=unit):
+                    bought = self.session.buy(
+                        self._resolve(address), weights, request_id, unit
+                    )
+                    self.session.print_bought(bought, request_id)
+                return False
+            except (Unreachable, PrinterNotReady) as exc:
+                self._went_offline(exc)
+                if isinstance(exc, PrinterNotReady):
+                    console.warn(f"{exc}.")
+                else:
+                    console.warn(f"Upstream unreachable ({exc}).")
+
+        self.outbox.put(address, weights, request_id=request_id, unit=unit)
+        self._wake.set()
+        console.warn(f"Label queued; {self.pending()} waiting for {self.waiting_for}.")
+        return True
+
+    def report(self) -> list[str]:
+        """Return news since the last call and the queue status, for the operator."""
+        with self._lock:
+            lines, self._notes = self._notes, []
+            cutoff = time.monotonic() - 60.0
+            while self._printed and self._printed[0] < cutoff:
+                self._printed.popleft()
+            rate = len(self._printed)
+
+        pending = self.pending()
+        if pending and self.offline_since is not None:
+            since = time.strftime("%H:%M", time.localtime(self.offline_since))
+            lines.append(
+                f"Outbox: {pending} labels waiting for {self.waiting_for} since "
+                f"{since}, retrying every {self.config.retry_interval:g} s."
+            )
+        elif pending:
+            lines.append(f"Outbox: {pending} labels waiting, printing {rate}/min.")
+        return lines
+
+    def _resolve(self, address: typing.Union[dict, AddressLookup]) -> dict:
+        """Return an address, looking it up on the IBP server if need be."""
+        if not isinstance(address, AddressLookup):
+            return address
+        try:
+            with console.task_message("Looking up address"):
+                return address.resolve(self.session.server)
+        except Exception as exc:
+            if is_offline(exc):
+                raise Unreachable(str(exc)) from exc
+            raise
+
+    def _went_offline(self, exc: Exception):
+        if isinstance(exc, PrinterNotReady):
+            self.waiting_for = "the label printer"
+        else:
+            self.waiting_for = "upstream"
+        if self.offline_since is None:
+            self.offline_since = time.time()
+
+    def _note(self, message: str):
+        with self._lock:
+            self._notes.append(message)
+
+    def _run(self):
+        with console.quiet():
+            while not self._stop.is_set():
+                if not self.outbox.depth() and not self._held:
+                    self._wake.wait()
+                    self._wake.clear()
+                    continue
+
+                if self.offline_since is not None:
+                    if self._stop.wait(self.config.retry_interval):
+                        break
+                    # Probe with the oldest label before opening up.
+                    limit = 1
+                else:
+                    limit = 2 * self.config.workers
+
+                self._draining = True
+                try:
+                    self._drain(self.outbox.peek(limit), limit)
+                finally:
+                    self._draining = False
+
+                if not self.pending() and self.offline_since is None:
+                    self._note("Outbox: every queued label is printed.")
+
+    def _drain(self, jobs: list[Job], limit: int):
+        """Buy a window of queued labels concurrently and print them in order."""
+        # Labels bought earlier can go out if no queued one comes before them.
+        boundary = jobs[-1].id if len(jobs) == limit else float("inf")
+        held = {
+            job_id: item for job_id, item in self._held.items() if job_id < boundary
+        }
+        for job_id in held:
+            del self._held[job_id]
+
+        with concurrent.futures.ThreadPoolExecutor(self.config.workers) as pool:
+            futures = {job.id: (job, pool.submit(self._buy, job)) for job in jobs}
+            for job_id in sorted(held.keys() | futures.keys()):
+                if job_id in held:
+                    self._print(*held[job_id])
+                    continue
+
+                job, future = futures.pop(job_id)
+                try:
+                    bought = future.result()
+                except (Unreachable, PrinterNotReady) as exc:
+                    self._went_offline(exc)
+                    self._hold(futures.values())
+                    # Held labels not printed yet wait for this one again.
+                    self._held.update(
+                        (held_id, item)
+                        for held_id, item in held.items()
+                        if held_id > job_id
+                    )
+                    return
+                except Exception as exc:  # pylint: disable=broad-except
+                    self.outbox.fail(job.id, repr(exc))
+                    self._note(f"Queued label for {job.describe()} failed: {exc}")
+                    continue
+
+                self.offline_since = None
+                self._print(job, bought)
+
+    def _hold(self, rest: typing.Iterable[tuple[Job, concurrent.futures.Future]]):
+        """Keep labels bought after one that failed until that one prints."""
+        for job, future in rest:
+            if future.cancel():
+                continue
+            try:
+                self._held[job.id] = (job, future.result())
+            except (Unreachable, PrinterNotReady):
+                pass
+            except Exception as exc:  # pylint: disable=broad-except
+                self.outbox.fail(job.id, repr(exc))
+                self._note(f"Queued label for {job.describe()} failed: {exc}")
+
+    def _buy(self, job: Job) -> Bought:
+        """Buy a queued label's postage (in a worker thread)."""
+        with console.quiet(), tracing.trace(request_id=job.request_id, unit=job.unit):
+            self._throttle()
+            address = job.to_address or typing.cast(AddressLookup, job.lookup)
+            bought = self.session.buy(
+                self._resolve(address), job.weights, job.request_id, job.unit
+            )
+        # The journal tracks the bought label from here on.
+        self.outbox.remove(job.id)
+        return bought
+
+    def _throttle(self):
+        """Wait for this purchase's turn under the configured rate."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + 1.0 / self.config.rate
+        time.sleep(start - now)
+
+    def _print(self, job: Job, bought: Bought):
+        try:
+            self.session.print_bought(bought, job.request_id)
+        except Exception as exc:  # pylint: disable=broad-except
+            # print_bought has asked for a refund.
+            self._note(f"Printing the queued label for {job.describe()} failed: {exc}")
+            return
+        with self._lock:
+            self._printed.extend([time.monotonic()] * len(bought))
@@ -1,3 +1,14 @@
 """Provides consolidated printing functionalities for the shippy application."""
 
-from .base import print_image, snapshot_printer_state
+from .base import (
+    configure,
+    flush_sheets,
+    load_backend,
+    print_image,
+    print_images,
+    print_raw,
+    printer_status,
+    sheet_buffer,
+    snapshot_printer_state,
+    use_backend,
+)
@@ -1,10 +1,193 @@
-"""Printing implementation for different systems."""
+"""Printing implementation for different systems.
 
+The platform backend is imported on first use rather than at import time: the
+Windows one pulls in pywin32, WMI and PIL, which a session pays for only once it
+actually prints.
+"""
+
+import importlib
+import socket
 import sys
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    from ..models import PrinterConfig
+    from .pool import PrinterPool
+    from .sheets import SheetBuffer
+
+_BACKEND: typing.Optional[str] = None
+_DEVICE: typing.Optional[str] = None
+_POOL_CONFIG: typing.Optional["PrinterConfig"] = None
+_POOL: typing.Optional["PrinterPool"] = None
+_SHEET_CONFIG: typing.Optional["PrinterConfig"] = None
+_SHEETS: typing.Optional["SheetBuffer"] = None
+
+# A printer takes one job at a time, whichever thread (e.g. a ``shippy serve``
+# client's) sends it.
+_PRINT_LOCK = threading.Lock()
+
+
+def use_backend(name: str):
+    """Select a backend by name; ``auto`` picks the one for this platform."""
+    global _BACKEND  # pylint: disable=global-statement
+    _BACKEND = None if name == "auto" else name
+
+
+def configure(config: "PrinterConfig"):
+    """Apply the ``[printer]`` config: the backend, any raw device, the pool."""
+    global _DEVICE, _POOL_CONFIG, _POOL  # pylint: disable=global-statement
+    global _SHEET_CONFIG, _SHEETS  # pylint: disable=global-statement
+    use_backend(config.backend)
+    _DEVICE = config.device
+    _POOL_CONFIG = config if config.pool else None
+    _POOL = None
+    flush_sheets()
+    _SHEET_CONFIG = config if config.sheet != "none" else None
+    _SHEETS = None
+
+
+def load_backend():
+    """Import and return the selected printing backend module."""
+    name = _BACKEND or ("windows" if sys.platform == "win32" else "linux")
+    return importlib.import_module(f".{name}", __package__)
+
+
+def _printer_pool(backend) -> typing.Optional["PrinterPool"]:
+    """Return the printer pool, creating it on first use, if one is configured."""
+    global _POOL  # pylint: disable=global-statement
+    if _POOL_CONFIG is None:
+        return None
+
+    with _PRINT_LOCK:
+        if _POOL is None:
+            if not hasattr(backend, "label_printers"):
+                raise RuntimeError(
+                    "A printer pool needs the Windows backend with pywin32."
+                )
+
+            from .pool import PrinterPool  # pylint: disable=import-outside-toplevel
+
+            _POOL = PrinterPool(
+                backend.label_printers,
+                strategy=_POOL_CONFIG.pool_strategy,
+                queue_depth=getattr(backend, "queue_depth", None),
+                ready=getattr(backend, "printer_ready", None),
+                cooldown=_POOL_CONFIG.pool_cooldown,
+            )
+        return _POOL
+
+
+def print_image(img):
+    """Print a label image with the selected backend, one job per printer."""
+    backend = load_backend()
+    pool = _printer_pool(backend)
+    if pool is not None:
+        return pool.run(lambda printer: backend.print_image(img, printer))
+    with _PRINT_LOCK:
+        return backend.print_image(img)
+
+
+def print_images(images: list):
+    """Print several label images back-to-back as one print job."""
+    backend = load_backend()
+    pool = _printer_pool(backend)
+    if pool is not None:
+        return pool.run(lambda printer: backend.print_images(images, printer))
+    with _PRINT_LOCK:
+        return backend.print_images(images)
+
+
+def sheet_buffer() -> typing.Optional["SheetBuffer"]:
+    """Return the buffer tiling labels on sheets, if sheets are configured."""
+    global _SHEETS  # pylint: disable=global-statement
+    if _SHEET_CONFIG is None:
+        return None
+
+    with _PRINT_LOCK:
+        if _SHEETS is None:
+            # pylint: disable-next=import-outside-toplevel
+            from .sheets import LAYOUTS, SheetBuffer, plan_layout
+
+            config = _SHEET_CONFIG
+            _SHEETS = SheetBuffer(
+                plan_layout(LAYOUTS[config.sheet], config.sheet_paper),
+                lambda page, dpi: _print_pages([page], dpi, config.sheet_printer),
+                timeout=config.sheet_timeout,
+            )
+        return _SHEETS
+
+
+def _print_pages(pages: list, dpi: float, printer: typing.Optional[str]):
+    backend = load_backend()
+    with _PRINT_LOCK:
+        return backend.print_pages(pages, dpi, printer)
+
+
+def flush_sheets():
+    """Print the labels waiting on a partly filled sheet, if any."""
+    if _SHEETS is not None:
+        _SHEETS.flush()
+
+
+def print_raw(data: bytes):
+    """Send printer-language bytes (e.g. a ZPL label) to the printer unchanged.
+
+    They go to the configured device if there is one, else to the backend's
+    printer (a RAW spooler job on Windows).
+    """
+    if _DEVICE is not None and _BACKEND != "null":
+        with _PRINT_LOCK:
+            return send_to_device(_DEVICE, data)
+
+    backend = load_backend()
+    pool = _printer_pool(backend)
+    if pool is not None:
+        return pool.run(lambda printer: backend.print_raw(data, printer))
+    with _PRINT_LOCK:
+        return backend.print_raw(data)
+
+
+def send_to_device(device: str, data: bytes, timeout: float = 10.0):
+    """Write bytes to a device path or a ``tcp:HOST:PORT`` printer port."""
+    try:
+        scheme, _, address = device.partition(":")
+        if scheme == "tcp":
+            host, _, port = address.rpartition(":")
+            with socket.create_connection((host, int(port)), timeout) as connection:
+                connection.sendall(data)
+        else:
+            with open(device, "wb") as handle:
+                handle.write(data)
+    except (OSError, ValueError) as exc:
+        raise RuntimeError(f"Could not send the label to {device} ({exc}).") from exc
+
+
+def printer_status() -> list[str]:
+    """Return what keeps labels from printing, e.g. ``["PAPER_OUT"]``.
+
+    This asks about the sheet printer when labels go on sheets, and about every
+    printer of a pool, which is ready while one of its printers is. Empty when
+    labels can print, or when there is no spooler to ask (a raw device, a
+    backend without the query).
+    """
+    backend = load_backend()
+    status = getattr(backend, "printer_status", None)
+    if status is None or (_DEVICE is not None and _BACKEND != "null"):
+        return []
+    if _SHEET_CONFIG is not None:
+        return status(_SHEET_CONFIG.sheet_printer, sheet=True)
+    pool = _printer_pool(backend)
+    if pool is not None:
+        problems = [status(name) for name in pool.printers()]
+        if not problems:
+            return ["NOT_AVAILABLE"]
+        if all(problems):
+            return list(dict.fromkeys(sum(problems, [])))
+        return []
+    return status()
+
 
-if sys.platform == "win32":
-    from .windows import print_image  # pylint: disable=unused-import
-    from .windows import snapshot_printer_state  # pylint: disable=unused-import
-else:
-    from .linux import print_image  # pylint: disable=unused-import
-    from .linux import snapshot_printer_state  # pylint: disable=unused-import
+def snapshot_printer_state():
+    """Return the selected backend's printer diagnostics report."""
+    return load_backend().snapshot_printer_state()
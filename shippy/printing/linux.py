@@ -4,14 +4,98 @@ import subprocess
 
 from ..misc import build_tempfile
 
+# CUPS printer-state-reasons keeping a queue from printing, by the names the
+# Windows spooler's status bits have.
+_CUPS_REASONS = {
+    "media-empty": "PAPER_OUT",
+    "media-needed": "PAPER_OUT",
+    "media-jam": "PAPER_JAM",
+    "door-open": "DOOR_OPEN",
+    "offline": "OFFLINE",
+    "paused": "PAUSED",
+    "shutdown": "NOT_AVAILABLE",
+}
 
-def print_image(img):
+
+def print_image(img, printer=None):  # pylint: disable=unused-argument
     """Show an image using `xdg-open`."""
     with build_tempfile(suffix=".png") as tmpfile:
         img.save(tmpfile.name)
         subprocess.check_call(["xdg-open", tmpfile.name])
 
 
+def print_images(images, printer=None):
+    """Show each image using `xdg-open`."""
+    for img in images:
+        print_image(img, printer)
+
+
+def print_pages(pages, dpi, printer=None):
+    """Print full-page images at their physical size.
+
+    The pages go out as one PDF at their own resolution, so a PDF viewer or
+    the CUPS queue named by ``printer`` (through ``lp``) prints each at true
+    size; without a printer the PDF is opened with `xdg-open`.
+    """
+    with build_tempfile(suffix=".pdf") as tmpfile:
+        pages[0].save(
+            tmpfile.name, save_all=True, append_images=pages[1:], resolution=dpi
+        )
+        if printer:
+            subprocess.check_call(
+                ["lp", "-d", printer, "-o", "fit-to-page=false", tmpfile.name]
+            )
+        else:
+            subprocess.check_call(["xdg-open", tmpfile.name])
+
+
+def print_raw(data, printer=None):  # pylint: disable=unused-argument
+    """There is no spooled label printer to send raw bytes to."""
+    raise RuntimeError(
+        "Set 'device' in the [printer] section (e.g. /dev/usb/lp0 or "
+        "tcp:HOST:9100) to print ZPL labels on this system."
+    )
+
+
+def parse_lpstat(text: str) -> list[str]:
+    """Return what keeps a queue from printing, from its ``lpstat -l -p`` output."""
+    problems = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("printer ") and " disabled " in line:
+            problems.append("PAUSED")
+        elif line.startswith("Alerts:"):
+            for reason in line.removeprefix("Alerts:").split():
+                if reason.endswith("-warning"):
+                    continue
+                reason = reason.removesuffix("-error").removesuffix("-report")
+                if reason in _CUPS_REASONS:
+                    problems.append(_CUPS_REASONS[reason])
+    return list(dict.fromkeys(problems))
+
+
+def printer_status(printer=None, sheet=False):
+    """Return what keeps a CUPS queue from printing, e.g. ``["PAPER_OUT"]``.
+
+    Only sheets go through a queue (``printer``, or the CUPS default); labels
+    open in an image viewer, which is always ready.
+    """
+    if not sheet:
+        return []
+
+    def lpstat(*args):
+        return subprocess.run(
+            ["lpstat", *args], capture_output=True, text=True, check=True, timeout=5
+        ).stdout
+
+    if printer is None:
+        default = lpstat("-d")
+        if ":" not in default:
+            return ["NOT_AVAILABLE"]  # No system default destination.
+        printer = default.split(":", 1)[1].strip()
+    return parse_lpstat(lpstat("-l", "-p", printer))
+
+
 def snapshot_printer_state():
     """The USB label-printer detection path only runs on Windows."""
     return (
@@ -0,0 +1,37 @@
+"""Printing that discards labels, for benchmarks and dry runs."""
+
+
+def print_image(img, printer=None):  # pylint: disable=unused-argument
+    """Decode the label as a real print would, then drop it."""
+    img.load()
+
+
+def print_images(images, printer=None):  # pylint: disable=unused-argument
+    """Decode the labels as a real print would, then drop them."""
+    for img in images:
+        img.load()
+
+
+def print_pages(pages, dpi, printer=None):  # pylint: disable=unused-argument
+    """Render the sheets as a real print would, then drop them."""
+    for page in pages:
+        page.load()
+
+
+def print_raw(data, printer=None):  # pylint: disable=unused-argument
+    """Drop printer-language bytes."""
+
+
+def printer_status(printer=None, sheet=False):  # pylint: disable=unused-argument
+    """The discarding printer is always ready."""
+    return []
+
+
+def label_printers():
+    """One printer, for trying out the printer pool."""
+    return ["null"]
+
+
+def snapshot_printer_state():
+    """There is no printer to diagnose."""
+    return "The null printer backend is selected; labels are discarded."
@@ -0,0 +1,281 @@
+"""Spread labels over several connected label printers.
+
+A :class:`PrinterPool` picks a printer for each job, round-robin or by the
+fewest jobs queued (ours in progress plus the spooler's), and runs the job
+while holding that printer, so two printers print two labels at once. A printer
+that fails is ejected; the ejected printer gets another chance after a cooldown
+that doubles with every failure, once the backend reports it ready again. The
+job is retried on another printer only if it failed before reaching the
+spooler (:class:`NotSpooled`): a job the spooler took may have printed, and
+printing it again would put out a second label for the same postage.
+
+The pool only deals in printer names and callables, so it runs the same with
+the Windows spooler as with the fake printers of :func:`demo`.
+"""
+
+import itertools
+import random
+import sys
+import threading
+import time
+import typing
+
+T = typing.TypeVar("T")
+
+STRATEGIES = ("round-robin", "least-busy")
+
+# How long the printer list is trusted before looking for plugged/unplugged ones.
+_REDISCOVER = 30.0
+# How soon to look again when the printers could not be listed.
+_DISCOVERY_RETRY = 2.0
+
+
+class NotSpooled(RuntimeError):
+    """A print job failed before the spooler had any of it."""
+
+
+class _Member:  # pylint: disable=too-few-public-methods
+    """One printer in the pool."""
+
+    __slots__ = ("name", "lock", "busy", "failures", "ejected_until")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.busy = 0  # Our jobs waiting for or printing on this printer.
+        self.failures = 0
+        self.ejected_until = 0.0
+
+
+class PrinterPool:  # pylint: disable=too-many-instance-attributes
+    """Load-balance print jobs over printers, ejecting the failing ones."""
+
+    strategy: str
+    cooldown: float
+
+    def __init__(
+        self,
+        discover: typing.Callable[[], list[str]],
+        strategy: str = "least-busy",
+        queue_depth: typing.Optional[typing.Callable[[str], int]] = None,
+        ready: typing.Optional[typing.Callable[[str], bool]] = None,
+        cooldown: float = 60.0,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown pool strategy {strategy!r}")
+        self.strategy = strategy
+        self.cooldown = float(cooldown)
+        self._discover = discover
+        self._queue_depth = queue_depth
+        self._ready = ready
+        self._members: dict[str, _Member] = {}
+        self._turn = itertools.count()
+        self._discovered = -_REDISCOVER
+        # Held while listing printers; self._lock is not, so jobs finish meanwhile.
+        self._discovering = threading.Lock()
+        self._lock = threading.Lock()
+
+    def run(self, job: typing.Callable[[str], T]) -> T:
+        """Run ``job(printer_name)`` on a printer.
+
+        A job that raises :class:`NotSpooled` is tried on another printer; any
+        other failure is raised, as the label may have printed.
+        """
+        tried: set[str] = set()
+        while True:
+            member = self._pick(tried)
+            tried.add(member.name)
+            try:
+                with member.lock:
+                    result = job(member.name)
+            except NotSpooled:
+                self._release(member, failed=True)
+                if not self._available(tried):
+                    raise
+                continue
+            except Exception:
+                self._release(member, failed=True)
+                raise
+            self._release(member, failed=False)
+            return result
+
+    def printers(self) -> list[str]:
+        """Return the pooled printers' names, looking for new ones if due."""
+        self._rediscover()
+        with self._lock:
+            return list(self._members)
+
+    def status(self) -> list[tuple[str, int, bool]]:
+        """Return ``(name, busy, ejected)`` for every printer."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (member.name, member.busy, member.ejected_until > now)
+                for member in self._members.values()
+            ]
+
+    def _pick(self, tried: set[str]) -> _Member:
+        """Choose and reserve a printer not tried yet for this job."""
+        self._rediscover()
+        candidates = self._candidates(tried)
+        # Spooler round trips, made before taking the lock.
+        queued = {}
+        if self.strategy == "least-busy":
+            queued = {member.name: self._queued(member) for member in candidates}
+
+        with self._lock:
+            if not candidates:
+                raise RuntimeError(
+                    f"No label printer available: {len(self._members)} in the "
+                    "pool, all failed recently."
+                    if self._members
+                    else "No label printer found plugged in."
+                )
+
+            # Ties (and round-robin) go to the next printer in turn.
+            turn = next(self._turn) % len(candidates)
+            order = candidates[turn:] + candidates[:turn]
+            if self.strategy == "round-robin":
+                member = order[0]
+            else:
+                # Our own jobs already in the spooler are counted there too;
+                # the larger of the two is a fair estimate either way.
+                member = min(
+                    order, key=lambda other: max(other.busy, queued[other.name])
+                )
+            member.busy += 1
+            return member
+
+    def _candidates(self, tried: set[str]) -> list[_Member]:
+        """Return the untried printers that are not ejected (or due a retry).
+
+        A printer due a retry after failing must also be reported ready, if the
+        backend can tell; being reported ready does not cut its cooldown short.
+        The backend is asked without holding the lock.
+        """
+        now = time.monotonic()
+        with self._lock:
+            members = [
+                member
+                for member in self._members.values()
+                if member.name not in tried and member.ejected_until <= now
+            ]
+        return [
+            member
+            for member in members
+            if not (
+                member.failures
+                and self._ready is not None
+                and self._safely(self._ready, member.name) is False
+            )
+        ]
+
+    def _available(self, tried: set[str]) -> bool:
+        return bool(self._candidates(tried))
+
+    def _queued(self, member: _Member) -> int:
+        """Jobs the spooler holds for a printer, 0 if it cannot tell."""
+        if self._queue_depth is None:
+            return 0
+        return int(self._safely(self._queue_depth, member.name) or 0)
+
+    def _release(self, member: _Member, failed: bool):
+        with self._lock:
+            member.busy -= 1
+            if failed:
+                member.failures += 1
+                backoff = self.cooldown * 2 ** min(member.failures - 1, 5)
+                member.ejected_until = time.monotonic() + backoff
+            else:
+                member.failures = 0
+                member.ejected_until = 0.0
+
+    def _rediscover(self):
+        """Add newly connected printers and drop ones that went away, if due.
+
+        Jobs go on with the printers already known while another thread lists
+        them, unless none are known yet. If listing fails, the printers are
+        kept and listed again soon: a failed query is not an empty list.
+        """
+        with self._lock:
+            if time.monotonic() - self._discovered < _REDISCOVER:
+                return
+            known = bool(self._members)
+        # pylint: disable-next=consider-using-with
+        if not self._discovering.acquire(blocking=not known):
+            return
+        try:
+            with self._lock:
+                if time.monotonic() - self._discovered < _REDISCOVER:
+                    return  # Listed by another thread meanwhile.
+            names = self._safely(self._discover, None)
+            with self._lock:
+                now = time.monotonic()
+                if names is None:
+                    self._discovered = now - _REDISCOVER + _DISCOVERY_RETRY
+                    return
+                self._discovered = now
+                for name in names:
+                    self._members.setdefault(name, _Member(name))
+                for name in set(self._members) - set(names):
+                    if not self._members[name].busy:
+                        del self._members[name]
+        finally:
+            self._discovering.release()
+
+    @staticmethod
+    def _safely(func, name):
+        """Call a backend query; a failing query counts as "no answer"."""
+        try:
+            return func() if name is None else func(name)
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+
+class FakePrinter:  # pylint: disable=too-few-public-methods
+    """A printer taking ``seconds`` per label, its queue failing at ``error_rate``."""
+
+    def __init__(self, seconds: float = 0.1, error_rate: float = 0.0, seed=None):
+        self.seconds = seconds
+        self.error_rate = error_rate
+        self.printed = 0
+        self._random = random.Random(seed)
+
+    def print_label(self, _label):
+        """Print one label, or raise like a jammed printer."""
+        time.sleep(self.seconds)
+        if self._random.random() < self.error_rate:
+            raise NotSpooled("printer queue offline")
+        self.printed += 1
+
+
+def demo():
+    """Print labels from several threads through a pool of fake printers."""
+    printers = {
+        "Desk 1 Q529E65K5250028": FakePrinter(0.05, seed=1),
+        "Desk 2 Q529E65K5250031": FakePrinter(0.10, seed=2),
+        "Desk 3 Q529E65K5250047": FakePrinter(0.05, error_rate=0.3, seed=3),
+    }
+    strategy = sys.argv[1] if len(sys.argv) > 1 else "least-busy"
+    pool = PrinterPool(lambda: list(printers), strategy=strategy, cooldown=0.5)
+
+    failed = []
+
+    def client(count):
+        for label in range(count):
+            try:
+                pool.run(lambda name, label=label: printers[name].print_label(label))
+            except RuntimeError as exc:
+                failed.append(exc)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(20,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{strategy}: 80 labels in {time.monotonic() - started:.2f} s")
+    for name, printer in printers.items():
+        print(f"  {name}: {printer.printed} printed")
+    print(f"  not printed: {len(failed)}")
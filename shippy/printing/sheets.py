@@ -0,0 +1,264 @@
+"""Several 4x6 labels per sheet of office paper, with cut guides.
+
+When the thermal printer is down, labels can go to an office laser printer
+instead. Printed one per page, each label is scaled to fit the page; a
+:class:`SheetBuffer` instead collects labels on a page at their physical size,
+2-up or 4-up, and prints the page once it is full, once no label has been added
+for a while, or when the session ends. That halves or quarters the pages, print
+time and toner per label.
+
+Labels are pasted 1:1 at their own resolution (EasyPost PNG labels are 4x6
+inches at 300 dpi), so the backend only has to print the page at its physical
+size for the barcodes to come out at theirs.
+"""
+
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    from PIL import Image
+
+LAYOUTS = {"2-up": 2, "4-up": 4}
+
+PAPERS = {"letter": (8.5, 11.0), "legal": (8.5, 14.0), "a4": (8.27, 11.69)}
+
+LABEL_INCHES = (4.0, 6.0)
+
+# Office printers cannot print this close to the edge of the paper.
+MARGIN = 0.25
+# Space between labels, if the paper has room for it, so each is cut on its own.
+GUTTER = 0.25
+
+
+class SheetLayout(typing.NamedTuple):
+    """Where labels go on a sheet, in inches from its top left corner."""
+
+    paper: tuple[float, float]
+    label: tuple[float, float]  # As placed: (6, 4) for labels turned sideways.
+    slots: tuple[tuple[float, float], ...]
+
+    @property
+    def rotated(self) -> bool:
+        """Whether labels are turned sideways on the sheet."""
+        return self.label[0] > self.label[1]
+
+
+def _best_grid(
+    per_sheet: int, usable_w: float, usable_h: float
+) -> typing.Optional[tuple[tuple[float, float], int, int]]:
+    """Return the label orientation, columns and rows leaving the most room."""
+    grids = [
+        (
+            min(usable_w - columns * width, usable_h - per_sheet // columns * height),
+            (width, height),
+            columns,
+            per_sheet // columns,
+        )
+        for width, height in (LABEL_INCHES, LABEL_INCHES[::-1])
+        for columns in range(1, per_sheet + 1)
+        if per_sheet % columns == 0
+    ]
+    fitting = [grid for grid in grids if grid[0] >= 0]
+    if not fitting:
+        return None
+    _, label, columns, rows = max(fitting)
+    return label, columns, rows
+
+
+def _offsets(paper: float, count: int, size: float) -> list[float]:
+    """Return where each of ``count`` labels starts along one side of the paper.
+
+    The labels are centred, with a gutter between them if there is room.
+    """
+    spare = paper - 2 * MARGIN - count * size
+    gutter = min(GUTTER, spare / max(count - 1, 1))
+    start = (paper - count * size - (count - 1) * gutter) / 2
+    return [start + number * (size + gutter) for number in range(count)]
+
+
+def plan_layout(per_sheet: int, paper: str = "letter") -> SheetLayout:
+    """Place ``per_sheet`` 4x6 labels on a sheet at their physical size.
+
+    Of the grids that fit inside the printable area, the one leaving the most
+    room around the labels wins. Raises :class:`ValueError` if none fits, e.g.
+    4-up on letter paper, which takes legal paper at full size.
+    """
+    paper_w, paper_h = PAPERS[paper]
+    grid = _best_grid(per_sheet, paper_w - 2 * MARGIN, paper_h - 2 * MARGIN)
+    if grid is None:
+        raise ValueError(
+            f"{per_sheet} labels of {LABEL_INCHES[0]:g}x{LABEL_INCHES[1]:g} "
+            f"inches do not fit on {paper} paper at full size"
+            + ("; use legal paper for 4-up" if paper != "legal" else "")
+        )
+
+    (label_w, label_h), columns, rows = grid
+    slots = tuple(
+        (left, top)
+        for top in _offsets(paper_h, rows, label_h)
+        for left in _offsets(paper_w, columns, label_w)
+    )
+    return SheetLayout((paper_w, paper_h), (label_w, label_h), slots)
+
+
+def _draw_cut_guide(draw, box: tuple[int, int, int, int], dpi: float):
+    """Draw a dashed outline just outside a label, where it is cut."""
+    left, top, right, bottom = box[0] - 2, box[1] - 2, box[2] + 1, box[3] + 1
+    dash, gap = round(dpi / 8), round(dpi / 12)
+    for start in range(left, right, dash + gap):
+        end = min(start + dash, right)
+        draw.line((start, top, end, top), fill=96)
+        draw.line((start, bottom, end, bottom), fill=96)
+    for start in range(top, bottom, dash + gap):
+        end = min(start + dash, bottom)
+        draw.line((left, start, left, end), fill=96)
+        draw.line((right, start, right, end), fill=96)
+
+
+class SheetBuffer:  # pylint: disable=too-many-instance-attributes
+    """Collect labels on a page and print it when full, idle, or flushed.
+
+    ``print_page(page, dpi)`` prints a page image at its physical size. Each
+    label comes with a ``done(error)`` callback, called once its page printed
+    (``error`` is None) or failed to. The page image is allocated once and
+    reused from one sheet to the next.
+    """
+
+    def __init__(
+        self,
+        layout: SheetLayout,
+        print_page: typing.Callable[["Image.Image", float], None],
+        timeout: float = 60.0,
+    ):
+        self.layout = layout
+        self.timeout = float(timeout)
+        self._print_page = print_page
+        self._page: typing.Optional["Image.Image"] = None
+        self._dpi = 0.0
+        self._pending: list[typing.Callable[[typing.Optional[Exception]], None]] = []
+        self._timer: typing.Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+    def add(
+        self,
+        label: "Image.Image",
+        done: typing.Callable[[typing.Optional[Exception]], None],
+    ):
+        """Put a label on the page, printing the page if that filled it.
+
+        The label image can be reused as soon as this returns.
+        """
+        with self._lock:
+            self._cancel_timer()
+            dpi = max(label.size) / max(LABEL_INCHES)
+            if self._pending and dpi != self._dpi:
+                self._flush()  # A label at another resolution starts a new page.
+            if not self._pending:
+                self._new_page(dpi)
+            self._place(label, len(self._pending))
+            self._pending.append(done)
+
+            if len(self._pending) == len(self.layout.slots):
+                self._flush()
+            else:
+                self._timer = threading.Timer(self.timeout, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def pending(self) -> int:
+        """Return how many labels are waiting for their page to fill."""
+        return len(self._pending)
+
+    def flush(self):
+        """Print a partly filled page now."""
+        with self._lock:
+            self._cancel_timer()
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        error: typing.Optional[Exception] = None
+        try:
+            self._print_page(self._page, self._dpi)
+        except Exception as exc:  # pylint: disable=broad-except
+            error = exc
+        for done in pending:
+            done(error)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _new_page(self, dpi: float):
+        """Clear the page, drawing the cut guides around every slot."""
+        # pylint: disable-next=import-outside-toplevel
+        from PIL import Image, ImageDraw
+
+        paper_w, paper_h = self.layout.paper
+        size = (round(paper_w * dpi), round(paper_h * dpi))
+        if self._page is None or self._page.size != size:
+            self._page = Image.new("L", size, 255)
+        else:
+            self._page.paste(255, (0, 0, *size))
+        self._dpi = dpi
+
+        draw = ImageDraw.Draw(self._page)
+        for slot in range(len(self.layout.slots)):
+            _draw_cut_guide(draw, self._box(slot), dpi)
+
+    def _box(self, slot: int) -> tuple[int, int, int, int]:
+        """Return a slot's pixel box on the page."""
+        x, y = self.layout.slots[slot]
+        width, height = self.layout.label
+        left, top = round(x * self._dpi), round(y * self._dpi)
+        return (
+            left,
+            top,
+            left + round(width * self._dpi),
+            top + round(height * self._dpi),
+        )
+
+    def _place(self, label: "Image.Image", slot: int):
+        """Paste a label into a slot at 1:1, turned to match the layout."""
+        # pylint: disable-next=import-outside-toplevel
+        from PIL import Image
+
+        assert self._page is not None
+        sideways = label.size[0] > label.size[1]
+        if sideways != self.layout.rotated:
+            label = label.transpose(Image.Transpose.ROTATE_90)
+        left, top, right, bottom = self._box(slot)
+        if label.size != (right - left, bottom - top):
+            label = label.resize((right - left, bottom - top))
+        self._page.paste(label, (left, top))
+
+
+def _demo_sheets(name: str, paper: str) -> list[str]:
+    """Tile one sheet and a label more, saving each page; return the files."""
+    # pylint: disable-next=import-outside-toplevel
+    from PIL import Image, ImageDraw
+
+    pages: list[str] = []
+
+    def save(page, dpi):
+        pages.append(f"sheet-{name}-{len(pages) + 1}.png")
+        page.save(pages[-1], dpi=(dpi, dpi))
+
+    sheets = SheetBuffer(plan_layout(LAYOUTS[name], paper), save)
+    for number in range(LAYOUTS[name] + 1):
+        label = Image.new("L", (1200, 1800), 255)
+        draw = ImageDraw.Draw(label)
+        draw.rectangle((20, 20, 1179, 1779), outline=0, width=6)
+        draw.text((100, 100), f"LABEL {number + 1}", fill=0)
+        sheets.add(label, lambda error: None)
+    sheets.flush()
+    return pages
+
+
+def demo():
+    """Tile some fake labels 2-up and 4-up and save the pages as PNG files."""
+    for name, paper in (("2-up", "letter"), ("4-up", "legal")):
+        print(f"{name} on {paper}: {', '.join(_demo_sheets(name, paper))}")
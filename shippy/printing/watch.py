@@ -0,0 +1,193 @@
+"""Know the label printer is ready before postage is bought.
+
+A printer out of paper, offline or paused used to show only once the label was
+bought and failed to print, which cost a refund and a wasted purchase. A
+:class:`PrinterWatch` asks the spooler for the printer's status every
+``interval`` seconds in a background thread and keeps the answer, so the label
+loop can check it before buying without waiting on the spooler. A printer found
+not ready is asked about every half second until it is ready again, so one
+fixed since is not refused for long.
+
+The watch only deals in a status callable, so it runs the same with the
+Windows spooler, CUPS, or the :class:`FakeSpooler` of :func:`demo`.
+"""
+
+import threading
+import time
+import typing
+
+# Failed status queries in a row after which the watch is reported as broken.
+_FAILING = 3
+# Seconds between samples while the printer is not ready.
+_NOT_READY_INTERVAL = 0.5
+
+
+class PrinterNotReady(RuntimeError):
+    """The label printer cannot print, and nothing was bought."""
+
+
+class PrinterWatch:  # pylint: disable=too-many-instance-attributes
+    """The label printer's last known status, sampled in a background thread."""
+
+    interval: float
+    # What kept the printer from printing at the last sample (empty when
+    # ready), or None if the spooler could not be asked.
+    problems: typing.Optional[list[str]]
+    error: typing.Optional[str]  # Why the spooler could not be asked.
+    not_ready_since: typing.Optional[float]  # Wall-clock time.
+    samples: int
+    failures: int  # Status queries failed in a row.
+
+    def __init__(self, status: typing.Callable[[], list[str]], interval: float = 2.0):
+        self.interval = float(interval)
+        self.problems = None
+        self.error = None
+        self.not_ready_since = None
+        self.samples = 0
+        self.failures = 0
+        self._status = status
+        self._lock = threading.Lock()
+        self._sampled = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # Sample now instead of after the interval.
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        """Sample the printer's status in the background."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="shippy-printer-watch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def sample(self) -> typing.Optional[list[str]]:
+        """Ask the spooler now; return the problems, or None if it cannot tell."""
+        try:
+            problems: typing.Optional[list[str]] = list(self._status())
+            error = None
+        except Exception as exc:  # pylint: disable=broad-except
+            problems, error = None, str(exc) or type(exc).__name__
+
+        with self._lock:
+            self.samples += 1
+            self.failures = 0 if error is None else self.failures + 1
+            self.problems, self.error = problems, error
+            if not problems:
+                self.not_ready_since = None
+            elif self.not_ready_since is None:
+                self.not_ready_since = time.time()
+            self._sampled.notify_all()
+        return problems
+
+    def refresh(self, timeout: float = 5.0) -> bool:
+        """Sample now, waiting up to ``timeout``; return whether it is ready.
+
+        For when the operator says the printer is fixed; without the thread
+        running, the spooler is asked here.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.sample()
+            return self.ready()
+        with self._sampled:
+            samples = self.samples
+            self._wake.set()
+            self._sampled.wait_for(lambda: self.samples > samples, timeout)
+        return self.ready()
+
+    def ready(self) -> bool:
+        """Return whether the last sample found the printer ready.
+
+        A printer the spooler could not be asked about counts as ready: the
+        label is bought and printed as it was before there was a watch.
+        """
+        return not self.problems
+
+    def failing(self) -> bool:
+        """Return whether the spooler could not be asked at every recent sample.
+
+        That is every sample so far, or the last few in a row: the watch is
+        then no gate at all, and labels are bought without knowing the
+        printer's state, which the operator must be told.
+        """
+        with self._lock:
+            return self.failures > 0 and self.failures >= min(self.samples, _FAILING)
+
+    def check(self):
+        """Raise :class:`PrinterNotReady` if the last sample found a problem.
+
+        This never waits on the spooler; the background thread samples more
+        often while the printer is not ready.
+        """
+        problems = self.problems
+        if problems:
+            raise PrinterNotReady(f"Label printer not ready ({', '.join(problems)})")
+
+    def describe(self) -> str:
+        """Return the printer's status line for the prompt."""
+        with self._lock:
+            problems, error, since = self.problems, self.error, self.not_ready_since
+        if problems is None:
+            return "Printer: ..." if error is None else f"Printer: unknown ({error})"
+        if not problems:
+            return "Printer: ready"
+        since_text = time.strftime("%H:%M", time.localtime(since))
+        return f"Printer: {', '.join(problems)} since {since_text}"
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            interval = self.interval
+            if not self.ready():
+                interval = min(interval, _NOT_READY_INTERVAL)
+            self._wake.wait(interval)
+            self._wake.clear()
+
+
+class FakeSpooler:  # pylint: disable=too-few-public-methods
+    """A print queue whose problems are set by hand, e.g. ``["PAPER_OUT"]``."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay  # Seconds each status query takes.
+        self.problems: list[str] = []
+        self.queries = 0
+
+    def status(self) -> list[str]:
+        """Answer a status query, as the spooler would."""
+        time.sleep(self.delay)
+        self.queries += 1
+        return list(self.problems)
+
+
+def demo():
+    """Check a fake printer before each of a run of labels while it runs out."""
+    spooler = FakeSpooler(delay=0.05)
+    watch = PrinterWatch(spooler.status, interval=0.2)
+    watch.start()
+    time.sleep(0.1)
+
+    for label in range(1, 9):
+        if label == 4:
+            spooler.problems = ["PAPER_OUT"]
+            time.sleep(0.3)
+        elif label == 6:
+            spooler.problems = []
+            watch.refresh()  # The operator says it is fixed.
+        started = time.monotonic()
+        try:
+            watch.check()
+            outcome = "buy"
+        except PrinterNotReady as exc:
+            outcome = f"refused: {exc}"
+        elapsed = 1000 * (time.monotonic() - started)
+        print(f"label {label}: {outcome} ({elapsed:.2f} ms)  [{watch.describe()}]")
+        time.sleep(0.05)
+
+    watch.stop()
+    print(f"{spooler.queries} status queries")
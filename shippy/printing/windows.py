@@ -1,14 +1,18 @@
 """Printing on win32 platform."""
 
 import contextlib
+import functools
 import os
 import re
 import subprocess
 import tempfile
+import time
 
 from ..misc import build_tempfile
+from .pool import NotSpooled
 
 try:
+    import pythoncom  # pylint: disable=import-error
     import win32print  # pylint: disable=import-error
     import win32ui  # pylint: disable=import-error
     import wmi  # type: ignore
@@ -69,6 +73,44 @@ if HAS_PYWIN32:
         0x00000200: "SHARED",
     }
 
+    # Status and attribute bits that keep a queue out of a printer pool.
+    _NOT_READY_STATUS = (
+        0x00000001  # PAUSED
+        | 0x00000002  # ERROR
+        | 0x00000008  # PAPER_JAM
+        | 0x00000010  # PAPER_OUT
+        | 0x00000040  # PAPER_PROBLEM
+        | 0x00000080  # OFFLINE
+        | 0x00001000  # NOT_AVAILABLE
+        | 0x00400000  # DOOR_OPEN
+    )
+    _WORK_OFFLINE = 0x00000400
+
+    # The label queue whose status is watched, and when it was chosen.
+    _WATCHED: dict = {}
+    _RESELECT = 30.0
+
+    def _com_initialized(func):
+        """Run ``func`` with COM initialized on the calling thread.
+
+        WMI is COM, and COM must be initialized on every thread that uses it.
+        Importing pythoncom only initializes the importing thread, but labels
+        are also selected and printed from the outbox, daemon, pool, sheet and
+        printer-watch threads, where ``wmi.WMI()`` failed without this. The
+        calls nest, so wrapping a function the main thread calls too is
+        harmless.
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            pythoncom.CoInitialize()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                pythoncom.CoUninitialize()
+
+        return wrapper
+
     def _usb_query(name):
         """Return ``(like_pattern, serial)`` for a printer name, or None.
 
@@ -132,6 +174,7 @@ if HAS_PYWIN32:
         for printer_info in win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL):
             yield printer_info[2]
 
+    @_com_initialized
     def get_connected_label_printers():
         """Return connected label printers as ``(name, is_serial, device_keys)``.
 
@@ -207,6 +250,7 @@ if HAS_PYWIN32:
 
         return lines
 
+    @_com_initialized
     def _snapshot_print_queues():
         """Return report lines describing every local print queue and its gate results."""
         lines = [
@@ -246,6 +290,7 @@ if HAS_PYWIN32:
 
         return lines
 
+    @_com_initialized
     def _snapshot_usb_devices():
         """Return report lines listing all USB PnP entities (the DYMO's ground truth)."""
         lines = ["-- USB devices (Win32_PnPEntity LIKE 'USB%') --"]
@@ -444,14 +489,143 @@ if HAS_PYWIN32:
                 f"({len(devices)} devices: "
                 f"{', '.join(_describe_device(d) for d in sorted(devices))}); "
                 f"shippy cannot choose between them — connect only one printer "
-                f"at a time. Matching queues: {', '.join(queues)}."
-                + _diagnostics_hint()
+                f"at a time, or set 'pool = true' under [printer] to use them "
+                f"all. Matching queues: {', '.join(queues)}." + _diagnostics_hint()
             )
 
         return detail
 
-    def print_image(img):  # pylint: disable=too-many-locals
-        """Print a given image.
+    def label_printers():
+        """Return one serial-named queue per connected label printer.
+
+        This is the printer pool's view: each physical printer is printed to
+        through its own queue, so a legacy VID:PID queue, which cannot tell
+        same-model units apart, is left out.
+        """
+        chosen = {}
+        for name, is_serial, keys in get_connected_label_printers():
+            if is_serial and len(keys) == 1:
+                chosen.setdefault(next(iter(keys)), name)
+        return sorted(chosen.values())
+
+    def _printer_info(printer):
+        """Return the spooler's ``PRINTER_INFO_2`` dict for a queue."""
+        handle = win32print.OpenPrinter(printer)
+        try:
+            return win32print.GetPrinter(handle, 2)
+        finally:
+            win32print.ClosePrinter(handle)
+
+    def queue_depth(printer):
+        """Return how many jobs are waiting in a queue."""
+        return _printer_info(printer)["cJobs"]
+
+    def _watched_label_printer():
+        """Return the label printer's queue, chosen again every ``_RESELECT`` s.
+
+        Choosing it queries WMI, too much to repeat for every status sample.
+        """
+        now = time.monotonic()
+        if now - _WATCHED.get("at", -_RESELECT) >= _RESELECT:
+            _WATCHED.update(name=_select_printer(), at=now)
+        return _WATCHED["name"]
+
+    def printer_status(printer=None, sheet=False):
+        """Return what keeps a queue from printing, e.g. ``["PAPER_OUT"]``.
+
+        ``printer`` defaults to the label printer, or to the Windows default
+        printer for a ``sheet`` of labels. Empty when the queue is ready.
+        """
+        if printer is None:
+            if sheet:
+                printer = win32print.GetDefaultPrinter()
+            else:
+                printer = _watched_label_printer()
+        info = _printer_info(printer)
+        problems = [
+            name
+            for bit, name in _PRINTER_STATUS_BITS.items()
+            if info["Status"] & _NOT_READY_STATUS & bit
+        ]
+        if info["Attributes"] & _WORK_OFFLINE:
+            problems.append("WORK_OFFLINE")
+        return problems
+
+    def printer_ready(printer):
+        """Return whether a queue is neither paused, offline nor in error."""
+        return not printer_status(printer)
+
+    @contextlib.contextmanager
+    def _printer_context(printer_name):
+        """Open a GDI device context on a printer queue."""
+        # Acquire before the try: if CreateDC itself fails there is no
+        # device context to release, and running the finally anyway raised
+        # UnboundLocalError, replacing the real error with a confusing one.
+        try:
+            context = win32ui.CreateDC()
+        except Exception as exc:  # pylint: disable=broad-except
+            raise NotSpooled(
+                f"Could not create a printer device context ({exc})."
+                + _diagnostics_hint()
+            ) from exc
+
+        try:
+            # Opening the queue is the failure selection cannot predict: a
+            # matching USB device can be present and working while the queue
+            # itself is paused, offline, or backed by a broken driver. That
+            # is the case the diagnostics log's status bits speak to, so
+            # give the operator the path to it rather than a raw GDI error.
+            try:
+                context.CreatePrinterDC(printer_name)
+            except Exception as exc:  # pylint: disable=broad-except
+                raise NotSpooled(
+                    f"Could not open printer queue {printer_name!r} ({exc})."
+                    + _diagnostics_hint()
+                ) from exc
+
+            yield context
+
+        finally:
+            context.DeleteDC()
+
+    @contextlib.contextmanager
+    def _print_job(context, name):
+        """Start the print job.
+
+        Each cleanup is guarded by its own acquisition: GDI rejects
+        EndPage without StartPage and EndDoc without StartDoc, so the
+        flat try/finally turned a StartDoc failure ("spooler
+        unavailable") into a misleading "EndPage without StartPage".
+        Until StartDoc succeeds the spooler has no job, so a printer pool may
+        try another printer.
+        """
+
+        try:
+            context.StartDoc(name)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise NotSpooled(f"Could not start a print job ({exc}).") from exc
+        try:
+            yield
+        finally:
+            context.EndDoc()
+
+    @contextlib.contextmanager
+    def _print_page(context):
+        """Start a page of the print job."""
+
+        context.StartPage()
+        try:
+            yield
+
+        finally:
+            context.EndPage()
+
+    def print_image(img, printer=None):
+        """Print a given image; see :func:`print_images`."""
+        print_images([img], printer)
+
+    def print_images(images, printer=None):  # pylint: disable=too-many-locals
+        """Print images back-to-back, one page each, as a single print job.
 
         A label printer is recognized by a trailing USB identifier in its Windows
         printer name, separated by a space, hyphen, or underscore:
@@ -466,44 +640,13 @@ if HAS_PYWIN32:
         printer collapse to one (a serial-named queue is preferred over a generic
         VID:PID one), so a stale/duplicate queue does not block printing. Only
         when two or more distinct printers are connected at once is the choice
-        genuinely ambiguous, and this raises rather than guess.
+        genuinely ambiguous, and this raises rather than guess, unless a
+        printer pool names the queue to use.
         """
 
-        printer = _select_printer()
+        printer = printer or _select_printer()
 
-        @contextlib.contextmanager
-        def create_printer_context(printer_name):
-            # Acquire before the try: if CreateDC itself fails there is no
-            # device context to release, and running the finally anyway raised
-            # UnboundLocalError, replacing the real error with a confusing one.
-            try:
-                context = win32ui.CreateDC()
-            except Exception as exc:  # pylint: disable=broad-except
-                raise RuntimeError(
-                    f"Could not create a printer device context ({exc})."
-                    + _diagnostics_hint()
-                ) from exc
-
-            try:
-                # Opening the queue is the failure selection cannot predict: a
-                # matching USB device can be present and working while the queue
-                # itself is paused, offline, or backed by a broken driver. That
-                # is the case the diagnostics log's status bits speak to, so
-                # give the operator the path to it rather than a raw GDI error.
-                try:
-                    context.CreatePrinterDC(printer_name)
-                except Exception as exc:  # pylint: disable=broad-except
-                    raise RuntimeError(
-                        f"Could not open printer queue {printer_name!r} ({exc})."
-                        + _diagnostics_hint()
-                    ) from exc
-
-                yield context
-
-            finally:
-                context.DeleteDC()
-
-        with create_printer_context(printer) as context:
+        with _printer_context(printer) as context:
 
             def get_printable_area():
                 """Get the printable area of a printer from its context."""
@@ -527,59 +670,128 @@ if HAS_PYWIN32:
 
                 return width, height
 
-            @contextlib.contextmanager
-            def create_job(name):
-                """Start the print job.
+            printable_w, printable_h = get_printable_area()
+            total_w, total_h = get_total_area()
 
-                Each cleanup is guarded by its own acquisition: GDI rejects
-                EndPage without StartPage and EndDoc without StartDoc, so the
-                flat try/finally turned a StartDoc failure ("spooler
-                unavailable") into a misleading "EndPage without StartPage".
-                """
+            # Start print job, draw each bitmap to its page at scaled size.
+            with _print_job(context, "postage_label"):
+                for img in images:
+                    if img.size[0] > img.size[1]:
+                        img = img.rotate(90)
 
-                context.StartDoc(name)
-                try:
-                    context.StartPage()
-                    try:
-                        yield
+                    ratios = [printable_w / img.size[0], printable_h / img.size[1]]
+                    backoff = 0.95  # Empirically added to avoid chopping the page.
+                    scale = backoff * min(ratios)
 
-                    finally:
-                        context.EndPage()
-                finally:
-                    context.EndDoc()
+                    with _print_page(context):
+                        dib = ImageWin.Dib(img)
 
-            if img.size[0] > img.size[1]:
-                img = img.rotate(90)
+                        scaled_w, scaled_h = [int(scale * i) for i in img.size]
+                        lhs_x = int((total_w - scaled_w) / 2)
+                        lhs_y = int((total_h - scaled_h) / 2)
 
-            printable_w, printable_h = get_printable_area()
-            ratios = [printable_w / img.size[0], printable_h / img.size[1]]
-            backoff = (
-                0.95  # Backoff error empirically added to avoid chopping the page.
+                        rhs_x = lhs_x + scaled_w
+                        rhs_y = lhs_y + scaled_h
+
+                        dib.draw(
+                            context.GetHandleOutput(), (lhs_x, lhs_y, rhs_x, rhs_y)
+                        )
+
+    def print_pages(pages, dpi, printer=None):
+        """Print full-page images at their physical size on an office printer.
+
+        ``dpi`` is the resolution of the images; each is drawn at the size it
+        has at that resolution, converted to the printer's own resolution and
+        shifted by the unprintable margin the page's origin is offset by, so
+        labels tiled on a sheet keep their barcodes at true size. ``printer``
+        defaults to the Windows default printer.
+        """
+        printer = printer or win32print.GetDefaultPrinter()
+
+        with _printer_context(printer) as context:
+            logpixelsx, logpixelsy = 88, 90
+            printer_dpi = (
+                context.GetDeviceCaps(logpixelsx),
+                context.GetDeviceCaps(logpixelsy),
+            )
+            physicaloffsetx, physicaloffsety = 112, 113
+            offset = (
+                context.GetDeviceCaps(physicaloffsetx),
+                context.GetDeviceCaps(physicaloffsety),
             )
-            scale = backoff * min(ratios)
 
-            # Start print job, draw the bitmap to printer at scaled size.
-            with create_job("postage_label"):
-                dib = ImageWin.Dib(img)
+            with _print_job(context, "postage_labels"):
+                for page in pages:
+                    width, height = (
+                        round(size * device / dpi)
+                        for size, device in zip(page.size, printer_dpi)
+                    )
+                    with _print_page(context):
+                        ImageWin.Dib(page).draw(
+                            context.GetHandleOutput(),
+                            (
+                                -offset[0],
+                                -offset[1],
+                                width - offset[0],
+                                height - offset[1],
+                            ),
+                        )
 
-                total_w, total_h = get_total_area()
-                scaled_w, scaled_h = [int(scale * i) for i in img.size]
-                lhs_x = int((total_w - scaled_w) / 2)
-                lhs_y = int((total_h - scaled_h) / 2)
+    def print_raw(data, printer=None):
+        """Send printer-language bytes (e.g. ZPL) to the label printer as-is.
 
-                rhs_x = lhs_x + scaled_w
-                rhs_y = lhs_y + scaled_h
+        This is a RAW spooler job: the driver does not render anything, so a
+        label is a few kilobytes instead of a full-page bitmap.
+        """
+        printer = printer or _select_printer()
+        try:
+            handle = win32print.OpenPrinter(printer)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise NotSpooled(
+                f"Could not open printer queue {printer!r} ({exc})."
+                + _diagnostics_hint()
+            ) from exc
 
-                dib.draw(context.GetHandleOutput(), (lhs_x, lhs_y, rhs_x, rhs_y))
+        try:
+            try:
+                win32print.StartDocPrinter(handle, 1, ("postage_label", None, "RAW"))
+            except Exception as exc:  # pylint: disable=broad-except
+                raise NotSpooled(f"Could not start a print job ({exc}).") from exc
+            try:
+                win32print.StartPagePrinter(handle)
+                try:
+                    win32print.WritePrinter(handle, data)
+                finally:
+                    win32print.EndPagePrinter(handle)
+            finally:
+                win32print.EndDocPrinter(handle)
+        finally:
+            win32print.ClosePrinter(handle)
 
 else:
 
-    def print_image(img):  # pylint: disable=unused-argument
+    def print_image(img, printer=None):  # pylint: disable=unused-argument
         """Show an image using `powershell`."""
         with build_tempfile(suffix=".png") as tmpfile:
             img.save(tmpfile.name)
             subprocess.check_call(["powershell", "-c", tmpfile.name])
 
+    def print_images(images, printer=None):
+        """Show each image using `powershell`."""
+        for img in images:
+            print_image(img, printer)
+
+    def print_pages(pages, dpi, printer=None):  # pylint: disable=unused-argument
+        """Show each page using `powershell`, to be printed at its size."""
+        for page in pages:
+            with build_tempfile(suffix=".pdf") as tmpfile:
+                page.save(tmpfile.name, resolution=dpi)
+                subprocess.check_call(["powershell", "-c", tmpfile.name])
+
+    def print_raw(data, printer=None):  # pylint: disable=unused-argument
+        """Raw printing goes through the spooler, which needs pywin32."""
+        raise RuntimeError("Printing ZPL labels on Windows requires pywin32.")
+
     def snapshot_printer_state():
         """Diagnostics are only meaningful with pywin32 installed."""
         return (
@@ -0,0 +1,182 @@
+"""Low-overhead sampling profiler for whole operator sessions.
+
+A background thread looks at every thread's Python stack ``rate`` times a
+second. Each sample of the main thread is put in one bucket by what it is
+blocked on, so "it's slow today" can be told apart into waiting on the
+operator, the network, image processing or the printer. On exit the samples of
+all threads are written as folded stacks, the input format of ``flamegraph.pl``
+and speedscope, next to a short text summary.
+
+Code objects are classified once and cached, so a sample is a walk of a few
+dozen frames and dict lookups. At the default 100 samples a second the session
+runs no slower, so it can be left on during a shift.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+import typing
+
+from .misc import data_dir
+
+# Buckets a stack falls into, by the first match in this order anywhere on the
+# stack: blocked on the operator beats everything, printing includes the image
+# conversion done for the printer, and so on. Input is only the prompt libraries
+# and the record, request and scale readers, which call nothing slow beneath;
+# not shippy's console module, whose address prompt geocodes over the network.
+CATEGORIES = (
+    (
+        "input",
+        (
+            "prompt_toolkit",
+            "questionary",
+            f"shippy{os.sep}stream.py",
+            f"shippy{os.sep}scale.py",
+            "socketserver.py",
+        ),
+    ),
+    ("printing", (f"shippy{os.sep}printing", "win32print", "win32ui")),
+    ("image", (f"PIL{os.sep}", f"shippy{os.sep}zpl.py")),
+    (
+        "network",
+        (
+            "socket.py",
+            "ssl.py",
+            f"http{os.sep}client.py",
+            f"urllib{os.sep}",
+            "urllib3",
+            f"requests{os.sep}",
+            f"easypost{os.sep}",
+            f"googlemaps{os.sep}",
+        ),
+    ),
+    (
+        "waiting",
+        ("threading.py", f"concurrent{os.sep}futures", f"shippy{os.sep}startup.py"),
+    ),
+)
+
+TOP_N = 15
+
+
+def default_prefix() -> str:
+    """Return a fresh output path prefix in the shippy data directory."""
+    directory = os.path.join(data_dir(), "profiles")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S"))
+
+
+class Profiler:  # pylint: disable=too-many-instance-attributes
+    """Sample every thread's stack from a background thread."""
+
+    rate: float
+
+    def __init__(self, rate: float = 100.0):
+        self.rate = rate
+        self.stacks: collections.Counter = collections.Counter()
+        self.categories: collections.Counter = collections.Counter()
+        self._frames: dict[typing.Any, tuple[str, int]] = {}
+        self._names: dict[typing.Optional[int], str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="shippy-profiler", daemon=True
+        )
+        self._started = 0.0
+        self.elapsed = 0.0
+
+    def start(self):
+        """Start sampling."""
+        self._started = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler to finish."""
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.monotonic() - self._started
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        own = threading.get_ident()
+        main = threading.main_thread().ident
+        while not self._stop.wait(interval):
+            # pylint: disable-next=protected-access
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(ident, frame, ident == main)
+
+    def _sample(self, ident: int, frame, is_main: bool):
+        """Record one thread's stack, outermost frame first."""
+        labels, rank = [], len(CATEGORIES)
+        while frame is not None:
+            label, frame_rank = self._label(frame.f_code)
+            labels.append(label)
+            rank = min(rank, frame_rank)
+            frame = frame.f_back
+        labels.reverse()
+
+        if ident not in self._names:
+            self._names.update(
+                (thread.ident, thread.name) for thread in threading.enumerate()
+            )
+        self.stacks[(self._names.get(ident, str(ident)), *labels)] += 1
+        if is_main:
+            category = CATEGORIES[rank][0] if rank < len(CATEGORIES) else "other"
+            self.categories[category] += 1
+
+    def _label(self, code) -> tuple[str, int]:
+        """Return a code object's ``module:function`` label and category rank.
+
+        Both are cached per code object, so a sample is mostly dict lookups.
+        """
+        try:
+            return self._frames[code]
+        except KeyError:
+            module = os.path.basename(code.co_filename).removesuffix(".py")
+            rank = next(
+                (
+                    index
+                    for index, (_, patterns) in enumerate(CATEGORIES)
+                    if any(pattern in code.co_filename for pattern in patterns)
+                ),
+                len(CATEGORIES),
+            )
+            self._frames[code] = (f"{module}:{code.co_name}", rank)
+            return self._frames[code]
+
+    def write_folded(self, path: str):
+        """Write the samples as folded stacks (``a;b;c count`` per line)."""
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{';'.join(stack)} {count}\n")
+
+    def summary(self, top: int = TOP_N) -> str:
+        """Return the main thread's time by category and the busiest functions."""
+        samples = sum(self.categories.values())
+        # Samples are slightly further apart than 1/rate; spread the real time.
+        per_sample = self.elapsed / max(samples, 1)
+        lines = [
+            f"{self.elapsed:.1f} s session, {samples} samples at {self.rate:g} Hz",
+            "",
+            "Main thread wall time:",
+        ]
+        for category, count in self.categories.most_common():
+            lines.append(
+                f"  {category:10s} {count * per_sample:8.1f} s "
+                f"{count / max(samples, 1):6.1%}"
+            )
+
+        # Where the main thread's samples landed; the folded stacks have callers.
+        main = threading.main_thread().name
+        leaves: collections.Counter = collections.Counter()
+        for stack, count in self.stacks.items():
+            if stack[0] == main:
+                leaves[stack[-1]] += count
+        lines += ["", f"Top {top} functions (main thread, self time):"]
+        for label, count in leaves.most_common(top):
+            lines.append(
+                f"  {count * per_sample:8.1f} s {count / max(samples, 1):6.1%}  {label}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,73 @@
+"""Local index of compound request IDs to request autoids."""
+
+import json
+import os
+import threading
+import typing
+
+from .misc import data_dir
+
+
+def compound_key(request_id: typing.Tuple[str, int, int]) -> str:
+    """Return the ``JURISDICTION-INMATE-INDEX`` key of a compound request ID."""
+    jurisdiction, inmate_id, index = request_id
+    return f"{jurisdiction.upper()}-{inmate_id:d}-{index:d}"
+
+
+class RequestIndex:
+    """Request autoids by compound request ID, as printed on request slips.
+
+    The index is refreshed in bulk with the day's packed requests, so scanning
+    a slip resolves without asking the server; any other request looked up on
+    the server is added as it goes. A request's autoid never changes, so
+    entries stay valid until the next refresh replaces them.
+    """
+
+    path: str
+    autoids: dict[str, int]
+
+    def __init__(self, path: str, autoids: dict[str, int]):
+        self.path = path
+        self.autoids = autoids
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str | None = None) -> "RequestIndex":
+        """Load the index file, starting empty if it is missing or corrupt."""
+        if path is None:
+            path = os.path.join(data_dir(), "request-index.json")
+
+        try:
+            with open(path, encoding="utf-8") as handle:
+                raw = json.load(handle)
+            autoids = {str(key): int(autoid) for key, autoid in raw.items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            autoids = {}
+
+        return cls(path, autoids)
+
+    def get(self, request_id: typing.Tuple[str, int, int]) -> typing.Optional[int]:
+        """Return the autoid of a compound request ID, if it is indexed."""
+        return self.autoids.get(compound_key(request_id))
+
+    def add(self, request_id: typing.Tuple[str, int, int], autoid: int):
+        """Index one request looked up on the server, and persist the index."""
+        with self._lock:
+            self.autoids[compound_key(request_id)] = autoid
+            self.save()
+
+    def replace(self, autoids: dict[str, int]):
+        """Replace the index with a bulk refresh, and persist it."""
+        with self._lock:
+            self.autoids = {key.upper(): int(autoid) for key, autoid in autoids.items()}
+            self.save()
+
+    def save(self):
+        """Atomically write the index file; failures are not fatal."""
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(self.autoids, handle)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # The server can always be asked instead.
@@ -0,0 +1,358 @@
+"""Read package weights from a serial-attached shipping scale.
+
+Most shipping scales can stream readings continuously over RS-232 or a USB
+serial adapter. Two common continuous-output formats are understood:
+
+* ASCII lines such as ``ST,GS,+  2.35 lb`` or ``US,GS,+ 38.2oz`` (status,
+  gross/net, signed value, unit), as sent by many bench and postal scales;
+* Mettler Toledo continuous frames: ``STX``, three status bytes, six weight
+  digits, six tare digits, ``CR``.
+
+Readings are debounced: a weight is only accepted once several consecutive
+readings agree and none of them is flagged as in motion.
+"""
+
+import os
+import re
+import select
+import sys
+import threading
+import time
+import typing
+
+from .models import ScaleConfig
+
+try:
+    import serial  # type: ignore  # pylint: disable=import-error
+except ImportError:
+    HAS_PYSERIAL = False
+else:
+    HAS_PYSERIAL = True
+
+try:
+    import termios  # pylint: disable=import-error
+except ImportError:
+    HAS_TERMIOS = False
+else:
+    HAS_TERMIOS = True
+
+OUNCES_PER_UNIT = {"lb": 16.0, "oz": 1.0, "kg": 35.27396195, "g": 0.03527396195}
+
+_STX = b"\x02"
+
+_ASCII_RE = re.compile(
+    rb"^\s*(?:(?P<status>ST|US|OL)\s*,?\s*)?(?:(?:GS|NT|TR|G|N)\s*,?\s*)?"
+    rb"(?P<sign>[+-])?\s*(?P<value>\d+(?:\.\d*)?)\s*(?P<unit>lb|oz|kg|g)\b"
+    rb"(?:\s*(?P<oz>\d+(?:\.\d*)?)\s*oz)?",
+    re.IGNORECASE,
+)
+
+# Toledo status word A, bits 0-2: where the decimal point sits in the weight.
+_TOLEDO_SCALE = {0: 100.0, 1: 10.0, 2: 1.0, 3: 0.1, 4: 0.01, 5: 0.001, 6: 0.0001}
+
+
+class Reading(typing.NamedTuple):
+    """One weight reading in ounces, and whether the scale reported it settled."""
+
+    ounces: float
+    stable: bool
+
+
+def parse_ascii(line: bytes) -> typing.Optional[Reading]:
+    """Parse an ASCII continuous-output line, or return None."""
+    match = _ASCII_RE.match(line)
+    if not match:
+        return None
+
+    status = (match.group("status") or b"ST").upper()
+    if status == b"OL":
+        return None  # Overload: there is no usable weight.
+
+    unit = match.group("unit").decode().lower()
+    ounces = float(match.group("value")) * OUNCES_PER_UNIT[unit]
+    if match.group("oz") is not None:
+        ounces += float(match.group("oz"))
+    if match.group("sign") == b"-":
+        ounces = -ounces
+
+    return Reading(ounces, status == b"ST")
+
+
+def parse_toledo(frame: bytes) -> typing.Optional[Reading]:
+    """Parse a Mettler Toledo continuous frame (without the STX), or None."""
+    if len(frame) < 9:
+        return None
+
+    status_a, status_b = frame[0], frame[1]
+    try:
+        digits = int(frame[3:9].decode("ascii"))
+    except ValueError:
+        return None
+
+    if status_b & 0x04:
+        return None  # Out of range.
+
+    value = digits * _TOLEDO_SCALE.get(status_a & 0x07, 1.0)
+    if status_b & 0x02:
+        value = -value
+    unit = "kg" if status_b & 0x10 else "lb"
+    in_motion = bool(status_b & 0x08)
+
+    return Reading(value * OUNCES_PER_UNIT[unit], not in_motion)
+
+
+def parse_frames(buffer: bytes, protocol: str = "auto"):
+    """Split a byte buffer into readings; return ``(readings, leftover)``.
+
+    Frames end in CR (or LF); the unterminated tail is returned so that it can
+    be completed by the next read.
+    """
+    *frames, leftover = re.split(rb"[\r\n]", buffer)
+    readings = []
+    for frame in frames:
+        if _STX in frame and protocol in ("auto", "toledo"):
+            reading = parse_toledo(frame.rsplit(_STX, 1)[1])
+        elif protocol in ("auto", "ascii"):
+            reading = parse_ascii(frame.lstrip(_STX))
+        else:
+            reading = None
+        if reading is not None:
+            readings.append(reading)
+    return readings, leftover
+
+
+class Debouncer:  # pylint: disable=too-few-public-methods
+    """Accept a weight once enough consecutive settled readings agree."""
+
+    count: int
+    tolerance: float
+
+    def __init__(self, count: int = 3, tolerance: float = 0.1):
+        self.count = int(count)
+        self.tolerance = float(tolerance)
+        self._window: list[float] = []
+
+    def feed(self, reading: Reading) -> typing.Optional[float]:
+        """Feed a reading; return the settled weight in ounces, if there is one.
+
+        An in-motion, empty (zero or negative) or disagreeing reading restarts
+        the window, so a box still being set down is never accepted.
+        """
+        if not reading.stable or reading.ounces <= 0:
+            self._window.clear()
+            return None
+
+        if self._window and abs(reading.ounces - self._window[0]) > self.tolerance:
+            self._window.clear()
+
+        self._window.append(reading.ounces)
+        if len(self._window) < self.count:
+            return None
+
+        weight = sorted(self._window)[len(self._window) // 2]
+        self._window.clear()
+        return weight
+
+
+class _PosixPort:
+    """Minimal raw serial port on a POSIX tty, used when pyserial is absent.
+
+    This is also what talks to a pseudo-terminal emulating a scale.
+    """
+
+    def __init__(self, path: str, baudrate: int):
+        self._fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            attrs = termios.tcgetattr(self._fd)
+            attrs[0] = 0  # iflag: no input processing.
+            attrs[1] = 0  # oflag: no output processing.
+            attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL
+            attrs[3] = 0  # lflag: raw, no echo.
+            speed = getattr(termios, f"B{baudrate}", termios.B9600)
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+        except termios.error:
+            pass  # Not a real tty (e.g. a FIFO); read it as-is.
+
+    def read(self, size: int, timeout: float) -> bytes:
+        """Read up to size bytes, waiting at most timeout seconds."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return b""
+        try:
+            return os.read(self._fd, size)
+        except BlockingIOError:
+            return b""
+
+    def flush(self):
+        """Discard readings received but not yet read."""
+        try:
+            termios.tcflush(self._fd, termios.TCIFLUSH)
+        except termios.error:
+            pass
+
+    def close(self):
+        """Close the port."""
+        os.close(self._fd)
+
+
+class _PyserialPort:
+    """Serial port through pyserial (required on Windows)."""
+
+    def __init__(self, path: str, baudrate: int):
+        self._serial = serial.Serial(path, baudrate=baudrate, timeout=0.1)
+
+    def read(self, size: int, timeout: float) -> bytes:
+        """Read up to size bytes, waiting at most timeout seconds."""
+        self._serial.timeout = timeout
+        return self._serial.read(max(size, 1))
+
+    def flush(self):
+        """Discard readings received but not yet read."""
+        self._serial.reset_input_buffer()
+
+    def close(self):
+        """Close the port."""
+        self._serial.close()
+
+
+def open_port(path: str, baudrate: int = 9600):
+    """Open a serial port, raising OSError if no backend can open it."""
+    if HAS_PYSERIAL:
+        try:
+            return _PyserialPort(path, baudrate)
+        except serial.SerialException as exc:
+            raise OSError(str(exc)) from exc
+
+    if HAS_TERMIOS:
+        return _PosixPort(path, baudrate)
+
+    raise OSError("reading a serial scale on this platform requires pyserial")
+
+
+class Scale:
+    """A continuously streaming shipping scale."""
+
+    config: ScaleConfig
+
+    def __init__(self, port, config: ScaleConfig):
+        self._port = port
+        self._buffer = b""
+        self.config = config
+
+    @classmethod
+    def from_config(cls, config: ScaleConfig) -> typing.Optional["Scale"]:
+        """Open and probe the configured scale; None if there is none.
+
+        A scale counts as detected only once it sends a parseable reading
+        within ``detect_timeout`` seconds, so a wrong or idle port falls back to
+        the weight prompt instead of hanging every package.
+        """
+        if config.port is None:
+            return None
+
+        try:
+            port = open_port(config.port, config.baudrate)
+        except OSError:
+            return None
+
+        scale = cls(port, config)
+        if scale.read_reading(config.detect_timeout) is None:
+            scale.close()
+            return None
+
+        return scale
+
+    def read_reading(self, timeout: float) -> typing.Optional[Reading]:
+        """Return the next parseable reading, or None after timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            self._buffer += self._port.read(256, min(remaining, 0.1))
+            readings, self._buffer = parse_frames(self._buffer, self.config.protocol)
+            self._buffer = self._buffer[-256:]  # A garbage stream must not grow.
+            if readings:
+                return readings[-1]  # Only the latest reading is current.
+        return None
+
+    def read_stable(self, timeout: typing.Optional[float] = None):
+        """Return a settled weight in ounces, or None if none settles in time."""
+        timeout = self.config.timeout if timeout is None else timeout
+
+        # The scale streams while nobody is listening; readings buffered since
+        # the last package describe the last package, not this one.
+        self._port.flush()
+        self._buffer = b""
+
+        debouncer = Debouncer(self.config.stable_readings, self.config.tolerance)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            reading = self.read_reading(remaining)
+            if reading is None:
+                return None
+            weight = debouncer.feed(reading)
+            if weight is not None:
+                return weight
+        return None
+
+    def close(self):
+        """Close the scale's port."""
+        self._port.close()
+
+
+def format_ascii(ounces: float, stable: bool = True) -> bytes:
+    """Format a reading the way an ASCII continuous-output scale sends it."""
+    status = "ST" if stable else "US"
+    return f"{status},GS,{ounces / 16.0:+8.2f} lb\r\n".encode("ascii")
+
+
+def format_toledo(ounces: float, stable: bool = True) -> bytes:
+    """Format a reading as a Mettler Toledo continuous frame in pounds."""
+    hundredths = round(abs(ounces) / 16.0 * 100)
+    status_a = 0x20 | 0x04  # Two decimal places.
+    status_b = 0x20 | (0x02 if ounces < 0 else 0) | (0 if stable else 0x08)
+    status_c = 0x20
+    return (
+        _STX
+        + bytes([status_a, status_b, status_c])
+        + f"{hundredths:06d}{0:06d}\r".encode("ascii")
+    )
+
+
+def emulate(fd: int, weights, protocol: str = "ascii", interval: float = 0.05):
+    """Write readings (ounces, stable) to a file descriptor like a real scale.
+
+    Point a :class:`Scale` at the other end of a pseudo-terminal to exercise
+    detection, parsing and debouncing without hardware.
+    """
+    fmt = format_toledo if protocol == "toledo" else format_ascii
+    for ounces, stable in weights:
+        os.write(fd, fmt(ounces, stable))
+        time.sleep(interval)
+
+
+def demo():
+    """Weigh a simulated package on a scale emulated over a pseudo-terminal."""
+    if not HAS_TERMIOS:
+        print("Error: the scale emulator needs a POSIX pseudo-terminal.")
+        sys.exit()
+
+    import pty  # pylint: disable=import-outside-toplevel
+
+    protocol = sys.argv[1] if len(sys.argv) > 1 else "ascii"
+    controller, device = pty.openpty()
+
+    # Empty platter, a box being set down, then a settled 2 lb 6.5 oz reading.
+    weights = [(0.0, True)] * 3 + [(20.0, False), (41.0, False)] + [(38.5, True)] * 5
+    emulator = threading.Thread(
+        target=emulate, args=(controller, weights, protocol), daemon=True
+    )
+    emulator.start()
+
+    config = ScaleConfig(port=os.ttyname(device), protocol=protocol)
+    scale = Scale.from_config(config)
+    if scale is None:
+        print("No scale detected.")
+        return
+
+    print(f"Stable weight: {scale.read_stable()} oz")
+    scale.close()
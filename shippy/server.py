@@ -1,11 +1,32 @@
 """IBP server API abstraction."""
 
+import functools
 import json
+import typing
 from urllib.parse import urljoin
 
 import requests
 
+from . import deadline
 from .models import IbpConfig
+from .request_index import RequestIndex
+
+
+class AddressLookup(typing.NamedTuple):
+    """An address to look up on the IBP server, possibly later.
+
+    ``kind`` is ``unit`` or ``request``, and ``autoid`` what the matching
+    :class:`Server` method takes.
+    """
+
+    kind: str
+    autoid: typing.Any
+
+    def resolve(self, server: "Server") -> dict[str, str]:
+        """Look the address up."""
+        if self.kind == "unit":
+            return server.unit_address(self.autoid)
+        return server.request_address(self.autoid)
 
 
 class Server:
@@ -14,12 +35,21 @@ class Server:
     _url: str
     _apikey: str
     _timeout: float
+    # Pooled connections, kept open from one call to the next.
+    http: requests.Session
+    # Compound request IDs resolved without asking the server, if set.
+    request_index: typing.Optional[RequestIndex]
+    # Sends slow address and request ID lookups again, if set.
+    hedger: typing.Optional[deadline.Hedger]
 
     def __init__(self, url: str, apikey: str, timeout: float = 30.0):
         """Create server API convenience class from url and apikey."""
         self._url = url
         self._apikey = apikey
         self._timeout = float(timeout)
+        self.http = deadline.bound(requests.Session())
+        self.request_index = None
+        self.hedger = None
 
     @classmethod
     def from_config(cls, config: IbpConfig) -> "Server":
@@ -29,26 +59,87 @@ class Server:
     def _post(self, path, **kwargs):
         url = urljoin(self._url, path)
         kwargs["key"] = self._apikey
-        response = requests.post(url, data=kwargs, timeout=self._timeout)
+        response = self.http.post(url, data=kwargs, timeout=self._timeout)
         response.raise_for_status()
         return json.loads(response.text)
 
+    def _read(self, path, **kwargs):
+        """Post a label's lookup, hedged: it is safe to send twice."""
+        if self.hedger is None:
+            return self._post(path, **kwargs)
+        return self.hedger.call(functools.partial(self._post, path, **kwargs))
+
     def unit_ids(self) -> dict[str, int]:
         """Get list of unit names with ids."""
         return self._post("unit_autoids")
 
     def return_address(self) -> dict[str, str]:
         """Get configured return address."""
-        return self._post("return_address")
+        return self._read("return_address")
 
     def unit_address(self, autoid) -> dict[str, str]:
         """Get unit address from its id."""
-        return self._post(f"unit_address/{autoid:d}")
+        return self._read(f"unit_address/{autoid:d}")
+
+    def request_address(self, request_id) -> dict[str, str]:
+        """Get address for a request given its autoid or compound request ID."""
+        return self._read(f"request_address/{self.request_autoid(request_id):d}")
+
+    def request_autoid(self, request_id) -> int:
+        """Return the autoid of a request given its autoid or compound request ID.
+
+        A compound ID (``(jurisdiction, inmate_id, index)``) is resolved from the
+        request index if it is there, and looked up on the server otherwise.
+        """
+        if not isinstance(request_id, tuple):
+            return request_id
+
+        if self.request_index is not None:
+            autoid = self.request_index.get(request_id)
+            if autoid is not None:
+                return autoid
+
+        jurisdiction, inmate_id, index = request_id
+        autoid = int(
+            self._read(
+                "request_autoid",
+                jurisdiction=jurisdiction.upper(),
+                inmate_id=inmate_id,
+                index=index,
+            )["autoid"]
+        )
+        if self.request_index is not None:
+            self.request_index.add(request_id, autoid)
+        return autoid
+
+    def packed_request_autoids(self) -> dict[str, int]:
+        """Get autoids of the day's packed requests by compound request ID."""
+        return self._post("packed_request_autoids")
+
+    def ready_requests(self, after: int = 0, limit: int = 50) -> dict:
+        """Get a page of packed requests ready to ship, by ascending autoid.
+
+        Returns ``{"requests": [{"autoid": ..., "request_id": ...}, ...],
+        "next": ...}``, where ``next`` is the ``after`` of the next page, or
+        None on the last one.
+        """
+        return self._post("ready_requests", after=after, limit=limit)
+
+    def acknowledge_requests(self, autoids: typing.Iterable[int]) -> int:
+        """Mark requests shipped, taking them off the ready list.
+
+        Returns how many were acknowledged.
+        """
+        joined = ",".join(f"{autoid:d}" for autoid in autoids)
+        return int(self._post("ack_requests", autoids=joined)["acknowledged"])
 
-    def _request_address_autoid(self, autoid):
-        """Get address for a request given its autoid."""
-        return self._post(f"request_address/{autoid:d}")
+    def refresh_request_index(self) -> int:
+        """Refresh the request index with the day's packed requests.
 
-    def request_address(self, autoid) -> dict[str, str]:
-        """Get address for a request given its request identifier."""
-        return self._post(f"request_address/{autoid:d}")
+        Returns how many requests were indexed.
+        """
+        if self.request_index is None:
+            return 0
+        autoids = self.packed_request_autoids()
+        self.request_index.replace(autoids)
+        return len(autoids)
@@ -0,0 +1,655 @@
+"""A shipping session: everything needed to turn an address into a label."""
+
+import concurrent.futures
+import contextlib
+import functools
+import importlib.resources
+import sqlite3
+import threading
+import typing
+
+import easypost  # type: ignore
+from easypost.models import Address as EasyPostAddress
+from easypost.models import Shipment as EasyPostShipment
+
+from . import console, deadline, memory, shipping, tracing, zpl
+from .health import HealthMonitor
+from .journal import Entry, Journal
+from .misc import grab_bytes_from_url, grab_png_from_url, label_http
+from .models import Config
+from .outbox import Unreachable, is_offline
+from .printing import (
+    load_backend,
+    print_images,
+    print_raw,
+    printer_status,
+    sheet_buffer,
+)
+from .printing.watch import PrinterWatch
+from .request_index import RequestIndex
+from .server import Server
+from .startup import Startup
+
+if typing.TYPE_CHECKING:
+    from PIL import Image
+
+# Purchases made at once for a multi-box shipment.
+MAX_CONCURRENT_PURCHASES = 8
+
+# Destination addresses verified ahead of their label, kept until it is bought.
+MAX_PREFETCHED_ADDRESSES = 64
+
+
+def load_logo() -> "Image.Image":
+    """Load logo image."""
+    # pylint: disable-next=import-outside-toplevel,redefined-outer-name
+    from PIL import Image
+
+    logo_fpath = importlib.resources.files("shippy.assets").joinpath("logo.jpg")
+    return Image.open(str(logo_fpath))
+
+
+def _address_key(to_addr_dict: dict[str, str]) -> tuple:
+    """Return a hashable key for an address, whatever the order of its fields."""
+    return tuple(sorted(to_addr_dict.items()))
+
+
+def _bought(entry: Entry) -> str:
+    """Return the shipment ID of a journaled purchase, if it got that far."""
+    if entry.shipment_id is None:
+        raise ValueError(f"no postage was bought for {entry.describe()}")
+    return entry.shipment_id
+
+
+def _health_monitor(
+    config: Config, easypost_client: easypost.EasyPostClient, server: Server
+) -> HealthMonitor:
+    """Return a monitor of the IBP, EasyPost and label host connections."""
+    monitor = HealthMonitor(config.health.interval, config.health.timeout)
+    monitor.watch("IBP", server.http, str(config.ibp.url))
+    # The SDK keeps its pooled session to itself.
+    sdk_http = easypost_client._requests_session  # pylint: disable=protected-access
+    monitor.watch("EasyPost", sdk_http, easypost_client.api_base)
+    monitor.watch("labels", label_http())
+    return monitor
+
+
+class Session:  # pylint: disable=too-many-instance-attributes
+    """Shipping session shared by the interactive and headless front ends.
+
+    :meth:`start` fetches and verifies the return address and loads the label
+    assets in the background; only the first purchase waits for them. It also
+    refreshes the request index, which nothing waits for.
+
+    Every purchase is recorded in the shipment journal (if one is attached), so
+    a label bought but never printed can be resumed instead of bought again.
+    """
+
+    config: Config
+    easypost_client: easypost.EasyPostClient
+    server: Server
+    startup: Startup
+    # The logo in the configured label format: an image for PNG labels, a
+    # prepared graphic field for ZPL ones.
+    logo: typing.Union["Image.Image", bytes, None]
+    from_addr: EasyPostAddress | None
+    journal: Journal | None
+    # Carrier accounts to rate with, once looked up.
+    rating_accounts: list[str] | None
+    # Label images reused from one PNG label to the next.
+    canvases: memory.LabelCanvases
+    # Keeps upstream connections warm between packages, if enabled; started by
+    # the interactive modes only, which show its status before each package.
+    health: HealthMonitor | None
+    # Destination addresses verified ahead: (address, whether it verified).
+    prefetched: memory.BoundedCache[tuple, tuple[EasyPostAddress, bool]]
+    # Sends slow label downloads again, if set.
+    label_hedger: deadline.Hedger | None
+    # The label printer's status, checked before buying postage, if enabled.
+    printer: PrinterWatch | None
+    # Told the request ID of each label printed, if set (queue mode).
+    on_printed: typing.Callable[[str], None] | None
+
+    def __init__(
+        self,
+        config: Config,
+        easypost_client: easypost.EasyPostClient,
+        server: Server,
+        startup: Startup | None = None,
+    ):
+        self.config = config
+        self.easypost_client = easypost_client
+        self.server = server
+        self.startup = startup if startup is not None else Startup()
+        self.logo = None
+        self.from_addr = None
+        self.journal = None
+        self.rating_accounts = None
+        self.canvases = memory.LabelCanvases()
+        self.health = None
+        self.prefetched = memory.BoundedCache(MAX_PREFETCHED_ADDRESSES)
+        self._prefetched_lock = threading.Lock()
+        self.label_hedger = None
+        self.printer = None
+        self.on_printed = None
+
+    @classmethod
+    def from_config(cls, config: Config, startup: Startup | None = None) -> "Session":
+        """Create a session with clients built from the application config."""
+        easypost_client = easypost.EasyPostClient(
+            config.easypost.apikey, api_base=str(config.easypost.api_base).rstrip("/")
+        )
+        # The SDK's calls keep to a label's time budget, too.
+        # pylint: disable-next=protected-access
+        deadline.bound(easypost_client._requests_session)
+        server = Server.from_config(config.ibp)
+        server.request_index = RequestIndex.load()
+        session = cls(config, easypost_client, server, startup)
+        if config.deadline.hedge:
+            server.hedger = deadline.Hedger("IBP")
+            session.label_hedger = deadline.Hedger("labels")
+        if config.health.enabled:
+            session.health = _health_monitor(config, easypost_client, server)
+        if config.printer.watch:
+            session.printer = PrinterWatch(
+                printer_status, config.printer.watch_interval
+            )
+
+        try:
+            session.journal = Journal.open()
+        except (OSError, sqlite3.Error) as exc:
+            console.warn(f"Shipment journal unavailable ({exc}); shipping without it.")
+
+        return session
+
+    def start(self):
+        """Start the session's own startup work in the background."""
+        self.startup.submit("return address", self._build_return_address)
+        self.startup.submit("label assets", self._load_label_assets)
+        self.startup.submit("request index", self.server.refresh_request_index)
+        if self.config.rating.service and not self.config.rating.carrier_accounts:
+            self.startup.submit("carrier accounts", self._find_carrier_accounts)
+        if self.printer is not None:
+            self.printer.start()
+
+    def _build_return_address(self) -> tuple[EasyPostAddress, bool]:
+        """Grab the return address from the IBP server and verify it."""
+        from_addr = shipping.build_address(
+            self.easypost_client, **self.server.return_address()
+        )
+        try:
+            self.easypost_client.address.verify(from_addr.id)
+        except easypost.errors.InvalidRequestError:
+            return from_addr, False
+        return from_addr, True
+
+    def _find_carrier_accounts(self) -> list[str]:
+        """Look up the IDs of the carrier accounts to rate with."""
+        return shipping.carrier_account_ids(
+            self.easypost_client, self.config.rating.carrier
+        )
+
+    def _load_label_assets(self) -> typing.Union["Image.Image", bytes]:
+        """Load the logo and the printing backend ahead of the first label."""
+        load_backend()
+        return self._load_logo()
+
+    def _load_logo(self) -> typing.Union["Image.Image", bytes]:
+        """Load the logo in the configured label format."""
+        if self.config.printer.label_format == "zpl":
+            return zpl.logo_field()
+        return load_logo()
+
+    def return_address(self) -> EasyPostAddress:
+        """Return the verified return address, waiting for it the first time."""
+        if self.from_addr is None:
+            if not self.startup.submitted("return address"):
+                self.start()
+
+            try:
+                from_addr, verified = self.startup.result(
+                    "return address", "Grabbing and verifying return address"
+                )
+            except Exception:
+                # Fetch it again for the next label, e.g. once the network is back.
+                self.startup.submit("return address", self._build_return_address)
+                raise
+            if not verified:
+                console.warn(
+                    "Failed to verify return address, consider double-checking "
+                    "before shipping."
+                )
+            self.from_addr = from_addr
+
+        return self.from_addr
+
+    def carrier_accounts(self) -> list[str]:
+        """Return the carrier account IDs to rate with, or none to rate them all.
+
+        Looked up once, waiting for it the first time. Without any account for
+        the configured carrier, every carrier is rated as before.
+        """
+        rating = self.config.rating
+        if not rating.service:
+            return []
+        if self.rating_accounts is None:
+            if rating.carrier_accounts:
+                accounts = [
+                    account.strip()
+                    for account in rating.carrier_accounts.split(",")
+                    if account.strip()
+                ]
+            else:
+                if not self.startup.submitted("carrier accounts"):
+                    self.startup.submit("carrier accounts", self._find_carrier_accounts)
+                try:
+                    accounts = self.startup.result(
+                        "carrier accounts", "Looking up carrier accounts"
+                    )
+                except Exception:
+                    # Look them up again for the next label.
+                    self.startup.submit("carrier accounts", self._find_carrier_accounts)
+                    raise
+                if not accounts:
+                    console.warn(
+                        f"No {rating.carrier} carrier account found; rating "
+                        "every carrier instead."
+                    )
+            self.rating_accounts = accounts
+        return self.rating_accounts
+
+    def budget(self) -> typing.ContextManager:
+        """Return a context giving a label's calls the configured time budget."""
+        return deadline.budget(self.config.deadline.label)
+
+    def hedging(self) -> list[str]:
+        """Return how hedged reads fared, for each upstream that hedged any."""
+        hedgers = [self.server.hedger, self.label_hedger]
+        return [
+            hedger.summary()
+            for hedger in hedgers
+            if hedger is not None and hedger.hedged
+        ]
+
+    def label_logo(self) -> typing.Union["Image.Image", bytes]:
+        """Return the logo added to labels, waiting for it the first time."""
+        if self.logo is None:
+            if self.startup.submitted("label assets"):
+                self.logo = self.startup.result("label assets", "Loading label assets")
+            else:
+                self.logo = self._load_logo()
+        return self.logo
+
+    def ship(
+        self,
+        to_addr_dict: dict[str, str],
+        weight: float,
+        request_id: typing.Optional[str] = None,
+        unit: typing.Optional[str] = None,
+    ) -> EasyPostShipment:
+        """Verify an address, buy postage for weight in ounces, and print it.
+
+        A refund is requested if anything goes wrong after the purchase. If the
+        request already has a label bought but not printed, that label is
+        printed instead of buying another one.
+        """
+        with tracing.trace(request_id=request_id, unit=unit), self.budget():
+            bought = self.buy(to_addr_dict, [weight], request_id, unit)
+            self.print_bought(bought, request_id)
+        return bought[0][0]
+
+    def ship_boxes(
+        self,
+        to_addr_dict: dict[str, str],
+        weights: typing.Sequence[float],
+        unit: typing.Optional[str] = None,
+    ) -> list[EasyPostShipment]:
+        """Ship several boxes to one address, e.g. a unit, in one go.
+
+        The address is verified once, postage for every weight in ounces is
+        bought at the same time, and the labels are printed back-to-back as one
+        print job. A box whose purchase fails is reported and left out; if
+        printing fails, every box's postage is refunded.
+        """
+        with tracing.trace(unit=unit), self.budget():
+            bought = self.buy(to_addr_dict, weights, unit=unit)
+            self.print_bought(bought)
+        return [shipment for shipment, _ in bought]
+
+    def buy(
+        self,
+        to_addr_dict: dict[str, str],
+        weights: typing.Sequence[float],
+        request_id: typing.Optional[str] = None,
+        unit: typing.Optional[str] = None,
+    ) -> list[tuple[EasyPostShipment, typing.Optional[int]]]:
+        """Verify an address and buy postage for each weight, without printing.
+
+        Returns ``(shipment, journal entry ID)`` pairs for :meth:`print_bought`.
+        A request that already has a label bought but not printed gets that
+        label instead of another one. Raises :class:`Unreachable` if upstream
+        could not be reached before anything was bought, and
+        :class:`~shippy.printing.watch.PrinterNotReady` if the label printer
+        is known not to be ready.
+        """
+        if request_id is not None and self.journal is not None:
+            entry = self.journal.unprinted(request_id)
+            if entry is not None:
+                console.warn(
+                    f"Postage for request {request_id} was already bought; "
+                    "printing that label instead of buying another."
+                )
+                return [(self._retrieve(entry), entry.id)]
+
+        if self.printer is not None:
+            self.printer.check()
+        addresses = self._addresses(to_addr_dict)
+        if len(weights) > 1:
+            return self._buy_boxes(addresses, to_addr_dict, weights, unit)
+
+        entry_id = self._journal("begin", to_addr_dict, weights[0], request_id, unit)
+        with console.task_message("Purchasing postage"):
+            shipment = self._buy(*addresses, weights[0], entry_id)
+        return [(shipment, entry_id)]
+
+    def _buy_boxes(
+        self,
+        addresses: tuple[EasyPostAddress, EasyPostAddress],
+        to_addr_dict: dict[str, str],
+        weights: typing.Sequence[float],
+        unit: typing.Optional[str],
+    ) -> list[tuple[EasyPostShipment, typing.Optional[int]]]:
+        """Buy postage for each box at once; return ``(shipment, entry ID)`` pairs."""
+
+        def buy(weight):
+            entry_id = self._journal("begin", to_addr_dict, weight, None, unit)
+            # Each box is traced as its own label.
+            with tracing.trace(unit=unit):
+                return self._buy(*addresses, weight, entry_id), entry_id
+
+        workers = min(len(weights), MAX_CONCURRENT_PURCHASES)
+        with (
+            console.task_message(
+                f"Purchasing postage for {len(weights)} boxes",
+                stage="Purchasing postage for several boxes",
+            ),
+            concurrent.futures.ThreadPoolExecutor(workers) as pool,
+        ):
+            futures = [pool.submit(deadline.bind(buy), weight) for weight in weights]
+
+        bought, errors = [], []
+        for number, (future, weight) in enumerate(zip(futures, weights), 1):
+            try:
+                bought.append(future.result())
+            except Exception as exc:  # pylint: disable=broad-except
+                console.error(f"Box {number} ({weight / 16:g} lb): {exc}")
+                errors.append(exc)
+        if not bought:
+            raise errors[0]
+        if errors:
+            console.warn(
+                f"{len(errors)} of {len(weights)} boxes were not shipped; "
+                "ship them again to retry."
+            )
+        return bought
+
+    def _addresses(
+        self, to_addr_dict: dict[str, str]
+    ) -> tuple[EasyPostAddress, EasyPostAddress]:
+        """Return the return address and the verified destination address.
+
+        Raises :class:`Unreachable` if upstream cannot be reached. Nothing has
+        been bought at that point, so the label can safely be tried again.
+        """
+        try:
+            addresses = self.return_address(), self._verified_address(to_addr_dict)
+            self.carrier_accounts()  # Once, before any concurrent purchases.
+        except Exception as exc:
+            if is_offline(exc):
+                raise Unreachable(str(exc)) from exc
+            raise
+        return addresses
+
+    def prefetch_address(self, to_addr_dict: dict[str, str]) -> bool:
+        """Create and verify a destination address ahead of its label.
+
+        The next purchase to that address uses it instead of verifying it again.
+        Returns whether the address verified.
+        """
+        to_addr = shipping.build_address(self.easypost_client, **to_addr_dict)
+        try:
+            self.easypost_client.address.verify(to_addr.id)
+            verified = True
+        except easypost.errors.InvalidRequestError:
+            verified = False
+
+        with self._prefetched_lock:
+            self.prefetched[_address_key(to_addr_dict)] = (to_addr, verified)
+        return verified
+
+    def _verified_address(self, to_addr_dict: dict[str, str]) -> EasyPostAddress:
+        """Create a destination address, warning if it does not verify."""
+        with self._prefetched_lock:
+            prefetched = self.prefetched.pop(_address_key(to_addr_dict), None)
+        if prefetched is not None:
+            to_addr, verified = prefetched
+        else:
+            to_addr = shipping.build_address(self.easypost_client, **to_addr_dict)
+            try:
+                with console.task_message("Verifying address"):
+                    self.easypost_client.address.verify(to_addr.id)
+                verified = True
+            except easypost.errors.InvalidRequestError:
+                verified = False
+
+        if not verified:
+            console.warn(
+                "Failed to verify address, consider double-checking before shipping."
+            )
+        return to_addr
+
+    def _buy(
+        self,
+        from_addr: EasyPostAddress,
+        to_addr: EasyPostAddress,
+        weight: float,
+        entry_id: typing.Optional[int],
+    ) -> EasyPostShipment:
+        """Buy postage for weight in ounces, journaling the outcome.
+
+        Raises :class:`Unreachable` if upstream could not be reached before the
+        purchase itself; a purchase that fails may have gone through.
+        """
+        rating = self.config.rating
+        label_format = self.config.printer.label_format.upper()
+        buying = False
+        try:
+            accounts = self.carrier_accounts()
+            if accounts:
+                # Created and bought in one call.
+                buying = True
+                shipment = shipping.build_shipment(
+                    self.easypost_client,
+                    from_addr,
+                    to_addr,
+                    weight,
+                    self.config.parcel,
+                    label_format=label_format,
+                    carrier_accounts=accounts,
+                    service=rating.service,
+                )
+            else:
+                shipment = shipping.create_shipment(
+                    self.easypost_client,
+                    from_addr,
+                    to_addr,
+                    weight,
+                    self.config.parcel,
+                    label_format=label_format,
+                )
+                buying = True
+                shipment = shipping.buy_shipment(
+                    self.easypost_client, shipment, rating.carrier, rating.service
+                )
+        except Exception as exc:
+            self._journal("transition", entry_id, "failed", repr(exc))
+            if not buying and is_offline(exc):
+                raise Unreachable(str(exc)) from exc
+            raise
+        self._journal("purchased", entry_id, shipment)
+        tracing.annotate(shipment_id=shipment.id)
+        return shipment
+
+    def resume(self, entry: Entry) -> EasyPostShipment:
+        """Print the label of a journaled shipment bought but not printed."""
+        shipment = self._retrieve(entry)
+        self.print_bought([(shipment, entry.id)], entry.request_id)
+        return shipment
+
+    def _retrieve(self, entry: Entry) -> EasyPostShipment:
+        """Fetch a journaled shipment bought earlier."""
+        tracing.annotate(shipment_id=entry.shipment_id)
+        with console.task_message("Retrieving purchased postage"):
+            return self.easypost_client.shipment.retrieve(_bought(entry))
+
+    def refund(self, entry: Entry):
+        """Request a refund for a journaled shipment."""
+        with deadline.unbounded(), console.task_message("Requesting refund"):
+            self.easypost_client.shipment.refund(_bought(entry))
+        self._journal("transition", entry.id, "refunded")
+
+    def settle(self, entry: Entry, state: str):
+        """Mark a journaled shipment as settled (e.g. printed or dismissed)."""
+        self._journal("transition", entry.id, state)
+
+    def in_flight(self) -> list[Entry]:
+        """Return journaled shipments left unsettled by an earlier run."""
+        return [] if self.journal is None else self.journal.in_flight()
+
+    def print_bought(
+        self,
+        bought: list[tuple[typing.Any, typing.Optional[int]]],
+        request_id: typing.Optional[str] = None,
+    ):
+        """Print bought shipments' labels as one job, refunding them if that fails.
+
+        ``bought`` holds ``(shipment, journal entry ID)`` pairs from :meth:`buy`,
+        for ``request_id`` if they were bought for a request.
+        The label's time budget no longer applies: postage is bought, and a
+        download cut short would only have it refunded.
+        """
+        message = "Printing postage"
+        if len(bought) > 1:
+            message = f"Printing {len(bought)} labels"
+
+        with deadline.unbounded(), contextlib.ExitStack() as refunds:
+            for shipment, entry_id in bought:
+                refunds.enter_context(self._request_refund_on_error(shipment, entry_id))
+            try:
+                with console.task_message(message, stage="Printing postage"):
+                    for _, entry_id in bought:
+                        self._journal("transition", entry_id, "printing")
+                    printed = self._print_labels(
+                        [shipment.postage_label for shipment, _ in bought],
+                        [entry_id for _, entry_id in bought],
+                        request_id,
+                    )
+            except RuntimeError as exc:
+                console.error(f"Error: {exc}")
+                raise
+
+        if printed:
+            for _, entry_id in bought:
+                self._journal("transition", entry_id, "printed")
+            memory.label_printed(len(bought))
+            self._label_printed(request_id)
+
+    def _label_printed(self, request_id: typing.Optional[str]):
+        """Tell :attr:`on_printed` a request's label printed, if it wants to know."""
+        if request_id is not None and self.on_printed is not None:
+            self.on_printed(request_id)  # pylint: disable=not-callable
+
+    def _sheet_printed(
+        self, entry_id: typing.Optional[int], request_id: typing.Optional[str], error
+    ):
+        """Settle a label once the sheet it was put on printed or failed to.
+
+        A label whose sheet failed stays journaled as printing, so it is
+        offered to resume or refund at the next start, and its request is not
+        reported printed.
+        """
+        if error is not None:
+            console.error(f"Error: could not print a sheet of labels ({error}).")
+            return
+        self._journal("transition", entry_id, "printed")
+        memory.label_printed()
+        self._label_printed(request_id)
+
+    def _print_labels(
+        self,
+        postage_labels: list,
+        entry_ids: typing.Sequence[typing.Optional[int]],
+        request_id: typing.Optional[str] = None,
+    ) -> bool:
+        """Download labels, add the logo, and print them back-to-back.
+
+        Returns False if the labels were put on a sheet for an office printer
+        instead, which settles each label (for ``request_id``) once its sheet
+        is printed.
+        """
+        logo = self.label_logo()
+        zpl_labels = isinstance(logo, bytes)
+
+        def download(postage_label):
+            if zpl_labels:
+                return grab_bytes_from_url(
+                    postage_label.label_zpl_url, hedger=self.label_hedger
+                )
+            return grab_png_from_url(postage_label.label_url, hedger=self.label_hedger)
+
+        if len(postage_labels) == 1:
+            labels = [download(postage_labels[0])]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(len(postage_labels)) as pool:
+                labels = list(pool.map(deadline.bind(download), postage_labels))
+
+        if isinstance(logo, bytes):
+            # A RAW job may hold any number of ^XA...^XZ labels.
+            print_raw(b"".join(zpl.inject(label, logo) for label in labels))
+            return True
+
+        canvases = [self.canvases.compose(image, logo, (450, 425)) for image in labels]
+        sheets = sheet_buffer()
+        try:
+            if sheets is None:
+                print_images(canvases)
+                return True
+            for canvas, entry_id in zip(canvases, entry_ids):
+                sheets.add(
+                    canvas,
+                    functools.partial(self._sheet_printed, entry_id, request_id),
+                )
+            return False
+        finally:
+            self.canvases.release(canvases)
+
+    def _journal(self, method: str, *args):
+        """Call a journal method; a journal failure must not stop shipping."""
+        if self.journal is None or (method != "begin" and args[0] is None):
+            return None
+        try:
+            return getattr(self.journal, method)(*args)
+        except sqlite3.Error as exc:
+            console.warn(f"Failed to write the shipment journal: {exc}")
+            return None
+
+    @contextlib.contextmanager
+    def _request_refund_on_error(self, shipment, entry_id=None):
+        """Manage a shipment context where a refund is requested on error."""
+        try:
+            yield shipment
+        except Exception:
+            with deadline.unbounded(), console.task_message("Requesting refund"):
+                self.easypost_client.shipment.refund(shipment.id)
+            self._journal("transition", entry_id, "refunded")
+            raise
@@ -1,9 +1,12 @@
 """Postage convenience functions."""
 
+import typing
+
 from easypost import EasyPostClient
 from easypost.models import Address as EasyPostAddress
 from easypost.models import Shipment as EasyPostShipment
 
+from . import deadline
 from .models import ParcelConfig
 
 
@@ -15,26 +18,111 @@ def build_address(client: EasyPostClient, **kwargs) -> EasyPostAddress:
     return client.address.create(**kwargs)
 
 
-def build_shipment(
+def carrier_account_ids(client: EasyPostClient, carrier: str) -> list[str]:
+    """Return the IDs of the EasyPost account's carrier accounts for a carrier.
+
+    A carrier account matches by its readable name ("USPS") or its type
+    ("UspsAccount").
+    """
+    wanted = carrier.lower()
+    accounts: list[typing.Any] = client.carrier_account.all()
+    return [
+        account.id
+        for account in accounts
+        if wanted
+        in (
+            str(getattr(account, "readable", "")).lower(),
+            str(getattr(account, "type", "")).lower().removesuffix("account"),
+        )
+    ]
+
+
+def build_shipment(  # pylint: disable=too-many-arguments
     client: EasyPostClient,
     from_address: EasyPostAddress,
     to_address: EasyPostAddress,
-    weight: int,
+    weight: float,
     parcel_config: ParcelConfig,
+    *,
+    label_format: str = "PNG",
+    carrier_accounts: typing.Optional[list[str]] = None,
+    service: typing.Optional[str] = None,
 ) -> EasyPostShipment:
-    """Purchase postage given addresses, weight in ounces, and parcel dimensions."""
-    parcel = client.parcel.create(
-        predefined_package="Parcel",
-        weight=weight,
-        length=parcel_config.length,
-        width=parcel_config.width,
-        height=parcel_config.height,
+    """Purchase postage given addresses, weight in ounces, and parcel dimensions.
+
+    With ``carrier_accounts`` and a ``service``, EasyPost rates only those
+    accounts and buys the service in the same call that creates the shipment.
+    Otherwise every carrier is rated and the lowest USPS rate is bought.
+
+    With ``label_format="ZPL"`` the label is also available as ZPL, at
+    ``postage_label.label_zpl_url``.
+
+    The purchase runs its full timeout whatever is left of the label's time
+    budget: one cut short may still go through.
+    """
+    params = _shipment_params(
+        from_address, to_address, weight, parcel_config, label_format
     )
-    shipment = client.shipment.create(
-        from_address=from_address,
-        to_address=to_address,
-        parcel=parcel,
-        options={"special_rates_eligibility": "USPS.LIBRARYMAIL"},
+    if carrier_accounts and service:
+        with deadline.unbounded():
+            return client.shipment.create(
+                **params, carrier_accounts=carrier_accounts, service=service
+            )
+    return buy_shipment(client, client.shipment.create(**params))
+
+
+def create_shipment(  # pylint: disable=too-many-arguments
+    client: EasyPostClient,
+    from_address: EasyPostAddress,
+    to_address: EasyPostAddress,
+    weight: float,
+    parcel_config: ParcelConfig,
+    *,
+    label_format: str = "PNG",
+) -> EasyPostShipment:
+    """Create a shipment to rate; nothing is bought yet."""
+    return client.shipment.create(
+        **_shipment_params(
+            from_address, to_address, weight, parcel_config, label_format
+        )
     )
-    rate = shipment.lowest_rate(["USPS"])
-    return client.shipment.buy(shipment.id, rate=rate)
+
+
+def buy_shipment(
+    client: EasyPostClient,
+    shipment: EasyPostShipment,
+    carrier: str = "USPS",
+    service: typing.Optional[str] = None,
+):
+    """Buy the lowest rate of a created shipment with a carrier (and service).
+
+    Like every purchase, this runs its full timeout (see :func:`build_shipment`).
+    """
+    rate = shipment.lowest_rate([carrier], [service] if service else None)
+    with deadline.unbounded():
+        return client.shipment.buy(shipment.id, rate=rate)
+
+
+def _shipment_params(
+    from_address: EasyPostAddress,
+    to_address: EasyPostAddress,
+    weight: float,
+    parcel_config: ParcelConfig,
+    label_format: str,
+) -> dict:
+    """Return shipment creation parameters, with the parcel given inline."""
+    options = {"special_rates_eligibility": "USPS.LIBRARYMAIL"}
+    if label_format != "PNG":
+        options["label_format"] = label_format
+    return {
+        "from_address": from_address,
+        "to_address": to_address,
+        "parcel": {
+            "predefined_package": "Parcel",
+            "weight": weight,
+            "length": parcel_config.length,
+            "width": parcel_config.width,
+            "height": parcel_config.height,
+        },
+        "options": options,
+    }
@@ -0,0 +1,112 @@
+"""Concurrent startup work with a timing breakdown."""
+
+import concurrent.futures
+import threading
+import time
+import typing
+
+from . import console
+
+
+class _Task:  # pylint: disable=too-few-public-methods
+    """Timing record of one startup task."""
+
+    __slots__ = ("future", "submitted", "started", "finished", "blocked")
+
+    def __init__(self, submitted: float):
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.submitted = submitted
+        self.started: typing.Optional[float] = None
+        self.finished: typing.Optional[float] = None
+        self.blocked = 0.0
+
+
+class Startup:
+    """Run independent startup tasks concurrently and wait only when needed.
+
+    Tasks are submitted by name as soon as their inputs are known. Whoever needs
+    a result calls :meth:`result`, which shows a task message only if the task
+    has not finished yet, so the operator sees a spinner just for work that is
+    actually in their way. Each task gets a thread of its own: they are few and
+    mostly wait on the network, and one the first prompt needs must not queue
+    behind unrelated ones submitted earlier.
+    """
+
+    launched: float
+
+    def __init__(self) -> None:
+        self.launched = time.monotonic()
+        self._tasks: dict[str, _Task] = {}
+        self._marks: dict[str, float] = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, func, *args, **kwargs) -> concurrent.futures.Future:
+        """Start a named task in the background and return its future."""
+        task = _Task(time.monotonic())
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot start startup tasks after shutdown")
+            self._tasks[name] = task
+
+        def run():
+            task.started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as exc:  # pylint: disable=broad-except
+                task.future.set_exception(exc)
+            else:
+                task.future.set_result(result)
+            finally:
+                task.finished = time.monotonic()
+
+        threading.Thread(target=run, name=f"shippy-startup-{name}").start()
+        return task.future
+
+    def submitted(self, name: str) -> bool:
+        """Return whether a task of this name has been submitted."""
+        return name in self._tasks
+
+    def result(self, name: str, msg: str, stage: typing.Optional[str] = None):
+        """Return a task's result, showing ``msg`` while it is still running."""
+        task = self._tasks[name]
+        if task.future.done():
+            return task.future.result()
+
+        started = time.monotonic()
+        try:
+            with console.task_message(msg, stage):
+                return task.future.result()
+        finally:
+            task.blocked += time.monotonic() - started
+
+    def mark(self, name: str):
+        """Record the first time a milestone (e.g. the first prompt) is reached."""
+        self._marks.setdefault(name, time.monotonic())
+
+    def report(self) -> str:
+        """Return a human-readable breakdown of startup timings."""
+
+        def ms(moment):
+            return "-" if moment is None else f"{1000 * (moment - self.launched):.0f}"
+
+        lines = ["Startup timings (ms since launch):"]
+        for name, task in self._tasks.items():
+            duration = (
+                "running"
+                if task.finished is None or task.started is None
+                else f"{1000 * (task.finished - task.started):.0f} ms"
+            )
+            lines.append(
+                f"  {name:20s} start {ms(task.started):>6s}  "
+                f"done {ms(task.finished):>6s}  ({duration}, "
+                f"operator waited {1000 * task.blocked:.0f} ms)"
+            )
+        for name, moment in self._marks.items():
+            lines.append(f"  {name:20s} at {ms(moment):>9s}")
+        return "\n".join(lines)
+
+    def shutdown(self):
+        """Stop accepting tasks; running ones finish in the background."""
+        with self._lock:
+            self._closed = True
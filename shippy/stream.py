@@ -0,0 +1,239 @@
+"""Headless record sources for barcode scanners and upstream tools.
+
+A record is one line naming what to ship and how heavy it is, either as JSON::
+
+    {"request_id": 12345, "weight": 2}
+    {"request_id": "TX-1234567-1", "weight": 2}
+    {"unit": "Ellis", "weight": 14}
+
+or as plain text, an identifier and a weight in pounds separated by a comma or
+whitespace (``12345,2`` or ``Ellis 14``). A bare integer is a request autoid,
+``JURISDICTION-INMATE-INDEX`` is a compound request ID, and anything else is a
+unit name. The weight may be left out (``12345``) to weigh the package on the
+configured scale instead.
+"""
+
+import json
+import math
+import os
+import queue
+import re
+import socket
+import stat
+import sys
+import threading
+import typing
+
+_COMPOUND_ID_RE = re.compile(r"^([A-Za-z]+)-(\d+)-(\d+)$")
+
+# A reader blocks once this many records are waiting to be shipped. Records are
+# then left in the pipe or socket buffer, which in turn blocks the producer, so
+# a fast scanner is throttled to the printer's pace instead of queueing forever.
+DEFAULT_BUFFER = 4
+
+
+class RecordError(ValueError):
+    """Raised when a record cannot be parsed."""
+
+
+class Record(typing.NamedTuple):
+    """One parsed shipping record and where to send its result."""
+
+    line: str
+    reply: typing.Callable[[dict], None]
+    kind: str = "invalid"  # "request", "unit", or "invalid"
+    value: typing.Union[int, typing.Tuple[str, int, int], str, None] = None
+    weight: typing.Optional[float] = None  # Pounds; None means use the scale.
+    error: typing.Optional[RecordError] = None
+
+
+def parse_identifier(text: str):
+    """Parse a request autoid, compound request ID, or unit name."""
+    text = text.strip()
+    if not text:
+        raise RecordError("missing identifier")
+
+    if text.isdigit():
+        return "request", int(text)
+
+    match = _COMPOUND_ID_RE.match(text)
+    if match:
+        jurisdiction, inmate_id, index = match.groups()
+        return "request", (jurisdiction.upper(), int(inmate_id), int(index))
+
+    return "unit", text.upper()
+
+
+def format_request_id(value) -> str:
+    """Format a request autoid or compound request ID the way it is typed."""
+    if isinstance(value, tuple):
+        return "-".join(map(str, value))
+    return str(value)
+
+
+def parse_weight(value) -> float:
+    """Parse a strictly positive weight in pounds."""
+    try:
+        weight = float(value)
+    except (TypeError, ValueError) as exc:
+        raise RecordError(f"invalid weight {value!r}") from exc
+
+    if not math.isfinite(weight) or weight <= 0:
+        raise RecordError("weight must be strictly positive")
+
+    return weight
+
+
+def parse_line(line: str) -> typing.Tuple[str, typing.Any, typing.Optional[float]]:
+    """Parse a record line into ``(kind, value, weight)``."""
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            raise RecordError(f"invalid JSON: {exc}") from exc
+
+        if "request_id" in data:
+            kind, value = parse_identifier(str(data["request_id"]))
+            if kind != "request":
+                raise RecordError(f"invalid request ID {data['request_id']!r}")
+        elif "unit" in data:
+            kind, value = "unit", str(data["unit"]).strip().upper()
+        else:
+            raise RecordError("record needs a 'request_id' or a 'unit'")
+
+        weight = data.get("weight")
+        return kind, value, None if weight is None else parse_weight(weight)
+
+    separator = "," if "," in line else None
+    parts = line.rsplit(separator, 1)
+    if len(parts) == 2 and (separator or _looks_numeric(parts[1])):
+        identifier, weight = parts
+        kind, value = parse_identifier(identifier)
+        return kind, value, parse_weight(weight)
+
+    kind, value = parse_identifier(line)
+    return kind, value, None
+
+
+def _looks_numeric(text: str) -> bool:
+    """Return whether a trailing token is meant as a weight."""
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _write_json_line(file: typing.TextIO, lock: threading.Lock):
+    """Return a reply callable writing one JSON object per line to a file."""
+
+    def reply(result: dict):
+        with lock:
+            try:
+                file.write(json.dumps(result) + "\n")
+                file.flush()
+            except (OSError, ValueError):
+                pass  # The producer hung up; its result has nowhere to go.
+
+    return reply
+
+
+def _read_file(file: typing.TextIO, reply, put):
+    """Feed every line of a text file into ``put``."""
+    for line in file:
+        if line.strip():
+            put(line, reply)
+
+
+def _serve_connection(connection: socket.socket, put):
+    """Feed every line from one socket connection, replying on the same socket."""
+    with connection, connection.makefile("rw", encoding="utf-8") as file:
+        _read_file(file, _write_json_line(file, threading.Lock()), put)
+
+
+def _serve_socket(listener: socket.socket, put):
+    """Accept connections forever, one reader thread per connection."""
+    while True:
+        connection, _ = listener.accept()
+        threading.Thread(
+            target=_serve_connection, args=(connection, put), daemon=True
+        ).start()
+
+
+def _listen(spec: str) -> socket.socket:
+    """Open a listening socket for ``unix:PATH`` or ``tcp:HOST:PORT``."""
+    scheme, _, address = spec.partition(":")
+    if scheme == "unix":
+        if os.path.exists(address):
+            os.remove(address)  # Stale socket left by a previous run.
+        listener = socket.socket(
+            socket.AF_UNIX, socket.SOCK_STREAM  # pylint: disable=no-member
+        )
+        listener.bind(address)
+    else:
+        host, _, port = address.rpartition(":")
+        listener = socket.create_server((host or "127.0.0.1", int(port)))
+    listener.listen()
+    return listener
+
+
+def read_records(
+    source: str, buffer: int = DEFAULT_BUFFER, output: typing.TextIO = sys.stdout
+) -> typing.Iterator[Record]:
+    """Stream records from a source as they arrive.
+
+    ``source`` is ``-`` for stdin, ``unix:PATH`` or ``tcp:HOST:PORT`` for a local
+    listening socket (results are sent back on each connection), or the path of a
+    file or FIFO. Results for stdin and file sources are written to ``output``.
+    Malformed lines are yielded too, with ``error`` set, so that they are
+    reported in order with everything else.
+    """
+    records: queue.Queue = queue.Queue(maxsize=max(int(buffer), 1))
+    failure: list[BaseException] = []
+    done = object()
+
+    def put(line, reply):
+        try:
+            kind, value, weight = parse_line(line)
+        except RecordError as exc:
+            records.put(Record(line.strip(), reply, error=exc))
+        else:
+            records.put(Record(line.strip(), reply, kind, value, weight))
+
+    output_reply = _write_json_line(output, threading.Lock())
+
+    def produce():
+        try:
+            if source.startswith(("unix:", "tcp:")):
+                _serve_socket(_listen(source), put)
+            elif source == "-":
+                _read_file(sys.stdin, output_reply, put)
+            else:
+                # Reopen a FIFO whenever its writer goes away, so one upstream
+                # process after another can feed the same running shippy.
+                while True:
+                    with open(source, encoding="utf-8") as file:
+                        _read_file(file, output_reply, put)
+                    if not _is_fifo(source):
+                        break
+        except BaseException as exc:  # pylint: disable=broad-except
+            failure.append(exc)
+        finally:
+            records.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while (record := records.get()) is not done:
+        yield record
+
+    if failure:
+        raise failure[0]
+
+
+def _is_fifo(path: str) -> bool:
+    """Return whether a path is a named pipe."""
+    try:
+        return stat.S_ISFIFO(os.stat(path).st_mode)
+    except OSError:
+        return False
@@ -0,0 +1,306 @@
+"""Trace every outbound HTTP call shippy makes.
+
+The IBP server calls, label downloads, and the EasyPost and Google Maps SDKs
+all go through :mod:`requests` sessions that :func:`shippy.deadline.bound`
+mounts its adapter on, so that adapter is where calls are traced (see
+:func:`send`): once :func:`install` has opened the trace file, every call
+appends one JSON line to it::
+
+    {"ts": ..., "trace": "3f2a...", "request_id": "12345", "provider": "ibp",
+     "method": "POST", "endpoint": "/request_address/{id}", "status": 200,
+     "bytes_out": 212, "bytes_in": 163, "connect_s": 0.0, "ttfb_s": 0.081,
+     "total_s": 0.082, "retries": 0}
+
+``connect_s`` (DNS, TCP and TLS) is zero for calls on a reused keep-alive
+connection, and the byte counts are of the bodies as sent on the wire. Calls
+made while shipping a label carry that label's trace ID and identifiers (see
+:func:`trace`). ``retries`` counts the attempts urllib3 made before the one
+that answered, under the adapter's ``max_retries`` (null if none answered),
+and a read sent again by a hedger (see :func:`hedge`) has ``"hedge": true``;
+several calls to one endpoint in a trace are otherwise separate calls, such as
+the purchases for several boxes. Query strings are never recorded, as Google
+Maps puts its API key there. Nothing outside those sessions is touched.
+"""
+
+import collections
+import contextlib
+import contextvars
+import datetime
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import time
+import typing
+import urllib.parse
+import uuid
+
+from .metrics import percentile, read_events
+from .misc import data_dir
+
+_LOGGER: typing.Optional[logging.Logger] = None
+_PROVIDERS: list[tuple[str, str]] = []  # (URL prefix, provider), longest first.
+
+
+def default_path() -> str:
+    """Return the default trace file in the shippy data directory."""
+    return os.path.join(data_dir(), "http-trace.jsonl")
+
+
+class _Trace:  # pylint: disable=too-few-public-methods
+    """The label a series of calls serves."""
+
+    __slots__ = ("id", "fields")
+
+    def __init__(self, fields: dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.fields = fields
+
+
+_TRACE: contextvars.ContextVar[typing.Optional[_Trace]] = contextvars.ContextVar(
+    "shippy_trace", default=None
+)
+_HEDGE: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "shippy_hedge", default=False
+)
+
+
+@contextlib.contextmanager
+def trace(**fields):
+    """Tie the calls made in this context to one label; yield its trace ID.
+
+    ``fields`` (e.g. ``request_id``) are added to every record, skipping None.
+    Inside another trace this joins it, adding the fields.
+    """
+    fields = {key: value for key, value in fields.items() if value is not None}
+    current = _TRACE.get()
+    if current is not None:
+        current.fields.update(fields)
+        yield current.id
+        return
+
+    current = _Trace(fields)
+    token = _TRACE.set(current)
+    try:
+        yield current.id
+    finally:
+        _TRACE.reset(token)
+
+
+@contextlib.contextmanager
+def hedge():
+    """Mark the calls made in this context as a hedge: a read sent again."""
+    token = _HEDGE.set(True)
+    try:
+        yield
+    finally:
+        _HEDGE.reset(token)
+
+
+def annotate(**fields):
+    """Add fields (e.g. a shipment ID once bought) to the current trace."""
+    current = _TRACE.get()
+    if current is not None:
+        current.fields.update(fields)
+
+
+def register_provider(url: str, name: str):
+    """Name the provider of calls to URLs starting with ``url``."""
+    _PROVIDERS.append((url.rstrip("/"), name))
+    _PROVIDERS.sort(key=lambda item: -len(item[0]))
+
+
+def install(path: str, max_bytes: int = 5_000_000, backups: int = 3):
+    """Start tracing calls to a rotating file."""
+    global _LOGGER  # pylint: disable=global-statement
+
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger = logging.getLogger("shippy.http")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+
+    _LOGGER = logger
+
+
+def uninstall():
+    """Stop tracing and close the trace file."""
+    global _LOGGER  # pylint: disable=global-statement
+
+    logger, _LOGGER = _LOGGER, None
+    if logger is not None:
+        for handler in logger.handlers:
+            handler.close()
+        logger.handlers = []
+
+
+def report(path: str, since: float) -> str:
+    """Return the ``shippy stats --http`` report for calls since a timestamp."""
+    calls: dict[tuple[str, str], list[dict]] = collections.defaultdict(list)
+    # Oldest rotated file first; only the current one is usually needed.
+    for number in range(9, -1, -1):
+        for call in read_events(f"{path}.{number}" if number else path, since):
+            key = (call["provider"], f"{call['method']} {call['endpoint']}")
+            calls[key].append(call)
+
+    start = datetime.datetime.fromtimestamp(since).strftime("%Y-%m-%d %H:%M")
+    if not calls:
+        return f"No HTTP calls traced since {start} in {path}."
+
+    lines = [
+        f"Outbound HTTP calls since {start}",
+        f"  {'provider':20s} {'endpoint':36s} {'count':>6s} {'errors':>7s} "
+        f"{'connect':>8s} {'ttfb p50':>8s} {'p95':>8s} {'total p95':>9s}",
+    ]
+    for (provider, endpoint), group in sorted(
+        calls.items(), key=lambda item: (item[0][0], -len(item[1]))
+    ):
+        errors = sum(
+            1 for call in group if call.get("error") or (call["status"] or 0) >= 400
+        )
+
+        def p95(field, group=group):
+            return percentile(sorted(call[field] for call in group), 0.95)
+
+        ttfb = sorted(call["ttfb_s"] for call in group)
+        connect = sum(call["connect_s"] for call in group) / len(group)
+        lines.append(
+            f"  {provider[:20]:20s} {endpoint[:36]:36s} {len(group):6d} "
+            f"{100.0 * errors / len(group):6.1f}% {connect:7.3f}s "
+            f"{percentile(ttfb, 0.5):7.3f}s {p95('ttfb_s'):7.3f}s "
+            f"{p95('total_s'):8.3f}s"
+        )
+    return "\n".join(lines)
+
+
+def endpoint_template(path: str) -> str:
+    """Replace IDs in a URL path, so calls to one endpoint group together."""
+    segments = []
+    for segment in path.split("?", 1)[0].split("/"):
+        stem, dot, extension = segment.partition(".")
+        if stem.isdigit():
+            stem = "{id}"
+        elif len(stem) >= 6 and any(char.isdigit() for char in stem):
+            prefix, underscore, _ = stem.partition("_")
+            stem = f"{prefix}_{{id}}" if underscore and prefix.isalpha() else "{id}"
+        segments.append(stem + dot + extension)
+    return "/".join(segments)
+
+
+def _provider(url: str, host: str) -> str:
+    for prefix, name in _PROVIDERS:
+        if url.startswith(prefix):
+            return name
+    return host
+
+
+def send(adapter_send, request, **kwargs):
+    """Send a prepared request with an adapter's ``send``, tracing the call."""
+    if _LOGGER is None:
+        return adapter_send(request, **kwargs)
+
+    started = time.monotonic()
+    record = _record(request)
+    try:
+        response = adapter_send(request, **kwargs)
+        # Headers are in; the body is still on the connection, and so is the
+        # time it took to open, if it is a new one.
+        ttfb = time.monotonic() - started
+        raw = response.raw
+        connection = vars(raw.connection) if raw.connection is not None else {}
+        connect = connection.pop("_shippy_connect", 0.0)
+        if not kwargs.get("stream"):
+            response.content  # pylint: disable=pointless-statement
+    except Exception as exc:
+        _write(record, started, None, error=f"{type(exc).__name__}: {exc}")
+        raise
+
+    history = getattr(raw.retries, "history", None) or ()
+    record.update(
+        bytes_in=raw.tell(),
+        connect_s=round(connect, 4),
+        ttfb_s=round(ttfb, 4),
+        retries=sum(1 for attempt in history if not attempt.redirect_location),
+    )
+    _write(record, started, response.status_code)
+    return response
+
+
+def _record(request) -> dict[str, typing.Any]:
+    """Start a call's record: its trace, provider and endpoint."""
+    url = urllib.parse.urlsplit(request.url)
+    origin = f"{url.scheme}://{url.netloc}"
+    record: dict[str, typing.Any] = {}
+    current = _TRACE.get()
+    if current is not None:
+        record["trace"] = current.id
+        record.update(current.fields)
+    record.update(
+        provider=_provider(origin + url.path, url.hostname or url.netloc),
+        method=request.method,
+        endpoint=endpoint_template(url.path or "/"),
+        status=None,
+        bytes_out=int(request.headers.get("Content-Length") or 0),
+        bytes_in=0,
+        connect_s=0.0,
+        ttfb_s=0.0,
+        retries=None,
+    )
+    if _HEDGE.get():
+        record["hedge"] = True
+    return record
+
+
+def _write(
+    record: dict[str, typing.Any],
+    started: float,
+    status: typing.Optional[int],
+    error: typing.Optional[str] = None,
+):
+    """Write a finished call's record."""
+    logger = _LOGGER
+    if logger is None:
+        return
+    record.update(status=status, total_s=round(time.monotonic() - started, 4))
+    if error is not None:
+        record["error"] = error
+    logger.info(json.dumps({"ts": round(time.time(), 3), **record}))
+
+
+@functools.lru_cache(maxsize=1)
+def timed_pools() -> dict[str, type]:
+    """Return urllib3 pool classes whose new connections time their own setup.
+
+    For an adapter's pool manager, so that :func:`send` can tell a call's
+    connect time; urllib3 is only imported once an adapter is made.
+    """
+    # pylint: disable=import-outside-toplevel
+    import urllib3.connectionpool
+
+    def timed(connection: type) -> type:
+        def connect(self):
+            started = time.monotonic()
+            connection.connect(self)
+            # Picked up by the call that opened the connection.
+            # pylint: disable-next=protected-access
+            self._shippy_connect = time.monotonic() - started
+
+        # Same names as urllib3's, which show in connection error messages.
+        return type(connection.__name__, (connection,), {"connect": connect})
+
+    pools = (
+        ("http", urllib3.connectionpool.HTTPConnectionPool),
+        ("https", urllib3.connectionpool.HTTPSConnectionPool),
+    )
+    return {
+        scheme: type(
+            pool.__name__,
+            (pool,),
+            {"ConnectionCls": timed(pool.ConnectionCls)},
+        )
+        for scheme, pool in pools
+    }
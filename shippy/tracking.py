@@ -0,0 +1,202 @@
+"""Delivery status of shipped labels, refreshed by ``shippy track``.
+
+Statuses live in a ``tracking`` table next to the shipment journal, in the same
+SQLite file. Printed shipments are copied over from the journal, and only those
+whose status is not final and was last checked longer ago than a threshold are
+polled again, a bounded number at a time. Partial indexes cover both the
+"due for a refresh" and the "not delivered N days after shipping" queries, so
+they stay instant however many labels have been shipped.
+"""
+
+import concurrent.futures
+import sqlite3
+import threading
+import time
+import typing
+
+from .journal import connect, default_path
+
+# EasyPost tracker statuses that will not change any more.
+FINAL = ("delivered", "return_to_sender", "failure", "cancelled")
+
+# Not final yet. Queries must spell this exactly as the tracking_pending and
+# tracking_unfinished indexes do for SQLite to use them.
+_PENDING = f"status IS NULL OR status NOT IN ({', '.join(map(repr, FINAL))})"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tracking (
+    id INTEGER PRIMARY KEY,
+    shipment_id TEXT UNIQUE,
+    tracker_id TEXT UNIQUE,
+    tracking_code TEXT,
+    shipped REAL NOT NULL,
+    status TEXT,
+    status_detail TEXT,
+    est_delivery TEXT,
+    checked REAL
+);
+CREATE INDEX IF NOT EXISTS tracking_tracking_code ON tracking (tracking_code);
+CREATE INDEX IF NOT EXISTS tracking_pending ON tracking (checked) WHERE {_PENDING};
+CREATE INDEX IF NOT EXISTS tracking_unfinished ON tracking (shipped) WHERE {_PENDING};
+"""
+
+_COLUMNS = (
+    "id, shipment_id, tracker_id, tracking_code, shipped, status, status_detail, "
+    "est_delivery, checked"
+)
+
+
+class Status(typing.NamedTuple):
+    """The last known delivery status of one shipment."""
+
+    id: int
+    shipment_id: typing.Optional[str]
+    tracker_id: typing.Optional[str]
+    tracking_code: typing.Optional[str]
+    shipped: float
+    status: typing.Optional[str]  # None until first checked.
+    status_detail: typing.Optional[str]
+    est_delivery: typing.Optional[str]
+    checked: typing.Optional[float]
+
+    def describe(self) -> str:
+        """Return a one-line description for the operator."""
+        when = time.strftime("%Y-%m-%d", time.localtime(self.shipped))
+        status = (self.status or "unchecked").replace("_", " ")
+        if self.status_detail and self.status_detail != "unknown":
+            status += f" ({self.status_detail.replace('_', ' ')})"
+        return f"{when} {self.tracking_code or self.shipment_id}: {status}"
+
+
+class TrackingStore:
+    """Indexed local table of delivery statuses."""
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = connect(path)
+        self._db.executescript(_SCHEMA)
+
+    @classmethod
+    def open(cls, path: str | None = None) -> "TrackingStore":
+        """Open the table in the journal file at a path or the default one."""
+        return cls(path or default_path())
+
+    def sync_journal(self) -> int:
+        """Start tracking journaled shipments that were printed; return how many."""
+        with self._lock:
+            try:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO tracking (shipment_id, tracking_code, "
+                    "shipped) SELECT shipment_id, tracking_code, created "
+                    "FROM shipments WHERE state = 'printed' "
+                    "AND shipment_id IS NOT NULL"
+                )
+            except sqlite3.OperationalError:
+                return 0  # Nothing journaled yet.
+        return cursor.rowcount
+
+    def due(self, stale_after: float, now: float | None = None) -> list[Status]:
+        """Return non-final statuses last checked over ``stale_after`` seconds ago."""
+        cutoff = (time.time() if now is None else now) - stale_after
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM tracking WHERE ({_PENDING}) "
+                "AND (checked IS NULL OR checked < ?) ORDER BY checked",
+                (cutoff,),
+            ).fetchall()
+        return [Status._make(row) for row in rows]
+
+    def find(self, key: str) -> typing.Optional[Status]:
+        """Return the status of a shipment ID, tracker ID or tracking code."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_COLUMNS} FROM tracking WHERE shipment_id = ?1 "
+                "OR tracker_id = ?1 OR tracking_code = ?1",
+                (key,),
+            ).fetchone()
+        return None if row is None else Status._make(row)
+
+    def update(self, status_id: int, tracker, now: float | None = None):
+        """Store a freshly fetched EasyPost tracker."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tracking SET tracker_id = ?, status = ?, status_detail = ?, "
+                "est_delivery = ?, checked = ? WHERE id = ?",
+                (
+                    tracker.id,
+                    tracker.status,
+                    getattr(tracker, "status_detail", None),
+                    getattr(tracker, "est_delivery_date", None),
+                    time.time() if now is None else now,
+                    status_id,
+                ),
+            )
+
+    def undelivered(self, older_than: float, now: float | None = None) -> list[Status]:
+        """Return shipments not delivered ``older_than`` seconds after shipping.
+
+        Shipments that will never be delivered (returned to sender, failed or
+        cancelled) are left out, as their status is final.
+        """
+        cutoff = (time.time() if now is None else now) - older_than
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_COLUMNS} FROM tracking WHERE ({_PENDING}) "
+                "AND shipped < ? ORDER BY shipped",
+                (cutoff,),
+            ).fetchall()
+        return [Status._make(row) for row in rows]
+
+    def counts(self) -> dict[str, int]:
+        """Return how many shipments are in each status."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT COALESCE(status, 'unchecked'), COUNT(*) FROM tracking "
+                "GROUP BY 1 ORDER BY 2 DESC"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        """Close the store."""
+        with self._lock:
+            self._db.close()
+
+
+def fetch_tracker(client, status: Status):
+    """Fetch the EasyPost tracker of a shipment.
+
+    Once the tracker ID is known the tracker is fetched directly, which is a
+    much smaller response than the whole shipment.
+    """
+    if status.tracker_id is not None:
+        return client.tracker.retrieve(status.tracker_id)
+    tracker = client.shipment.retrieve(status.shipment_id).tracker
+    if tracker is None:
+        raise LookupError(f"no tracker for {status.shipment_id}")
+    return tracker
+
+
+def refresh(
+    store: TrackingStore, client, statuses: typing.Iterable[Status], workers: int = 8
+) -> typing.Iterator[tuple[Status, typing.Optional[Exception]]]:
+    """Fetch trackers ``workers`` at a time, storing each as it arrives.
+
+    Yields each status with the exception its fetch raised, if any; failed
+    ones are left as they were and retried next time.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max(int(workers), 1)) as pool:
+        futures = {
+            pool.submit(fetch_tracker, client, status): status for status in statuses
+        }
+        for future in concurrent.futures.as_completed(futures):
+            status = futures[future]
+            try:
+                store.update(status.id, future.result())
+            except Exception as exc:  # pylint: disable=broad-except
+                # One lost lookup must not stop refreshing thousands of others.
+                yield status, exc
+            else:
+                yield status, None
@@ -0,0 +1,188 @@
+"""Ship the requests the IBP server lists as ready, addresses fetched ahead.
+
+In ``individual`` mode the operator types each request ID, and its address is
+only looked up and verified once the weight is in. A :class:`WorkQueue` instead
+pages through the server's list of packed, ready-to-ship requests, and looks up
+and verifies the next few addresses in the background while the operator
+weighs the current package, so the label is bought as soon as the weight is
+confirmed. A request is acknowledged back to the server once its label has
+printed, not when it is entered: a label queued in the outbox may still fail.
+Acknowledgements go in batches, and take the requests off the ready list.
+"""
+
+import collections
+import concurrent.futures
+import threading
+import typing
+
+from .server import AddressLookup, Server
+
+
+class Ready(typing.NamedTuple):
+    """A ready request, its address looked up and verified if that worked."""
+
+    autoid: int
+    request_id: str  # Compound request ID, as printed on the request slip.
+    address: typing.Optional[dict[str, str]]
+    verified: typing.Optional[bool]  # None if it could not be checked.
+    error: typing.Optional[str] = None
+
+    def destination(self) -> typing.Union[dict[str, str], AddressLookup]:
+        """Return the address, or its lookup if prefetching it failed."""
+        if self.address is None:
+            return AddressLookup("request", self.autoid)
+        return self.address
+
+
+class WorkQueue:  # pylint: disable=too-many-instance-attributes
+    """Ready requests listed from the IBP server, the next few prefetched.
+
+    ``verify`` is given each prefetched address and returns whether it
+    verified (see :meth:`shippy.session.Session.prefetch_address`). Once the
+    list runs out, it is listed again from the start, to pick up requests
+    packed since; requests entered in this session are left out even before
+    their acknowledgement reaches the server.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        server: Server,
+        verify: typing.Callable[[dict[str, str]], bool],
+        prefetch: int = 4,
+        page_size: int = 50,
+        ack_batch: int = 10,
+    ):
+        self.server = server
+        self.prefetch = int(prefetch)
+        self.page_size = int(page_size)
+        self.ack_batch = int(ack_batch)
+        self._verify = verify
+        # One worker lists pages and sends acknowledgements.
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            self.prefetch + 1, thread_name_prefix="shippy-prefetch"
+        )
+        self._listed: collections.deque[dict] = collections.deque()
+        self._ahead: collections.deque[tuple[dict, concurrent.futures.Future]] = (
+            collections.deque()
+        )
+        self._cursor: typing.Optional[int] = 0  # None once the last page is listed.
+        self._page: typing.Optional[concurrent.futures.Future] = None
+        self._offered = 0  # Requests offered in this pass over the list.
+        self._shipped: set[int] = set()  # Entered, whether printed yet or not.
+        self._entered: dict[str, int] = {}  # Not printed yet, by request ID.
+        self._unacknowledged: list[int] = []
+        self._acknowledging: typing.Optional[concurrent.futures.Future] = None
+        self._lock = threading.Lock()
+
+    def next(self) -> typing.Optional[Ready]:
+        """Return the next ready request, or None once none is left."""
+        while True:
+            self._fill()
+            if self._ahead:
+                request, future = self._ahead.popleft()
+                self._fill()
+                self._offered += 1
+                return self._ready(request, future)
+
+            if self._page is not None:
+                self._take_page()
+            elif self._offered:
+                # Start over, for requests packed while going through the list.
+                self._cursor, self._offered = 0, 0
+            else:
+                return None
+
+    def entered(self, ready: Ready):
+        """Record a request as entered, to acknowledge once its label prints."""
+        self._shipped.add(ready.autoid)
+        with self._lock:
+            self._entered[ready.request_id] = ready.autoid
+
+    def shipped(self, request_id: str):
+        """Record an entered request's label as printed, acknowledging a full batch.
+
+        Called from whichever thread printed the label; other request IDs are
+        ignored.
+        """
+        with self._lock:
+            autoid = self._entered.pop(request_id, None)
+            if autoid is None:
+                return
+            self._unacknowledged.append(autoid)
+            if len(self._unacknowledged) < self.ack_batch or (
+                self._acknowledging is not None and not self._acknowledging.done()
+            ):
+                return
+            batch, self._unacknowledged = self._unacknowledged, []
+            self._acknowledging = self._pool.submit(self._acknowledge, batch)
+
+    def close(self) -> tuple[list[int], list[int]]:
+        """Acknowledge what is left and stop prefetching.
+
+        Returns the autoids of shipped requests that could not be acknowledged,
+        and of entered requests whose label never printed (it failed, or is
+        still queued); the server still lists both as ready.
+        """
+        if self._acknowledging is not None:
+            self._acknowledging.result()
+        with self._lock:
+            batch, self._unacknowledged = self._unacknowledged, []
+        if batch:
+            self._acknowledge(batch)
+        for _, future in self._ahead:
+            future.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            return list(self._unacknowledged), list(self._entered.values())
+
+    def _fill(self):
+        """Prefetch up to ``prefetch`` requests ahead, listing more as needed."""
+        while len(self._ahead) < self.prefetch and self._listed:
+            request = self._listed.popleft()
+            self._ahead.append((request, self._pool.submit(self._fetch, request)))
+        if len(self._listed) < self.prefetch and self._cursor is not None:
+            if self._page is None:
+                self._page = self._pool.submit(
+                    self.server.ready_requests, self._cursor, self.page_size
+                )
+            elif self._page.done():
+                self._take_page()
+                self._fill()
+
+    def _take_page(self):
+        """Add a listed page, waiting for it if need be."""
+        page, self._page = typing.cast(concurrent.futures.Future, self._page), None
+        listed = page.result()
+        self._cursor = listed["next"]
+        self._listed.extend(
+            request
+            for request in listed["requests"]
+            if request["autoid"] not in self._shipped
+        )
+
+    def _fetch(self, request: dict) -> tuple[dict[str, str], typing.Optional[bool]]:
+        """Look up and verify a request's address (in a worker thread)."""
+        address = self.server.request_address(request["autoid"])
+        try:
+            return address, self._verify(address)
+        except Exception:  # pylint: disable=broad-except
+            # Verified again when the label is bought.
+            return address, None
+
+    def _ready(self, request: dict, future: concurrent.futures.Future) -> Ready:
+        """Wait for a prefetched request."""
+        try:
+            address, verified = future.result()
+        except Exception as exc:  # pylint: disable=broad-except
+            # Looked up again when the label is bought, queued if offline.
+            return Ready(request["autoid"], request["request_id"], None, None, str(exc))
+        return Ready(request["autoid"], request["request_id"], address, verified)
+
+    def _acknowledge(self, autoids: list[int]):
+        """Acknowledge shipped requests, keeping them for later if that fails."""
+        try:
+            self.server.acknowledge_requests(autoids)
+        except Exception:  # pylint: disable=broad-except
+            # Sent again with the next batch.
+            with self._lock:
+                self._unacknowledged[:0] = autoids
@@ -0,0 +1,120 @@
+"""ZPL labels: the logo as a compressed graphic field, injected into labels.
+
+Thermal label printers take ZPL natively, so a ZPL label is a few kilobytes of
+text sent straight to the printer instead of a rendered bitmap spooled through
+GDI. The logo is converted once into a ``^GF`` graphic field using Zebra's
+ASCII compression and cached on disk, so later sessions do not even load PIL.
+"""
+
+import functools
+import hashlib
+import importlib.resources
+import io
+import itertools
+import os
+import re
+import typing
+
+from .misc import data_dir
+
+if typing.TYPE_CHECKING:
+    from PIL import Image
+
+# EasyPost ZPL labels are 4x6 inches at 203 dpi. The PNG path pastes the logo at
+# (450, 425) on a 300 dpi label; these are the same place and size in dots.
+DPI = 203
+LOGO_ORIGIN = (305, 288)
+LOGO_SCALE = 203 / 300
+
+_END_RE = re.compile(rb"\^XZ\s*$", re.IGNORECASE)
+
+
+def _repeat(count: int) -> str:
+    """Encode a repeat count: G-Y are 1-19, g-z are 20-400 in steps of 20."""
+    code = "z" * (count // 400)
+    count %= 400
+    if count >= 20:
+        code += chr(ord("f") + count // 20)
+    if count % 20:
+        code += chr(ord("F") + count % 20)
+    return code
+
+
+def compress_row(row: str) -> str:
+    """Compress one row of hex digits with ZPL's ASCII compression scheme."""
+    body = row.rstrip("0")
+    tail = "," if len(body) < len(row) else ""
+    if not tail:
+        stripped = body.rstrip("F")
+        if len(stripped) < len(body):
+            body, tail = stripped, "!"
+
+    runs = []
+    for digit, group in itertools.groupby(body):
+        count = len(list(group))
+        runs.append(digit if count == 1 else _repeat(count) + digit)
+    return "".join(runs) + tail
+
+
+def graphic_field(image: "Image.Image") -> str:
+    """Return a compressed ``^GFA`` command printing an image (dark is black)."""
+    bitmap = image.convert("L").point(lambda value: 255 if value < 128 else 0, "1")
+    width, height = bitmap.size
+    row_bytes = (width + 7) // 8
+    data = bitmap.tobytes()  # Rows padded to whole bytes; 1 is black.
+
+    rows, previous = [], None
+    for y in range(height):
+        row = data[y * row_bytes : (y + 1) * row_bytes].hex().upper()
+        rows.append(":" if row == previous else compress_row(row))
+        previous = row
+
+    total = row_bytes * height
+    return f"^GFA,{total},{total},{row_bytes},{''.join(rows)}"
+
+
+def logo_field() -> bytes:
+    """Return the ZPL placing the logo on a label, prepared once and cached.
+
+    The cache file is named after a hash of the logo and the placement, so
+    changing either prepares it again.
+    """
+    logo = importlib.resources.files("shippy.assets").joinpath("logo.jpg")
+    return _cached_logo_field(logo.read_bytes())
+
+
+@functools.cache
+def _cached_logo_field(logo: bytes) -> bytes:
+    key = hashlib.sha1(logo + repr((DPI, LOGO_ORIGIN)).encode()).hexdigest()[:16]
+    path = os.path.join(data_dir(), f"logo-{key}.zpl")
+    try:
+        with open(path, "rb") as handle:
+            return handle.read()
+    except OSError:
+        pass
+
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    image = Image.open(io.BytesIO(logo))
+    size = (round(image.width * LOGO_SCALE), round(image.height * LOGO_SCALE))
+    field = (
+        f"^FO{LOGO_ORIGIN[0]},{LOGO_ORIGIN[1]}"
+        f"{graphic_field(image.resize(size))}^FS\n"
+    ).encode("ascii")
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as handle:
+            handle.write(field)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # Caching is an optimization; the field is still good.
+    return field
+
+
+def inject(label: bytes, field: bytes) -> bytes:
+    """Insert ZPL (e.g. the logo field) at the end of a label's format."""
+    match = _END_RE.search(label)
+    if match is None:
+        raise ValueError("not a ZPL label: no closing ^XZ")
+    return label[: match.start()] + field + label[match.start() :]